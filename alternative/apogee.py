@@ -1,10 +1,13 @@
-import time
+import sys
 from statistics import mean
 from math import fabs
 import krpc
+from lib.scenario.scenario import Scenario
 from lib.scenario.launch import LaunchScenario
 from lib.scenario.exec_node import ExecNodeScenario
-from lib.nav import compute_circ_burn
+from csk.lib.nav import compute_circ_burn
+from csk.lib.clock import default_clock
+from csk.lib import bodies
 
 
 def perform_launch(conn, ksc, vessel):
@@ -16,7 +19,8 @@ def perform_launch(conn, ksc, vessel):
   LaunchScenario(context={'conn': conn}, parameters=launch_params).run()
 
   apo_time = vessel.orbit.time_to_apoapsis
-  circ_burn = compute_circ_burn(vessel)
+  body = bodies.for_connection(conn).get(vessel.orbit.body)
+  circ_burn = compute_circ_burn(vessel, body=body)
   node = vessel.control.add_node(ksc.ut + apo_time,
                                  prograde=circ_burn["delta_v"])
 
@@ -25,6 +29,7 @@ def perform_launch(conn, ksc, vessel):
 
 
 def wait_above_ksc(conn, ksc, vessel):
+  clock = default_clock(conn)
   ant = conn.remote_tech.comms(vessel).antennas[0]
   mod = [m for m in ant.part.modules if m.name == 'ModuleRTAntenna'][0]
   if mod.has_event('Activate'):
@@ -48,7 +53,7 @@ def wait_above_ksc(conn, ksc, vessel):
       ksc.rails_warp_factor = 0
       break
 
-    time.sleep(0.01)
+    clock.sleep(0.01)
 
 
 def take_photo(conn, ksc, vessel):
@@ -68,6 +73,13 @@ def take_photo(conn, ksc, vessel):
 
 if __name__ == '__main__':
   conn = krpc.connect()
+
+  # Scenario options, for all scenarios of this run
+  if '--event-driven' in sys.argv:
+    Scenario.mode = 'event'
+  if '--report' in sys.argv:
+    Scenario.report = True
+
   ksc = conn.space_center
   vessel = ksc.active_vessel
 
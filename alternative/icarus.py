@@ -1,8 +1,12 @@
-import time
+import sys
 import krpc
+from lib.scenario.scenario import Scenario
 from lib.scenario.launch import LaunchScenario
 from lib.scenario.exec_node import ExecNodeScenario
-from lib.nav import compute_circ_burn
+from csk.lib.nav import compute_circ_burn
+from csk.lib.clock import default_clock
+from csk.lib.streams import StreamPool
+from csk.lib import bodies
 
 
 def is_icarus_engine_active(vessel):
@@ -17,53 +21,57 @@ def is_landed(vessel):
           vessel.situation.name == 'splashed')
 
 
-def perform_launch(conn, ksc, vessel):
+def perform_launch(conn, ksc, vessel, streams):
   launch_params = {'target_altitude': 120000,
                    'target_apt': 50.0,
                    'turn_end_alt': 95000}
 
-  LaunchScenario(context={'conn': conn}, parameters=launch_params).run()
+  LaunchScenario(context={'conn': conn, 'streams': streams},
+                 parameters=launch_params).run()
 
-  while not is_icarus_engine_active(vessel):
+  # Drop the booster until the capsule engine burns, as long as stages remain
+  while not is_icarus_engine_active(vessel) and vessel.control.current_stage > 0:
     vessel.control.activate_next_stage()
 
   apo_time = vessel.orbit.time_to_apoapsis
-  circ_burn = compute_circ_burn(vessel)
+  body = bodies.for_connection(conn).get(vessel.orbit.body)
+  circ_burn = compute_circ_burn(vessel, body=body)
   node = vessel.control.add_node(ksc.ut + apo_time,
                                  prograde=circ_burn["delta_v"])
 
-  ExecNodeScenario(context={'conn': conn},
+  ExecNodeScenario(context={'conn': conn, 'streams': streams},
                    parameters={'node': node}).run()
 
 
-def perform_return(conn, ksc, vessel):
+def perform_return(conn, ksc, vessel, streams):
+  clock = default_clock(conn)
   if len(vessel.control.nodes) == 0:
     print('No reentry maneuver')
     return
 
   node = vessel.control.nodes[0]
-  ExecNodeScenario(context={'conn': conn},
+  ExecNodeScenario(context={'conn': conn, 'streams': streams},
                    parameters={'node': node}).run()
 
-  altitude = conn.add_stream(getattr, vessel.flight(),
-                             'mean_altitude')
+  altitude = streams.acquire(vessel.flight(), 'mean_altitude')
 
-  atm_alt = vessel.orbit.body.atmosphere_depth
+  atm_alt = bodies.for_connection(conn).get(vessel.orbit.body).atmosphere_depth
 
   while altitude() > atm_alt:
     ksc.rails_warp_factor = 7
-    time.sleep(0.01)
+    clock.sleep(0.01)
 
   ksc.rails_warp_factor = 0
+  streams.release(altitude)
   vessel.control.activate_next_stage()
-  perform_reentry(conn, ksc, vessel)
+  perform_reentry(conn, ksc, vessel, streams)
 
 
-def perform_reentry(conn, ksc, vessel):
+def perform_reentry(conn, ksc, vessel, streams):
+  clock = default_clock(conn)
   flight_ref = vessel.flight(vessel.orbit.body.reference_frame)
-  altitude = conn.add_stream(getattr, vessel.flight(),
-                             'mean_altitude')
-  speed = conn.add_stream(getattr, flight_ref, 'speed')
+  altitude = streams.acquire(vessel.flight(), 'mean_altitude')
+  speed = streams.acquire(flight_ref, 'speed')
 
   ap = vessel.auto_pilot
 
@@ -78,19 +86,41 @@ def perform_reentry(conn, ksc, vessel):
       ap.disengage()
       break
 
-    time.sleep(0.1)
+    clock.sleep(0.1)
+
+  streams.release(altitude)
+  streams.release(speed)
 
 
 if __name__ == '__main__':
-  conn = krpc.connect()
+  if '--sim' in sys.argv:
+    import csk.sim
+    from csk.sim.vehicles import SIM_CAPSULE
+    # Virtual time: the flight runs as fast as it can be computed
+    conn = csk.sim.connect(SIM_CAPSULE, time_scale=None)
+  else:
+    conn = krpc.connect()
+
+  # Scenario options, for all scenarios of this run
+  if '--event-driven' in sys.argv:
+    Scenario.mode = 'event'
+  if '--report' in sys.argv:
+    Scenario.report = True
+
   ksc = conn.space_center
   vessel = ksc.active_vessel
 
-  if vessel.situation.name == 'pre_launch':
-    perform_launch(conn, ksc, vessel)
+  # Streams shared by the scenarios of this run, all closed at the end
+  with StreamPool(conn) as streams:
+    if vessel.situation.name == 'pre_launch':
+      perform_launch(conn, ksc, vessel, streams)
+
+    elif vessel.situation.name == 'orbiting':
+      perform_return(conn, ksc, vessel, streams)
 
-  elif vessel.situation.name == 'orbiting':
-    perform_return(conn, ksc, vessel)
+    elif vessel.situation.name == 'flying':
+      perform_reentry(conn, ksc, vessel, streams)
 
-  elif vessel.situation.name == 'flying':
-    perform_reentry(conn, ksc, vessel)
+    if Scenario.report:
+      print("[icarus]", "%d streams opened, %d reused, %d open" %
+            (streams.opened, streams.reused, streams.open_streams))
@@ -0,0 +1,13 @@
+"""Library of the alternative scripts
+
+  Modules shared with csk missions live in the csk package at the
+  repository root, which is put in the import path here: scripts run
+  from this directory import them as csk.lib.
+"""
+
+import os
+import sys
+
+_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+if _root not in sys.path:
+  sys.path.append(_root)
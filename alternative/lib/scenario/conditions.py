@@ -0,0 +1,79 @@
+"""Declarative event conditions
+
+  A condition compares a remote value with a constant:
+    ('altitude', '>', 38000)
+  where 'altitude' names a value source registered by the scenario.
+  The constant may also be a function of the scenario, called when
+  the scenario starts.
+
+  Conditions are compiled into kRPC server-side expressions when the
+  server supports them, so they are evaluated by the server and only
+  reported when they become true. Otherwise, they are evaluated from
+  the update callbacks of the source stream. Either way, the callback
+  is called when the condition flips from false to true.
+"""
+
+from .wake import OPERATORS
+
+EXPRESSIONS = {'<': 'less_than',
+               '<=': 'less_than_or_equal',
+               '>': 'greater_than',
+               '>=': 'greater_than_or_equal',
+               '==': 'equal',
+               '!=': 'not_equal'}
+
+
+class ServerCondition:
+  """Condition evaluated by the server, as a kRPC event"""
+
+  def __init__(self, conn, obj, attr, op, value, callback):
+    expression = conn.krpc.Expression
+    left = expression.call(conn.get_call(getattr, obj, attr))
+    if type(value) is bool:
+      right = expression.constant_bool(value)
+    else:
+      right = expression.constant_double(float(value))
+
+    self.event = conn.krpc.add_event(getattr(expression, EXPRESSIONS[op])(left, right))
+    self.event.add_callback(callback)
+    self.event.start()
+
+  def remove(self):
+    self.event.remove()
+
+
+class StreamCondition:
+  """Condition evaluated locally, each time its stream is updated"""
+
+  def __init__(self, stream, op, value, callback):
+    self.stream = stream
+    self.op = OPERATORS[op]
+    self.value = value
+    self.callback = callback
+    self.state = False
+
+    stream.add_callback(self.update)
+    self.update(stream())
+
+  def update(self, value):
+    state = self.op(value, self.value)
+    if state and not self.state:
+      self.callback()
+    self.state = state
+
+  def remove(self):
+    self.stream.remove_callback(self.update)
+
+
+def compile_condition(conn, source, stream, condition, callback):
+  """Watches a condition, server-side if possible
+
+    source is the (object, attribute) pair the stream reads
+  """
+  name, op, value = condition
+  if source is not None and hasattr(conn.krpc, 'add_event'):
+    try:
+      return ServerCondition(conn, source[0], source[1], op, value, callback)
+    except Exception as e:
+      print("[conditions]", "%s %s %s evaluated locally: %s" % (name, op, value, e))
+  return StreamCondition(stream, op, value, callback)
@@ -1,6 +1,7 @@
+import math
 from .scenario import Scenario
-from ..nav import compute_burn_time
-from ..parts import auto_stage
+from csk.lib.control import ControlChannel
+from csk.lib.kepler import OrbitPropagator
 
 
 class ExecNodeScenario(Scenario):
@@ -8,18 +9,37 @@ class ExecNodeScenario(Scenario):
   parameters = {'lead_time': 15,
                 'use_rcs': True,
                 'max_autostage': 0,
-                'stage_wait': 1}
+                'stage_wait': 1,
+                # The throttle eases down to min_throttle near the end of the
+                # burn, which ends once dv_tolerance m/s or less remain
+                'min_throttle': 0.05,
+                'dv_tolerance': 0.1}
 
   def pre_run(self):
     self.conn = self.context['conn']
     self.ksc = self.conn.space_center
-    self.vessel = self.ksc.active_vessel
-    self.control = self.vessel.control
-    self.ap = self.vessel.auto_pilot
+    self.channel = ControlChannel(self.control, self.ap,
+                                  self.parameters.get('control_tolerances'))
 
-    self.ut = self.conn.add_stream(getattr, self.ksc, 'ut')
-    self.rem_dv = self.conn.add_stream(getattr, self.parameters['node'],
-                                       'remaining_delta_v')
+    self.ut = self.acquire(self.ksc, 'ut', priority='control')
+    self.rem_dv = self.acquire(self.parameters['node'], 'remaining_delta_v',
+                               priority='guidance')
+    self.mass = self.acquire(self.vessel, 'mass', priority='guidance')
+    node = self.parameters['node']
+    self.node_ut = node.ut
+    self.node_dv = node.delta_v
+
+    # Orbit of the vessel between stream updates, for warp decisions: its
+    # state vector is streamed in the class of ut, so both come from the
+    # same update
+    frame = self.vessel_context.non_rotating_frame
+    self.propagator = OrbitPropagator(
+        self.body_constants,
+        self.acquire(self.vessel, 'position', frame, priority='control'),
+        self.acquire(self.vessel, 'velocity', frame, priority='control'),
+        self.ut,
+        self.acquire(self.vessel, 'thrust', priority='control'))
+    self.warp_factor = None
 
     self.init_ui()
 
@@ -40,54 +60,91 @@ class ExecNodeScenario(Scenario):
 
   def pre_burn(self):
     burn_start_ut = self.burn_start_ut()
+    ut = self.ut()
 
     # burn start ut has passed?
-    if self.ut() >= burn_start_ut:
+    if ut >= burn_start_ut:
       self.point_to_node()
       self.context['burning'] = True
+      # Remaining delta-v ends the burn: follow every update
+      self.retune('guidance', 0)
       return
 
-    # enough time to warp?
+    # enough time to warp? Rails warp stops before the vessel enters the
+    # air, which it flies through unwarped
     lead_time = self.parameters['lead_time']
-    if self.ut() < (burn_start_ut - lead_time * 2):
-      self.ksc.rails_warp_factor = 7
-    elif self.ut() < (burn_start_ut - lead_time):
-      self.ksc.rails_warp_factor = 2
+    air_ut = self.air_entry_ut(ut)
+    if ut < min(burn_start_ut - lead_time * 2, air_ut - lead_time):
+      self.warp(7)
+      self.wake_at(min(burn_start_ut - lead_time * 2, air_ut - lead_time))
+    elif ut < min(burn_start_ut - lead_time, air_ut):
+      self.warp(2)
+      self.wake_at(min(burn_start_ut - lead_time, air_ut))
+    elif ut < burn_start_ut - lead_time:
+      # In the air: polled until the propagator sees the vessel coast again
+      self.warp(0)
     else:
-      self.ksc.rails_warp_factor = 0
+      self.warp(0)
       self.point_to_node()
+      self.wake_at(burn_start_ut)
 
   def burn(self):
     rem_dv = self.rem_dv()
     node = self.parameters['node']
 
-    if rem_dv - self.context.get('last_remaining', rem_dv) > 0.01:
-      self.control.throttle = 0
+    if (rem_dv <= self.parameters['dv_tolerance'] or
+        rem_dv - self.context.get('last_remaining', rem_dv) > 0.01):
+      self.channel.throttle = 0
       self.ap.disengage()
+      self.pool.discard(node)
       self.parameters['node'].remove()
       del self.parameters['node']
       return
 
-    part_done = max(0, round((node.delta_v - rem_dv) / node.delta_v, 2))
-    self.control.throttle = 1 - part_done
+    part_done = max(0, round((self.node_dv - rem_dv) / self.node_dv, 2))
+    self.channel.throttle = max(self.parameters['min_throttle'], 1 - part_done)
 
     self.context['last_remaining'] = rem_dv
-
-    auto_stage(self.vessel,
-               max_autostage=self.parameters['max_autostage'],
-               stage_wait=self.parameters['stage_wait'])
+    # The throttle follows the remaining delta-v by 1 % of the node
+    self.wake_on_change(self.rem_dv, self.node_dv / 100)
+    self.wake_when(self.rem_dv, '<=', self.parameters['dv_tolerance'])
+
+    if self.auto_stage():
+      self.wake_at(self.ut() + self.parameters['stage_wait'])
+
+  def warp(self, factor):
+    # Setting the warp factor is a remote call: skip it if unchanged
+    if factor != self.warp_factor:
+      self.ksc.rails_warp_factor = factor
+      self.warp_factor = factor
+
+  def air_entry_ut(self, ut):
+    """Predicted time the vessel enters the air, ut while it is in it
+
+      The propagator is fitted again on every call while the vessel
+      flies through the air or thrusts, and once more when it coasts
+      above the air again.
+    """
+    propagator = self.propagator
+    constants = propagator.constants
+    if not constants.has_atmosphere:
+      return math.inf
+    orbit = propagator.orbit()
+    if not propagator.coasting:
+      return ut
+    return ut + orbit.time_below(ut, constants.atmosphere_depth)
 
   def point_to_node(self):
     node = self.parameters['node']
-    self.control.rcs = self.parameters['use_rcs']
+    self.channel.rcs = self.parameters['use_rcs']
     self.ap.engage()
     self.ap.reference_frame = node.reference_frame
     self.ap.target_direction = (0, 1, 0)
 
   def burn_start_ut(self):
-    node = self.parameters['node']
-    burn_time = compute_burn_time(self.vessel, node.delta_v)
-    return node.ut - burn_time / 2
+    performance = self.vessel_context.performance
+    burn_time = performance.burn_time(self.node_dv, self.mass())
+    return self.node_ut - burn_time / 2
 
   def init_ui(self):
     canvas = self.conn.ui.stock_canvas
@@ -139,11 +196,10 @@ class ExecNodeScenario(Scenario):
 
   def update_ui(self):
     texts = self.context['ui']['texts']
-    node = self.parameters['node']
     last_rem_dv = self.context.get('last_remaining', self.rem_dv())
 
     texts['burning'].content = "Burning: %s" % self.context.get('burning', False)
-    texts['node_ut'].content = "Node in: %d s" % (node.ut - self.ut())
-    texts['node_dv'].content = "Total dV: %.1f m/s" % node.delta_v
+    texts['node_ut'].content = "Node in: %d s" % (self.node_ut - self.ut())
+    texts['node_dv'].content = "Total dV: %.1f m/s" % self.node_dv
     texts['rem_dv'].content = "Rem. dV: %.1f m/s" % self.rem_dv()
     texts['last_rem_dv'].content = "Prev rem. dV: %.1f m/s" % last_rem_dv
@@ -1,8 +1,9 @@
 from math import sqrt
 from .scenario import Scenario
-from ..parts import auto_stage, find_all_fairings, jettison_fairing
-from ..pid import PID
-from ..nav import pitch
+from csk.lib.control import ControlChannel
+from csk.lib.parts import jettison_indexed_fairing
+from csk.lib.pid import PID
+from csk.lib.nav import pitch
 
 
 class LaunchScenario(Scenario):
@@ -17,11 +18,14 @@ class LaunchScenario(Scenario):
                 'turn_style': 'square_root',
                 'min_pitch': 0,
                 'pitch_offset': 30,
-                'stage_wait': 1}
+                'stage_wait': 1,
+                # Guidance wakes up once APT moved by this much, in s
+                'apt_wake_delta': 0.1}
 
   events = {
     'high_altitude': {
-      'condition': lambda s: s.stat_press() < 100,
+      # Static pressure below 100 Pa, as an altitude (see csk.lib.atmosphere)
+      'when': ('altitude', '>', lambda s: s.high_alt),
       'action': lambda s: s.on_high_alt()
     }
   }
@@ -29,28 +33,19 @@ class LaunchScenario(Scenario):
   def pre_run(self):
     self.conn = self.context['conn']
     self.ksc = self.conn.space_center
-    self.vessel = self.ksc.active_vessel
-    self.control = self.vessel.control
-    self.ap = self.vessel.auto_pilot
+    self.channel = ControlChannel(self.control, self.ap,
+                                  self.parameters.get('control_tolerances'))
     self.start_ut = self.ksc.ut
     self.target_apt = self.parameters['target_apt']
 
-    flight_ref = self.vessel.flight(self.vessel.orbit.body.reference_frame)
-
-    self.ut = self.conn.add_stream(getattr, self.ksc, 'ut')
-    self.speed = self.conn.add_stream(getattr,
-                                      flight_ref, 'speed')
-    self.altitude = self.conn.add_stream(getattr, self.vessel.flight(),
-                                         'mean_altitude')
-    self.apo_time = self.conn.add_stream(getattr, self.vessel.orbit,
-                                         'time_to_apoapsis')
-    self.per_time = self.conn.add_stream(getattr, self.vessel.orbit,
-                                         'time_to_periapsis')
-    self.apoapsis = self.conn.add_stream(getattr, self.vessel.orbit,
-                                         'apoapsis_altitude')
-    self.stat_press = self.conn.add_stream(getattr,
-                                           self.vessel.flight(),
-                                           'static_pressure')
+    handles = self.vessel_context
+    self.ut = self.acquire(self.ksc, 'ut', priority='control')
+    self.speed = self.acquire(handles.surface_flight, 'speed', priority='guidance')
+    self.add_stream('altitude', handles.flight, 'mean_altitude', priority='guidance')
+    self.apo_time = self.acquire(handles.orbit, 'time_to_apoapsis', priority='control')
+    self.per_time = self.acquire(handles.orbit, 'time_to_periapsis', priority='guidance')
+    self.apoapsis = self.acquire(handles.orbit, 'apoapsis_altitude', priority='guidance')
+    self.high_alt = self.atmosphere.altitude_below(100)
 
     self.thr_pid = PID(0.2, 0.01, 0.1, 0.1, 1)
     self.pitch_pid = PID(0.5, 0.05, 0.2, 0, self.parameters['pitch_offset'])
@@ -64,33 +59,36 @@ class LaunchScenario(Scenario):
       self.meco()
       self.context['step_name'] = 'Coasting'
       # stop this scenario if above atmo and target apo achieved
-      if self.altitude() > self.vessel.orbit.body.atmosphere_depth:
+      atmosphere_depth = self.body_constants.atmosphere_depth
+      if self.altitude() > atmosphere_depth:
         return False
+      self.wake_when(self.altitude, '>', atmosphere_depth)
 
     if self.vessel.situation.name == 'pre_launch':
       self.context['step_name'] = 'Pre-launch'
       return self.handle_prelaunch()
 
-    auto_stage(self.vessel,
-               max_autostage=self.parameters['max_autostage'],
-               stage_wait=self.parameters['stage_wait'])
+    if self.auto_stage():
+      self.wake_at(self.ut() + self.parameters['stage_wait'])
 
     self.context['step_name'] = 'Launch'
     if self.speed() > self.parameters['turn_start_speed']:
       self.context['step_name'] = 'Gravity turn'
       self.grav_turn()
+    else:
+      self.wake_when(self.speed, '>', self.parameters['turn_start_speed'])
 
   def handle_prelaunch(self):
     if self.ut() - self.start_ut < 1:
       self.ap.engage()
-      self.ap.target_pitch_and_heading(90, 90)
-      self.control.throttle = 1
-      self.control.sas = False
-      self.control.rcs = self.parameters['use_rcs']
+      self.channel.target_pitch_and_heading(90, 90)
+      self.channel.throttle = 1
+      self.channel.sas = False
+      self.channel.rcs = self.parameters['use_rcs']
+      self.wake_at(self.start_ut + 1)
 
-    else:
-      while len(self.vessel.parts.launch_clamps) > 0:
-        self.control.activate_next_stage()
+    elif self.release_clamps():
+      self.wake_at(self.ut() + self.parameters['stage_wait'])
 
   def grav_turn(self):
     if 'turn_start_alt' not in self.context:
@@ -121,10 +119,10 @@ class LaunchScenario(Scenario):
       else:
         self.context['adjust_pitch'] = (apt < (self.target_apt * 0.8) and
                                         apt < self.context.get('last_apt', 0) and
-                                        self.stat_press() < 100)
+                                        self.altitude() > self.high_alt)
         set_pitch = target_pitch
 
-    if self.altitude() > self.vessel.orbit.body.atmosphere_depth:
+    if self.altitude() > self.body_constants.atmosphere_depth:
       apo_err = self.parameters['target_altitude'] - self.apoapsis()
       if apo_err < 10:
         new_thr = .1
@@ -132,10 +130,11 @@ class LaunchScenario(Scenario):
     if self.ut() - self.context['turn_start_ut'] < 1:
       new_thr = 1
 
-    self.control.throttle = new_thr
-    self.ap.target_pitch_and_heading(set_pitch, 90)
+    self.channel.throttle = new_thr
+    self.channel.target_pitch_and_heading(set_pitch, 90)
 
     self.context['set_pitch'] = set_pitch
+    self.wake_on_change(self.apo_time, self.parameters['apt_wake_delta'])
 
     ut = self.ut()
     last_ut = self.context.get('last_apt_ut', 0)
@@ -148,15 +147,13 @@ class LaunchScenario(Scenario):
     self.context['ui']['panel'].remove()
 
   def on_high_alt(self):
-    if len(find_all_fairings(self.vessel)) > 0:
-      fairings = filter(lambda f: getattr(f, 'tag', None) != "noauto",
-                        find_all_fairings(self.vessel))
-      for f in fairings:
-        jettison_fairing(f)
+    for fairing in self.vessel_context.parts_index.fairings():
+      if fairing.tag != "noauto":
+        jettison_indexed_fairing(fairing)
 
   def meco(self):
-    self.control.throttle = 0
-    self.ap.reference_frame = self.vessel.orbital_reference_frame
+    self.channel.throttle = 0
+    self.ap.reference_frame = self.vessel_context.orbital_frame
     self.ap.target_direction = (0, 1, 0)
 
   def init_ui(self):
@@ -230,7 +227,7 @@ class LaunchScenario(Scenario):
     else:
       texts['target_pitch'].content = "Tgt. pitch: %d °" % target_pitch
     texts['speed'].content = "Speed: %d m/s" % self.speed()
-    texts['throttle'].content = "Throttle: %.1f %%" % (self.control.throttle * 100.0)
+    texts['throttle'].content = "Throttle: %.1f %%" % (self.channel.throttle * 100.0)
     texts['altitude'].content = "Altitude: %d m" % self.altitude()
     texts['current_pitch'].content = "Cur. pitch: %d °" % pitch(self.vessel)
     texts['target_apt'].content = "Tgt. APT: %.1f s" % target_apt
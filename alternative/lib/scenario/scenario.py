@@ -1,51 +1,306 @@
 import time
+from csk.lib.clock import default_clock
+from csk.lib.streams import StreamPool
+from csk.lib.control import ControlChannel
+from csk.lib.vessel import VesselContext
+from csk.lib.parts import StagingPlan, AutoStager
+from csk.lib import bodies
+from .wake import Waker, StreamChange, Threshold, Deadline
+from .conditions import compile_condition
 
 class Scenario:
 
   parameters = {}
   events = {}
   context = {}
+  channel = None
+  clock = None
 
-  def __init__(self, parameters=None, events=None, context=None, stepfunc=None):
+  # 'poll': wait poll_period between steps
+  # 'event': wait for a wake trigger declared by the step, at most max_wait
+  mode = 'poll'
+  poll_period = 0.1
+  max_wait = 1.
+  report = False
+  waker = None
+  stats = None
+  runtime = None
+
+  # Value sources of event conditions: name -> (object, attribute)
+  sources = None
+  conditions = None
+  fired = None
+
+  # Streams are acquired from context['streams'], a StreamPool shared
+  # with the scenarios run before and after this one, if given
+  pool = None
+  owns_pool = False
+  acquired = None
+
+  # Handles of the active vessel, resolved once (see csk.lib.vessel)
+  vessel_context = None
+
+  # Automatic staging, one action per tick (see csk.lib.parts), created by
+  # the first call to auto_stage() or release_clamps()
+  stager = None
+  thrust = None
+
+  # Stream rates of priority classes while the scenario runs, overriding
+  # the defaults of csk.lib.streams (steps may retune them through retune())
+  rates = None
+
+  def __init__(self, parameters=None, events=None, context=None, stepfunc=None,
+               clock=None, mode=None):
     if type(parameters) is dict:
       self.parameters = {**self.parameters, **parameters}
 
     if type(events) is dict:
       self.events = {**self.events, **events}
+    else:
+      self.events = dict(self.events)
 
     if type(context) is dict:
       self.context = {**self.context, **context}
 
     self.stepfunc = stepfunc
+    self.sources = {}
+    self.acquired = []
+    self.clock = clock if clock is not None else default_clock(self.context.get('conn'))
+    if mode is not None:
+      self.mode = mode
 
   def handle_events(self):
     stop = False
 
     for name in list(self.events):
       event = self.events[name]
-      if event['condition'](self) is True:
+      if 'when' in event:
+        triggered = name in self.fired
+        self.fired.discard(name)
+      else:
+        triggered = event['condition'](self) is True
+
+      if triggered:
         res_event = event['action'](self)
         stop = stop or res_event is False
-        if not getattr(event, 'preserve', False):
+        if not event.get('preserve', False):
           del self.events[name]
+          if name in self.conditions:
+            self.conditions.pop(name).remove()
 
     return not stop
 
+  def stream_pool(self):
+    """Returns the pool streams are acquired from, creating it if needed"""
+    if self.pool is None:
+      self.pool = self.context.get('streams')
+      if self.pool is None:
+        self.pool = StreamPool(self.context['conn'])
+        self.owns_pool = True
+    return self.pool
+
+  def acquire(self, obj, attr, *args, priority=None):
+    """Returns a stream on obj.attr, released when the scenario ends"""
+    stream = self.stream_pool().acquire(obj, attr, *args, priority=priority)
+    self.acquired.append(stream)
+    return stream
+
+  def release_streams(self):
+    """Gives back the acquired streams, closing them if the pool is private"""
+    for stream in self.acquired:
+      self.pool.release(stream)
+    self.acquired = []
+    if self.owns_pool:
+      self.pool.close()
+
+  def retune(self, priority, rate):
+    """Changes the update rate of a priority class until the scenario ends"""
+    self.pool.rates.retune(priority, rate)
+
+  def add_stream(self, name, obj, attr, priority=None):
+    """Acquires a stream on obj.attr as self.<name>, usable in event conditions"""
+    stream = self.acquire(obj, attr, priority=priority)
+    self.sources[name] = (obj, attr)
+    setattr(self, name, stream)
+    return stream
+
+  def watch_events(self):
+    """Compiles the conditions of events declared with 'when'"""
+    self.fired = set()
+    self.conditions = {}
+    for name, event in self.events.items():
+      if 'when' in event:
+        source, op, value = event['when']
+        if callable(value):
+          value = value(self)
+        self.conditions[name] = compile_condition(self.context['conn'],
+                                                  self.sources.get(source),
+                                                  getattr(self, source),
+                                                  (source, op, value),
+                                                  self.event_fired(name))
+
+  def event_fired(self, name):
+    def callback():
+      self.fired.add(name)
+      self.waker.fire()
+    return callback
+
+  @property
+  def vessel(self):
+    return self.vessel_context.vessel
+
+  @property
+  def control(self):
+    return self.vessel_context.control
+
+  @property
+  def ap(self):
+    return self.vessel_context.auto_pilot
+
+  @property
+  def body_constants(self):
+    """Constants of the body, read once (see csk.lib.bodies)"""
+    return bodies.for_connection(self.context['conn']).get(self.vessel_context.body)
+
+  @property
+  def atmosphere(self):
+    """Atmosphere profile of the body, sampled once (see csk.lib.atmosphere)"""
+    return bodies.for_connection(self.context['conn']).atmosphere(self.vessel_context.body)
+
+  def check_vessel(self):
+    """Drops stale vessel handles, once per tick"""
+    if self.vessel_context is not None and self.vessel_context.check():
+      self.vessel_changed()
+
+  def get_stager(self):
+    if self.stager is None:
+      self.stager = AutoStager(StagingPlan(self.vessel_context.parts_index),
+                               self.control, self.channel, self.clock,
+                               max_autostage=self.parameters.get('max_autostage', 0),
+                               stage_wait=self.parameters.get('stage_wait', 0.5))
+    return self.stager
+
+  def auto_stage(self):
+    """Stages if no thrust is available, and tells if staging goes on"""
+    if self.thrust is None:
+      self.thrust = self.acquire(self.vessel, 'available_thrust', priority='control')
+    return self.get_stager().update(self.vessel_context.current_stage, self.thrust())
+
+  def release_clamps(self):
+    """Stages toward releasing the launch clamps, and tells if some remain"""
+    return self.get_stager().release_clamps(self.vessel_context.current_stage)
+
+  def vessel_changed(self):
+    """Called when the active vessel changed"""
+    if self.stager is not None:
+      self.stager.cancel()
+      self.stager = None
+      self.thrust = None
+    if self.channel is not None:
+      self.channel = ControlChannel(self.control, self.ap,
+                                    self.parameters.get('control_tolerances'))
+
   def pre_run(self):
     pass
 
-  def run(self):
+  def wake_on_change(self, stream, delta=0.):
+    self.waker.add(StreamChange(stream, delta))
+
+  def wake_when(self, stream, op, value):
+    self.waker.add(Threshold(stream, op, value))
+
+  def wake_at(self, ut):
+    self.waker.add(Deadline(self.ut, ut))
+
+  def arm_wait(self):
+    """Arms the wake triggers, and tells if the wait should block on them"""
+    armed = self.waker.arm() or len(self.conditions) > 0
+    if self.fired:
+      self.waker.fire()
+    return self.mode == 'event' and armed
+
+  def woke(self):
+    latency = self.waker.latency()
+    if latency is not None:
+      self.stats['wakes'] += 1
+      self.stats['latency'] += latency
+      self.stats['max_latency'] = max(self.stats['max_latency'], latency)
+
+  def wait(self):
+    # Against the stand-in, waits also run the simulation: CPU spent in
+    # them is kept apart from the CPU of the steps
+    cpu = time.process_time()
+    if self.arm_wait():
+      self.waker.wait(self.max_wait)
+    else:
+      self.clock.sleep(self.poll_period)
+    self.stats['wait_cpu'] += time.process_time() - cpu
+    self.woke()
+
+  def begin(self):
+    if 'conn' in self.context:
+      self.vessel_context = VesselContext(self.context['conn'], streams=self.stream_pool())
+      # Acquire the vessel streams before unused ones are collected
+      self.vessel_context.check()
     self.pre_run()
-    while True:
-      res_step = self.step()
-      res_events = self.handle_events()
+    if self.pool is not None:
+      # Close the streams of previous scenarios this one did not acquire again
+      self.pool.collect()
+      self.pool.rates.phase(self.rates)
+    self.waker = Waker(self.clock)
+    self.stats = {'ticks': 0, 'wakes': 0, 'latency': 0., 'max_latency': 0.,
+                  'wait_cpu': 0.}
+    self.watch_events()
+    self.start_time = self.clock.now()
+    self.start_cpu = time.process_time()
+
+  def after_step(self, res_step):
+    """Handles events and sends controls, then tells if the scenario goes on"""
+    res_events = self.handle_events()
+    self.stats['ticks'] += 1
 
-      if res_step is False or res_events is False:
-        break
+    if self.channel is not None:
+      self.channel.flush()
+    self.check_vessel()
 
-      time.sleep(0.1)
+    return res_step is not False and res_events is not False
+
+  def end(self):
+    if self.stager is not None:
+      self.stager.cancel()
+      if self.channel is not None:
+        self.channel.flush()
+    self.waker.close()
+    if self.vessel_context is not None:
+      self.vessel_context.close()
+    for condition in self.conditions.values():
+      condition.remove()
+    self.stats['cpu'] = time.process_time() - self.start_cpu
+    self.stats['duration'] = self.clock.now() - self.start_time
+    if self.report:
+      self.print_stats()
 
     self.post_run()
+    self.release_streams()
+
+  def run(self):
+    self.begin()
+    while self.after_step(self.step()):
+      self.wait()
+    self.end()
+
+  def print_stats(self):
+    stats = self.stats
+    wakes = max(1, stats['wakes'])
+    print("[%s]" % type(self).__name__,
+          "%s mode: %d ticks in %.1f s, CPU %.2f s in steps, %.2f s waiting, "
+          "wake latency %.1f ms avg / %.1f ms max" %
+          (self.mode, stats['ticks'], stats['duration'], stats['cpu'] - stats['wait_cpu'],
+           stats['wait_cpu'], stats['latency'] / wakes * 1000, stats['max_latency'] * 1000))
+    if self.pool is not None:
+      print("[%s]" % type(self).__name__,
+            "%d streams acquired, %d open" % (len(self.acquired), self.pool.open_streams))
+      self.pool.rates.print_report("[%s]" % type(self).__name__)
 
   def post_run(self):
     pass
@@ -0,0 +1,134 @@
+"""Wake triggers for scenarios
+
+  A trigger tells what a scenario is waiting for before its next step:
+    StreamChange(stream, delta): the value of a stream moves by more
+      than delta (any change with delta 0)
+    Threshold(stream, op, value): op(stream value, value) becomes true
+    Deadline(ut_stream, ut): game time reaches ut
+
+  Triggers are checked from stream update callbacks, so the scenario
+  loop can block until one of them fires instead of polling.
+"""
+
+import operator
+import threading
+import time
+
+OPERATORS = {'<': operator.lt,
+             '<=': operator.le,
+             '>': operator.gt,
+             '>=': operator.ge,
+             '==': operator.eq,
+             '!=': operator.ne}
+
+
+class StreamChange:
+
+  def __init__(self, stream, delta=0.):
+    self.stream = stream
+    self.delta = delta
+    self.initial = None
+
+  def arm(self, value):
+    self.initial = value
+
+  def fired(self, value):
+    if self.delta == 0:
+      return value != self.initial
+    return abs(value - self.initial) > self.delta
+
+
+class Threshold:
+
+  def __init__(self, stream, op, value):
+    self.stream = stream
+    self.op = OPERATORS[op]
+    self.value = value
+
+  def arm(self, value):
+    pass
+
+  def fired(self, value):
+    return self.op(value, self.value)
+
+
+class Deadline(Threshold):
+
+  def __init__(self, ut_stream, ut):
+    Threshold.__init__(self, ut_stream, '>=', ut)
+
+
+class Waker:
+  """Blocks until one of the armed triggers fires
+
+    Triggers are declared for one wait only. The wall-clock time at
+    which the first trigger fired is kept, to measure how long it took
+    for the scenario to wake up: with a virtual clock, game time does
+    not move while the scenario is late.
+  """
+
+  def __init__(self, clock):
+    self.clock = clock
+    self.lock = threading.Lock()
+    self.event = threading.Event()
+    self.pending = []
+    self.armed = []
+    self.callbacks = {}
+    self.fired_at = None
+
+  def add(self, trigger):
+    """Declares a trigger for the next wait"""
+    self.pending.append(trigger)
+
+  def arm(self):
+    """Starts watching the triggers declared since the last wait"""
+    with self.lock:
+      self.armed, self.pending = self.pending, []
+      self.event.clear()
+      self.fired_at = None
+
+    for trigger in self.armed:
+      value = trigger.stream()
+      trigger.arm(value)
+      self.hook(trigger.stream)
+      if trigger.fired(value):
+        self.fire()
+
+    return len(self.armed) > 0
+
+  def hook(self, stream):
+    if stream in self.callbacks:
+      return
+
+    def callback(value):
+      with self.lock:
+        fired = any(t.fired(value) for t in self.armed if t.stream is stream)
+      if fired:
+        self.fire()
+
+    self.callbacks[stream] = callback
+    stream.add_callback(callback)
+
+  def fire(self):
+    with self.lock:
+      if self.fired_at is None:
+        self.fired_at = time.monotonic()
+      self.event.set()
+
+  def wait(self, timeout):
+    """Waits for a trigger to fire, for at most timeout seconds"""
+    return self.clock.wait(self.event, timeout)
+
+  def latency(self):
+    """Wall-clock time since the first trigger fired, or None if none did"""
+    with self.lock:
+      fired_at = self.fired_at
+      self.armed = []
+    if fired_at is None:
+      return None
+    return max(0., time.monotonic() - fired_at)
+
+  def close(self):
+    for stream, callback in self.callbacks.items():
+      stream.remove_callback(callback)
+    self.callbacks = {}
@@ -5,29 +5,28 @@
 """
 
 import sys
-import time
 import math
 import statistics
 import krpc
+import csk.sim
 from csk.lib.mission import Mission
-from csk.lib.nav import pitch
+from csk.lib.nav import direction_pitch
 from csk.lib.steps.launch import all_steps
 
 
 def wait_above_ksc(mission):
-  vessel = mission.conn.space_center.active_vessel
-
   if mission.current_step["first_call"]:
-    ant = mission.conn.remote_tech.comms(vessel).antennas[0]
-    mod = [m for m in ant.part.modules if m.name == 'ModuleRTAntenna'][0]
+    ant = mission.vessel_context.parts_index.with_module('ModuleRTAntenna')[0]
+    mod = ant.modules['ModuleRTAntenna']
     if mod.has_event('Activate'):
       mod.trigger_event('Activate')
 
-  lat = vessel.flight().latitude
-  lon = vessel.flight().longitude
+  lat = mission.telemetry.latitude
+  lon = mission.telemetry.longitude
   lat_err = math.fabs(0 - lat)
   lon_err = math.fabs(-75 - lon)
-  sun_exp = statistics.mean([p.sun_exposure for p in vessel.parts.solar_panels])
+  solar_panels = mission.vessel_context.parts.solar_panels
+  sun_exp = statistics.mean([p.sun_exposure for p in solar_panels])
 
   if lon_err > 20 or sun_exp == 0:
     mission.conn.space_center.rails_warp_factor = 7
@@ -42,18 +41,17 @@ def wait_above_ksc(mission):
 
 
 def take_photo(mission):
-  vessel = mission.conn.space_center.active_vessel
-  ap = vessel.auto_pilot
+  ap = mission.vessel_context.auto_pilot
 
   if mission.current_step["first_call"]:
-    vessel.control.rcs = True
+    mission.channel.rcs = True
     ap.engage()
-    ap.reference_frame = vessel.orbital_reference_frame
+    ap.reference_frame = mission.vessel_context.orbital_frame
     ap.target_direction = (1, 0, 0)
 
-  if ap.error < 1:
-    cam = vessel.parts.with_name('hc.kazzelblad')[0]
-    mod = [m for m in cam.modules if m.name == 'MuMechModuleHullCameraZoom'][0]
+  if mission.read(ap, 'error') < 1:
+    cam = mission.vessel_context.parts_index.with_name('hc.kazzelblad')[0]
+    mod = cam.modules['MuMechModuleHullCameraZoom']
     if mod.has_event('Activate Camera'):
       mod.trigger_event('Activate Camera')
     mission.next()
@@ -119,8 +117,10 @@ def init_ui(conn):
 
 
 if __name__ == "__main__":
-  conn = krpc.connect()
-  vessel = conn.space_center.active_vessel
+  if '--sim' in sys.argv:
+    conn = csk.sim.connect(time_scale=None)
+  else:
+    conn = krpc.connect()
 
   params = {'target_altitude': 120000,
             'turn_end_alt': 80000,
@@ -133,27 +133,23 @@ if __name__ == "__main__":
   ]
 
   mission = Mission(conn, mission_steps, params)
+  if '--count-rpcs' in sys.argv:
+    mission.count_rpcs()
   ui = init_ui(conn)
 
-  orbit_frame = vessel.orbit.body.reference_frame
-
-  ut = conn.add_stream(getattr, conn.space_center, 'ut')
-  speed = conn.add_stream(getattr, vessel.flight(orbit_frame), 'speed')
-  altitude = conn.add_stream(getattr, vessel.flight(), 'mean_altitude')
-  apo_time = conn.add_stream(getattr, vessel.orbit, 'time_to_apoapsis')
-  thr = conn.add_stream(getattr, vessel.control, 'throttle')
-
   starting_step = None
-  if len(sys.argv) > 1:
-    starting_step = sys.argv[1]
+  args = [a for a in sys.argv[1:] if not a.startswith('--')]
+  if len(args) > 0:
+    starting_step = args[0]
 
   mission.start(step=starting_step)
-  last_log = ut()
+  last_log = None
 
   while mission.running:
     mission.update()
+    telemetry = mission.telemetry
 
-    if ut() - last_log > 1:
+    if last_log is None or telemetry.ut - last_log > 1:
       target_apt = mission.parameters.get('target_apt')
       target_pitch = mission.parameters.get('target_pitch', None)
 
@@ -163,13 +159,13 @@ if __name__ == "__main__":
         ui['texts']['target_pitch'].content = "Tgt. pitch: N/A"
       else:
         ui['texts']['target_pitch'].content = "Tgt. pitch: %d °" % target_pitch
-      ui['texts']['speed'].content = "Speed: %d m/s" % speed()
-      ui['texts']['throttle'].content = "Throttle: %.1f %%" % (thr() * 100.0)
-      ui['texts']['altitude'].content = "Altitude: %d m" % altitude()
-      ui['texts']['current_pitch'].content = "Cur. pitch: %d °" % pitch(vessel)
+      ui['texts']['speed'].content = "Speed: %d m/s" % telemetry.speed
+      ui['texts']['throttle'].content = "Throttle: %.1f %%" % (telemetry.throttle * 100.0)
+      ui['texts']['altitude'].content = "Altitude: %d m" % telemetry.mean_altitude
+      ui['texts']['current_pitch'].content = "Cur. pitch: %d °" % direction_pitch(telemetry.direction)
       ui['texts']['target_apt'].content = "Tgt. APT: %.1f s" % target_apt
-      ui['texts']['current_apt'].content = "Cur. APT: %.1f s" % apo_time()
+      ui['texts']['current_apt'].content = "Cur. APT: %.1f s" % telemetry.time_to_apoapsis
       ui['texts']['step'].content = "Step: %s" % step_name
-      last_log = ut()
+      last_log = telemetry.ut
 
-    time.sleep(0.1)
+    mission.clock.sleep(0.1)
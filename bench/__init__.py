@@ -0,0 +1 @@
+"""Benchmarks, flown against the local kRPC stand-in (csk.sim)"""
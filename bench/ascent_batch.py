@@ -0,0 +1,80 @@
+"""Batch ascent benchmark
+
+  Flies a grid of gravity turn settings of the stand-in rocket at once
+  with BatchAscent, for both launch programs, and prints the time it
+  takes and the best settings found: those reaching orbit with the
+  most delta-v left after circularization.
+
+  An ascent reaching its target apoapsis above the atmosphere may not
+  have the delta-v left to raise its periapsis out of it: it only
+  reaches orbit if circularizing at apoapsis with the delta-v left
+  puts its periapsis above the atmosphere.
+
+  Usage: python -m bench.ascent_batch [vehicles per program]
+"""
+
+import sys
+import time
+import numpy as np
+import csk.sim
+from csk.sim.physics import ascent_stages
+from csk.sim.vehicles import SIM_ROCKET
+from csk.lib import bodies
+from csk.lib.ascent import BatchAscent, circularize
+
+TARGET_ALTITUDE = 120000
+BEST_COUNT = 5
+
+
+def grid(program, count):
+  """About count settings, spanning the parameters of a program"""
+  axes = {'turn_end_alt': np.linspace(40000, 120000, 8),
+          'target_apt': np.linspace(30, 70, 5),
+          'min_pitch': np.linspace(0, 20, 5),
+          'turn_start_speed': np.linspace(50, 150, 5)}
+  if program == 'scenario':
+    axes['pitch_offset'] = np.linspace(0, 40, 5)
+    axes['turn_style'] = np.array(['linear', 'square_root'])
+  names = list(axes)
+  points = np.meshgrid(*[axes[name] for name in names], indexing='ij')
+  settings = {name: p.ravel() for name, p in zip(names, points)}
+  size = len(settings[names[0]])
+  if size > count:
+    picked = np.random.default_rng(1).choice(size, count, replace=False)
+    settings = {name: values[picked] for name, values in settings.items()}
+  return settings
+
+
+def main(count):
+  conn = csk.sim.connect(time_scale=None)
+  table = bodies.BodyConstants(path=None)
+  body = conn.space_center.active_vessel.orbit.body
+  constants, profile = table.get(body), table.atmosphere(body)
+  stages = ascent_stages(SIM_ROCKET)
+
+  for program in ('mission', 'scenario'):
+    settings = grid(program, count)
+    parameters = dict(settings, target_altitude=TARGET_ALTITUDE)
+    start = time.perf_counter()
+    result = BatchAscent(constants, profile, stages, parameters, program=program).run()
+    elapsed = time.perf_counter() - start
+
+    size = len(result.reached)
+    periapsis_altitude, remaining_delta_v = circularize(constants, result)
+    orbit = result.reached & (periapsis_altitude > constants.atmosphere_depth)
+    print("[bench]", "%s: %d ascents in %.1f s, %d reach target apoapsis, %d orbit" %
+          (program, size, elapsed, result.reached.sum(), orbit.sum()))
+    margin = np.where(orbit, remaining_delta_v, -np.inf)
+    for i in np.argsort(-margin)[:BEST_COUNT]:
+      if not orbit[i]:
+        break
+      print("[bench]", "  %s -> %.0f x %.0f km, periapsis raised to %.0f km, "
+            "dv used %.0f m/s, left %.0f m/s, max Q %.1f kPa" %
+            (', '.join('%s=%s' % (name, values[i]) for name, values in settings.items()),
+             result.apoapsis_altitude[i] / 1000, result.periapsis_altitude[i] / 1000,
+             periapsis_altitude[i] / 1000, result.delta_v[i], margin[i],
+             result.max_q[i] / 1000))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
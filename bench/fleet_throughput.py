@@ -0,0 +1,50 @@
+"""Fleet throughput benchmark
+
+  Puts relay satellites on a shared orbit, gives each a staggered
+  station keeping node, and runs them all with one Fleet over one
+  connection to the stand-in, game time advancing on demand.
+
+  Usage: python -m bench.fleet_throughput [vessels]
+"""
+
+import sys
+import time
+from csk.sim.server import SimServer, SimConnection
+from csk.sim.vehicles import SIM_RELAY
+from csk.lib.fleet import Fleet
+from csk.lib.streams import RPCCounter
+from csk.lib.steps.relay import all_steps
+
+ALTITUDE = 700000
+NODE_SPACING = 300
+NODE_DELTA_V = 5.
+
+
+def main(count):
+  server = SimServer(time_scale=None)
+  for i in range(count):
+    server.spawn_orbit(SIM_RELAY, ALTITUDE, phase=i * 360. / count,
+                       name="Relay %d" % (i + 1))
+  conn = SimConnection(server)
+
+  fleet = Fleet(conn)
+  for i, vessel in enumerate(conn.space_center.vessels):
+    vessel.control.add_node(server.ut + (i + 1) * NODE_SPACING, prograde=NODE_DELTA_V)
+    fleet.add(vessel, all_steps)
+
+  counter = RPCCounter(conn)
+  start_ut = server.ut
+  start = time.perf_counter()
+  fleet.run()
+  wall = time.perf_counter() - start
+  counter.detach()
+
+  burns = sum(m.parameters.get("burns", 0) for m in fleet.missions)
+  print("[bench]", "%d/%d burns in %.0f s of game time, %.2f s wall" %
+        (burns, count, server.ut - start_ut, wall))
+  print("[bench]", "%d mission ticks, %d vessel switches, %.1f RPCs/tick, %.1f burns/s" %
+        (fleet.ticks, fleet.switches, counter.count / max(1, fleet.ticks), burns / wall))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 8)
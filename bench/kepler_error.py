@@ -0,0 +1,156 @@
+"""Kepler propagator error benchmark
+
+  Puts a relay satellite on an eccentric orbit of the stand-in, seeds
+  an OrbitPropagator once from its state vector, and compares the
+  predicted orbit with the values the stand-in integrates, over a few
+  orbits of coasting. Then burns for a while, and checks the
+  propagator resyncs on thrust.
+
+  Coasting in vacuum is the two-body problem the propagator solves,
+  so its error there only shows the integration error of the
+  stand-in. The last case puts a rocket on an orbit dipping into the
+  atmosphere, and measures the error of an orbit seeded before the
+  drag pass against the true values after it, until the propagator
+  resyncs.
+
+  Usage: python -m bench.kepler_error [orbits]
+"""
+
+import sys
+from csk.sim.server import SimServer, SimConnection
+from csk.sim.vehicles import SIM_RELAY, SIM_ROCKET
+from csk.lib import bodies
+from csk.lib.kepler import OrbitPropagator
+from csk.lib.vector import magnitude
+
+ALTITUDE = 250000
+# Velocity scale turning the circular orbit into an eccentric one
+SPEED_FACTOR = 1.12
+SAMPLES_PER_ORBIT = 40
+BURN_TIME = 20.
+# Periapsis altitude of the orbit dipping into the atmosphere
+DRAG_PERIAPSIS = 50000
+
+
+def time_error(predicted, true, period):
+  """Difference between two times to an event repeating every period"""
+  return (predicted - true + period / 2) % period - period / 2
+
+
+def errors(orbit, vessel, frame, ut):
+  """Differences between predicted and true values at ut"""
+  true = vessel.orbit
+  period = true.period
+  return {
+      'time_to_apoapsis (s)': time_error(orbit.time_to_apoapsis(ut),
+                                         true.time_to_apoapsis, period),
+      'time_to_periapsis (s)': time_error(orbit.time_to_periapsis(ut),
+                                          true.time_to_periapsis, period),
+      'apoapsis_altitude (m)': orbit.apoapsis_altitude - true.apoapsis_altitude,
+      'periapsis_altitude (m)': orbit.periapsis_altitude - true.periapsis_altitude,
+      'period (s)': orbit.period - true.period,
+      'position (m)': magnitude([p - q for p, q in zip(orbit.position_at(ut),
+                                                      vessel.position(frame))]),
+  }
+
+
+def print_errors(title, samples):
+  print("[bench]", title)
+  for name in samples[0]:
+    values = [abs(s[name]) for s in samples]
+    print("[bench]", "  %-24s max %10.6f  mean %10.6f" %
+          (name, max(values), sum(values) / len(values)))
+
+
+def main(orbits):
+  server = SimServer(time_scale=None)
+  model = server.spawn_orbit(SIM_RELAY, ALTITUDE, name="Relay")
+  model.v = tuple(c * SPEED_FACTOR for c in model.v)
+  conn = SimConnection(server)
+  clock = conn.clock
+
+  vessel = conn.space_center.active_vessel
+  body = vessel.orbit.body
+  frame = body.non_rotating_reference_frame
+  propagator = OrbitPropagator(bodies.for_connection(conn).get(body),
+                               conn.add_stream(vessel.position, frame),
+                               conn.add_stream(vessel.velocity, frame),
+                               conn.add_stream(getattr, conn.space_center, 'ut'),
+                               conn.add_stream(getattr, vessel, 'thrust'))
+
+  orbit = propagator.orbit()
+  period = orbit.period
+  print("[bench]", "Orbit %.0f x %.0f m, period %.0f s" %
+        (orbit.apoapsis_altitude, orbit.periapsis_altitude, period))
+
+  samples = []
+  for i in range(int(orbits * SAMPLES_PER_ORBIT)):
+    clock.sleep(period / SAMPLES_PER_ORBIT)
+    orbit = propagator.orbit()
+    samples.append(errors(orbit, vessel, frame, conn.space_center.ut))
+  print_errors("Coasting %g orbits, %d samples, %d sync" %
+               (orbits, len(samples), propagator.syncs), samples)
+
+  syncs = propagator.syncs
+  vessel.control.throttle = 1
+  start = conn.space_center.ut
+  while conn.space_center.ut - start < BURN_TIME:
+    clock.sleep(0.1)
+    propagator.orbit()
+  vessel.control.throttle = 0
+  clock.sleep(0.1)
+  burn_syncs = propagator.syncs - syncs
+
+  samples = []
+  orbit = propagator.orbit()
+  for i in range(SAMPLES_PER_ORBIT):
+    clock.sleep(orbit.period / SAMPLES_PER_ORBIT)
+    samples.append(errors(propagator.orbit(), vessel, frame, conn.space_center.ut))
+  print_errors("After a %.0f s burn (%d syncs while burning), one orbit" %
+               (BURN_TIME, burn_syncs), samples)
+
+  drag_pass(orbits)
+
+
+def drag_pass(orbits):
+  """Errors of an orbit seeded at apoapsis, through periapsis passes in the air"""
+  server = SimServer(time_scale=None)
+  model = server.spawn_orbit(SIM_ROCKET, ALTITUDE, name="Rocket")
+  apoapsis = server.body.radius + ALTITUDE
+  periapsis = server.body.radius + DRAG_PERIAPSIS
+  speed_factor = (2 * periapsis / (apoapsis + periapsis)) ** 0.5
+  model.v = tuple(c * speed_factor for c in model.v)
+  conn = SimConnection(server)
+  clock = conn.clock
+
+  vessel = conn.space_center.active_vessel
+  body = vessel.orbit.body
+  frame = body.non_rotating_reference_frame
+  propagator = OrbitPropagator(bodies.for_connection(conn).get(body),
+                               conn.add_stream(vessel.position, frame),
+                               conn.add_stream(vessel.velocity, frame),
+                               conn.add_stream(getattr, conn.space_center, 'ut'),
+                               conn.add_stream(getattr, vessel, 'thrust'))
+  seeded = propagator.orbit()
+  print("[bench]", "Orbit %.0f x %.0f m, period %.0f s, atmosphere %.0f m" %
+        (seeded.apoapsis_altitude, seeded.periapsis_altitude, seeded.period,
+         body.atmosphere_depth))
+
+  samples = []
+  for i in range(int(orbits * SAMPLES_PER_ORBIT)):
+    clock.sleep(seeded.period / SAMPLES_PER_ORBIT)
+    propagator.orbit()
+    samples.append(errors(seeded, vessel, frame, conn.space_center.ut))
+  print_errors("Orbit seeded once, %g orbits through the air" % orbits, samples)
+  print("[bench]", "  after the last pass:  apoapsis %.0f m, time_to_apoapsis %.1f s, "
+        "position %.0f m off" % (samples[-1]['apoapsis_altitude (m)'],
+                                 samples[-1]['time_to_apoapsis (s)'],
+                                 samples[-1]['position (m)']))
+  print("[bench]", "  resynced propagator: %d syncs, apoapsis %.0f m off" %
+        (propagator.syncs, propagator.orbit().apoapsis_altitude -
+         vessel.orbit.apoapsis_altitude))
+
+
+
+if __name__ == '__main__':
+  main(float(sys.argv[1]) if len(sys.argv) > 1 else 3)
@@ -0,0 +1,70 @@
+"""PID bank benchmark
+
+  Feeds a PIDBank and as many scalar PIDs, with random gains, limits
+  and derivative filters, the same random values, times and masks (repeated times and
+  resets included), checks outputs and states match bit for bit, and
+  times both.
+
+  Usage: python -m bench.pid_bank [controllers] [ticks]
+"""
+
+import sys
+import time
+import numpy as np
+from csk.lib.pid import PID, PIDBank
+
+STATE = ('seekP', 'P', 'I', 'D', 'oldT', 'oldInput')
+
+
+def inputs(count, ticks, rng):
+  """Random seek values, current values, times and masks of each tick"""
+  ut = np.cumsum(rng.choice([0., 0.05, 0.1, 0.5], size=ticks))
+  seek = rng.normal(40, 10, size=(ticks, count))
+  current = seek + rng.normal(0, 20, size=(ticks, count))
+  masks = rng.random((ticks, count)) < 0.8
+  resets = rng.random((ticks, count)) < 0.01
+  return ut, seek, current, masks, resets
+
+
+def main(count, ticks):
+  rng = np.random.default_rng(1)
+  gains = rng.uniform(0, 1, size=(3, count))
+  low = rng.uniform(-1, 0.5, size=count)
+  limits = (low, low + rng.uniform(0, 2, size=count))
+  filters = np.where(rng.random(count) < 0.5, 0., rng.uniform(0.1, 2, size=count))
+  ut, seek, current, masks, resets = inputs(count, ticks, rng)
+
+  bank = PIDBank(count, *gains, *limits, filters)
+  outputs = np.empty((ticks, count))
+  start = time.perf_counter()
+  for t in range(ticks):
+    bank.reset(resets[t])
+    outputs[t] = bank.seek(seek[t], current[t], ut[t], masks[t])
+  bank_time = time.perf_counter() - start
+
+  parameters = [[float(v[i]) for v in (*gains, *limits, filters)] for i in range(count)]
+  pids = [PID(*p) for p in parameters]
+  expected = np.full((ticks, count), np.nan)
+  start = time.perf_counter()
+  for t in range(ticks):
+    for i, pid in enumerate(pids):
+      if resets[t, i]:
+        pid = pids[i] = PID(*parameters[i])
+      if masks[t, i]:
+        expected[t, i] = pid.seek(float(seek[t, i]), float(current[t, i]), float(ut[t]))
+  scalar_time = time.perf_counter() - start
+
+  mismatches = int(np.sum(masks & (outputs != expected)))
+  for name in STATE:
+    state = np.array([getattr(pid, name) for pid in pids])
+    mismatches += int(np.sum(state != getattr(bank, name)))
+  print("[bench]", "%d controllers, %d ticks: %d mismatches" % (count, ticks, mismatches))
+  print("[bench]", "  PID     %8.1f ms" % (scalar_time * 1000))
+  print("[bench]", "  PIDBank %8.1f ms (x%.1f)" % (bank_time * 1000, scalar_time / bank_time))
+  if mismatches:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+       int(sys.argv[2]) if len(sys.argv) > 2 else 500)
@@ -0,0 +1,71 @@
+"""PID seek microbenchmark
+
+  Reports PID.seek calls per second, without and with a derivative
+  filter, and checks that calls allocate no memory: once warmed up,
+  memory blocks in use do not grow with the number of calls, and
+  tracemalloc sees no allocation from seek.
+
+  Usage: python -m bench.pid_seek [calls]
+"""
+
+import sys
+import time
+import random
+import tracemalloc
+from csk.lib.pid import PID
+
+SAMPLES = 1000
+
+
+def feed(pid, values, calls):
+  """Calls seek, as a launch loop would every 0.1 s of game time"""
+  seek = pid.seek
+  ut = 0.
+  for i in range(calls // len(values)):
+    for value in values:
+      ut += 0.1
+      seek(40., value, ut)
+
+
+def rate(pid, values, calls):
+  start = time.perf_counter()
+  feed(pid, values, calls)
+  return calls / (time.perf_counter() - start)
+
+
+def allocations(pid, values, calls):
+  """Memory blocks and traced allocations left by calls, after warm up"""
+  feed(pid, values, len(values))
+  blocks = sys.getallocatedblocks()
+  feed(pid, values, calls)
+  blocks = sys.getallocatedblocks() - blocks
+
+  tracemalloc.start()
+  before = tracemalloc.take_snapshot()
+  feed(pid, values, calls)
+  after = tracemalloc.take_snapshot()
+  tracemalloc.stop()
+  seek_file = sys.modules[PID.__module__].__file__
+  traced = sum(stat.count_diff for stat in after.compare_to(before, 'filename')
+               if stat.traceback[0].filename == seek_file)
+  return blocks, traced
+
+
+def main(calls):
+  random.seed(1)
+  # Noisy time to apoapsis around its target
+  values = [random.gauss(40, 2) for i in range(SAMPLES)]
+  calls = max(calls // SAMPLES, 1) * SAMPLES
+
+  print("[bench]", "PID instance: %d bytes, no __dict__: %s" %
+        (sys.getsizeof(PID()), not hasattr(PID(), '__dict__')))
+  for name, pid in (('PID', PID(0.2, 0.01, 0.1, 0.1, 1)),
+                    ('PID, Tf=1 s', PID(0.2, 0.01, 0.1, 0.1, 1, Tf=1.))):
+    calls_per_second = rate(pid, values, calls)
+    blocks, traced = allocations(pid, values, calls)
+    print("[bench]", "  %-12s %10.0f calls/s, %d blocks kept, %d traced allocations" %
+          (name, calls_per_second, blocks, traced))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
@@ -0,0 +1,116 @@
+"""Vector operations microbenchmark
+
+  Times the list based functions of lib.vector, Vector3 methods and
+  the NumPy batch functions on the same random vectors, and checks
+  they agree. Then times the scalar hot paths built on Vector3: pitch
+  of a direction (nav.direction_pitch) against the direction_pitches
+  kernel called on one direction, and KeplerOrbit positions.
+
+  Usage: python -m bench.vector_ops [vectors]
+"""
+
+import sys
+import time
+import numpy as np
+from csk.lib import vector, nav
+from csk.lib.kepler import KeplerOrbit
+from csk.lib.vector import (dot_product, cross_product, magnitude,
+                            angle_between_vectors, Vector3, Quaternion)
+
+
+def timed(function, repeat=3):
+  """Best time of a few runs of function, and its result"""
+  best = None
+  for i in range(repeat):
+    start = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - start
+    best = elapsed if best is None else min(best, elapsed)
+  return best, result
+
+
+def report(name, count, timings, results):
+  reference = np.asarray(results[0], dtype=float)
+  line = "  %-8s" % name
+  for (label, elapsed), result in zip(timings, results):
+    error = np.max(np.abs(np.asarray(result, dtype=float) - reference))
+    line += "  %s %8.2f ms (%.1e)" % (label, elapsed * 1000, error)
+  print("[bench]", line)
+
+
+def main(count):
+  rng = np.random.default_rng(1)
+  a_array = rng.normal(size=(count, 3)) * 1e6
+  b_array = rng.normal(size=(count, 3)) * 1e3
+  q_array = vector.normalize(rng.normal(size=(count, 4)))
+  axes = np.linalg.qr(rng.normal(size=(3, 3)))[0].T
+  axes_vectors = [Vector3.of(axis) for axis in axes.tolist()]
+
+  a_lists = a_array.tolist()
+  b_lists = b_array.tolist()
+  a_vectors = [Vector3.of(a) for a in a_lists]
+  quaternions = [Quaternion.of(q) for q in q_array.tolist()]
+  x_axis, y_axis, z_axis = axes.tolist()
+
+  cases = [
+      ('dot',
+       lambda: [dot_product(a, b) for a, b in zip(a_lists, b_lists)],
+       lambda: [a.dot(b) for a, b in zip(a_vectors, b_lists)],
+       lambda: vector.dot(a_array, b_array)),
+      ('cross',
+       lambda: [cross_product(a, b) for a, b in zip(a_lists, b_lists)],
+       lambda: [a.cross(b) for a, b in zip(a_vectors, b_lists)],
+       lambda: vector.cross(a_array, b_array)),
+      ('norm',
+       lambda: [magnitude(a) for a in a_lists],
+       lambda: [a.norm() for a in a_vectors],
+       lambda: vector.norm(a_array)),
+      ('angle',
+       lambda: [angle_between_vectors(a, b) for a, b in zip(a_lists, b_lists)],
+       lambda: [a.angle(b) for a, b in zip(a_vectors, b_lists)],
+       lambda: vector.angle(a_array, b_array)),
+      # No list based rotation: the reference is Vector3
+      ('rotate',
+       lambda: [q.rotate(b) for q, b in zip(quaternions, b_lists)],
+       lambda: [q.rotate(b) for q, b in zip(quaternions, b_lists)],
+       lambda: vector.rotate(q_array, b_array)),
+      ('frame',
+       lambda: [(dot_product(a, x_axis), dot_product(a, y_axis), dot_product(a, z_axis))
+                for a in a_lists],
+       lambda: [a.to_frame(axes_vectors) for a in a_vectors],
+       lambda: vector.to_frame(a_array, axes)),
+      # As KeplerOrbit built positions from its perifocal axes before
+      ('from',
+       lambda: [tuple(x * p + y * q + z * r for p, q, r in zip(x_axis, y_axis, z_axis))
+                for x, y, z in a_lists],
+       lambda: [Vector3.from_frame(a, axes_vectors) for a in a_lists],
+       lambda: vector.from_frame(a_array, axes)),
+  ]
+
+  print("[bench]", "%d vectors, best of 3 (max difference with lists)" % count)
+  for name, lists, vectors, batch in cases:
+    timings = []
+    results = []
+    for label, function in (('lists', lists), ('Vector3', vectors), ('numpy', batch)):
+      elapsed, result = timed(function)
+      timings.append((label, elapsed))
+      results.append(result)
+    report(name, count, timings, results)
+
+  directions = vector.normalize(a_array).tolist()
+  kernel_time, kernel = timed(lambda: [float(nav.direction_pitches(d)) for d in directions])
+  pitch_time, pitches = timed(lambda: [nav.direction_pitch(d) for d in directions])
+  print("[bench]", "  pitch     kernel %8.2f ms  Vector3 %8.2f ms (%.1e)" %
+        (kernel_time * 1000, pitch_time * 1000, np.max(np.abs(np.subtract(pitches, kernel)))))
+
+  mu, radius = 3.5316e12, 600000.
+  orbit = KeplerOrbit(mu, (radius + 100000., 0., 0.), (0., 2400., 300.), 0., radius)
+  times = np.linspace(0, orbit.period, count).tolist()
+  position_time, positions = timed(lambda: [orbit.position_at(ut) for ut in times])
+  altitude_time, altitudes = timed(lambda: [orbit.altitude_at(ut) for ut in times])
+  print("[bench]", "  kepler    position_at %.2f us, altitude_at %.2f us per call" %
+        (position_time * 1e6 / count, altitude_time * 1e6 / count))
+
+
+if __name__ == '__main__':
+  main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,505 @@
+"""Batch ascent simulator
+
+  Flies many vehicles at once, each with its own launch parameters, so
+  that gravity turn settings can be judged without a live flight.
+  Vehicles are point masses launched due east from the equator, in
+  the equatorial plane, under gravity, thrust and drag in the
+  atmosphere of a body rotating under them: the flight model of the
+  stand-in (see csk.sim), with the state of all vehicles held in NumPy
+  arrays and advanced together.
+
+  Guidance replicates, tick by tick, one of the launch programs:
+
+    'mission'   launch, gravity_turn, burn_to_apo, coast_to_space and
+                correct_apoapsis steps of csk.lib.steps.launch
+    'scenario'  LaunchScenario of the alternative tree
+
+  Launch parameters have the names and defaults of the program (a
+  Mission parameters dict, or LaunchScenario parameters). Each one is
+  a scalar, or an array of one value per vehicle, and so are the PID
+  gains. Auto staging holds the throttle for stage_wait between
+  burnout and ignition, as AutoStager does.
+"""
+
+import math
+from collections import namedtuple
+import numpy as np
+from .nav import circularization_delta_v, rocket_delta_v, vis_viva
+from .performance import G0
+from .pid import PIDBank
+
+# Pressure where sea level specific impulses apply, in Pa
+SEA_LEVEL_PRESSURE = 101325.
+
+# Throttle and pitch PID gains (Kp, Ki, Kd) of the launch programs, and
+# throttle limits
+THROTTLE_GAINS = (0.2, 0.01, 0.1)
+THROTTLE_LIMITS = (0.1, 1)
+PITCH_GAINS = (0.5, 0.05, 0.2)
+
+DEFAULTS = {
+    'mission': {'target_altitude': 100000,
+                'turn_start_alt': 1000,
+                'turn_start_speed': 100,
+                'turn_end_alt': None,
+                'min_pitch': 10,
+                'target_apt': 40,
+                'min_pitch_pid': -15,
+                'max_pitch_pid': 15},
+    'scenario': {'target_altitude': 120000,
+                 'target_apt': 40.0,
+                 'turn_end_alt': 80000,
+                 'turn_start_alt': 1000,
+                 'turn_start_speed': 100,
+                 'turn_style': 'square_root',
+                 'min_pitch': 0,
+                 'pitch_offset': 30},
+}
+
+# Time to apoapsis tracking starts within this many seconds of its target
+APT_CAPTURE = 1.
+
+# Flight phases: mission steps, the scenario flying in TURN until done
+LAUNCH, TURN, BURN_TO_APO, COAST, CORRECT, DONE, FAILED = range(7)
+
+AscentStage = namedtuple('AscentStage', ['wet_mass', 'dry_mass', 'mass_flow',
+                                         'isp_vacuum', 'isp_sea_level', 'cda'])
+AscentStage.__doc__ = """Vehicle while one set of engines burns, in burning order
+
+  Masses at ignition and at burnout in kg, mass flow at full throttle
+  in kg/s, specific impulses in s and drag area (drag coefficient
+  times frontal area) in m2. Each field is a scalar, or an array of
+  one value per vehicle.
+"""
+
+AscentResult = namedtuple('AscentResult', ['reached', 'time', 'apoapsis_altitude',
+                                           'periapsis_altitude', 'circularization_delta_v',
+                                           'delta_v', 'remaining_delta_v', 'max_q',
+                                           'apt_error', 'apt_overshoot'])
+AscentResult.__doc__ = """Arrays of one value per vehicle, at the end of its ascent
+
+  reached tells if the vehicle got above the atmosphere with its
+  target apoapsis; the others are values when it did, or when it
+  crashed, ran out of propellant or time. Delta-v used (from thrust
+  only) and remaining (in vacuum) are in m/s, max_q (highest dynamic
+  pressure) in Pa. apt_error is the RMS difference between time to
+  apoapsis and its target while a PID seeks it, from the first time it
+  comes within APT_CAPTURE of the target until out of the atmosphere,
+  apt_overshoot the largest excess of time to apoapsis over the target
+  then, in s.
+"""
+
+
+def circularize(constants, result):
+  """Orbits after circularizing at apoapsis with the delta-v left
+
+    Each vehicle of an AscentResult burns prograde at apoapsis its
+    circularization delta-v, or all it has left if less. Returns
+    their periapsis altitudes and remaining delta-v then: the orbit
+    is closed above the atmosphere where the periapsis altitude is
+    higher than constants.atmosphere_depth.
+  """
+  mu, radius = constants.gravitational_parameter, constants.equatorial_radius
+  apoapsis = result.apoapsis_altitude + radius
+  semi_major_axis = (apoapsis + result.periapsis_altitude + radius) / 2
+  burn = np.clip(result.circularization_delta_v, 0, result.remaining_delta_v)
+  speed = vis_viva(mu, apoapsis, semi_major_axis) + burn
+  periapsis = 2. / (2. / apoapsis - speed * speed / mu) - apoapsis
+  return periapsis - radius, result.remaining_delta_v - burn
+
+
+class BatchAscent:
+  """Ascents of vehicles sharing a body and a stage layout
+
+    constants are the body constants (see bodies), profile its
+    atmosphere profile (see atmosphere), stages a list of AscentStage.
+    atmosphere_scale multiplies the pressure and density of the
+    profile, for each vehicle if an array. Vehicles are as many as the
+    longest parameter, gain, scale or stage array.
+  """
+
+  def __init__(self, constants, profile, stages, parameters=None, program='mission',
+               dt=0.1, stage_wait=0.5, slew_rate=15., launch_altitude=70.,
+               max_time=1200., throttle_gains=THROTTLE_GAINS, pitch_gains=PITCH_GAINS,
+               atmosphere_scale=1.):
+    if program not in DEFAULTS:
+      raise ValueError("Unknown launch program: %s" % program)
+    self.program = program
+    self.throttle_gains = throttle_gains
+    self.pitch_gains = pitch_gains
+    self.dt = dt
+    self.stage_wait = stage_wait
+    self.slew_rate = math.radians(slew_rate)
+    self.launch_altitude = launch_altitude
+    self.max_time = max_time
+
+    self.mu = constants.gravitational_parameter
+    self.radius = constants.equatorial_radius
+    self.depth = constants.atmosphere_depth if constants.has_atmosphere else 0.
+    self.rotation = 2 * math.pi / constants.rotational_period
+    self.altitudes = np.arange(len(profile.pressures)) * profile.step
+    self.pressures = np.asarray(profile.pressures, dtype=float)
+    self.densities = np.asarray(profile.densities, dtype=float)
+    self.high_alt = profile.altitude_below(100)
+
+    values = dict(DEFAULTS[program])
+    values.update(parameters or {})
+    if values.get('turn_end_alt') is None:
+      values['turn_end_alt'] = np.asarray(values['target_altitude']) * 0.6
+    shapes = [np.shape(v) for v in values.values()]
+    shapes += [np.shape(gain) for gain in tuple(throttle_gains) + tuple(pitch_gains)]
+    shapes += [np.shape(atmosphere_scale)]
+    shapes += [np.shape(field) for stage in stages for field in stage]
+    self.count = int(np.prod(np.broadcast_shapes(*shapes)))
+
+    n = self.count
+    self.atmosphere_scale = np.broadcast_to(np.asarray(atmosphere_scale, dtype=float), (n,))
+    self.parameters = {name: np.broadcast_to(value, (n,)).copy()
+                       for name, value in values.items()}
+    # Stage fields as (stages, vehicles) arrays
+    self.stages = AscentStage._make(
+        np.array([np.broadcast_to(np.asarray(field, dtype=float), (n,)) for field in fields])
+        for fields in zip(*stages))
+
+  def run(self):
+    """Flies all vehicles until each one is done or failed"""
+    n = self.count
+    mu, dt = self.mu, self.dt
+    params = self.parameters
+    stages = self.stages
+    vehicles = np.arange(n)
+    last_stage = len(stages.wet_mass) - 1
+
+    x = np.full(n, self.radius + self.launch_altitude)
+    y = np.zeros(n)
+    vx = np.zeros(n)
+    vy = x * self.rotation
+    attitude = np.zeros(n)
+    stage = np.zeros(n, dtype=int)
+    burnt = np.zeros(n)
+    hold = np.zeros(n)
+    delta_v = np.zeros(n)
+    max_q = np.zeros(n)
+    end_time = np.zeros(n)
+
+    phase = np.full(n, LAUNCH)
+    ticks = np.zeros(n, dtype=int)
+    throttle = np.ones(n)
+    target_pitch = np.full(n, 90.)
+    prograde = np.zeros(n, dtype=bool)
+    guidance = Guidance(self, params)
+
+    t = 0.
+    while True:
+      active = phase < DONE
+      if not active.any():
+        break
+
+      altitude, speed, orbit = self.telemetry(x, y, vx, vy)
+      previous = phase.copy()
+      guidance.step(t, phase, ticks, altitude, speed, orbit, throttle, target_pitch, prograde)
+      ticks = np.where(phase == previous, ticks + 1, 0)
+
+      # Auto staging, where the program does it: burnout stages, ignition
+      # comes stage_wait later
+      fuel = stages.wet_mass[stage, vehicles] - stages.dry_mass[stage, vehicles] - burnt
+      burnout = guidance.staging(phase) & (fuel <= 0) & (stage < last_stage) & (hold <= 0)
+      stage = np.where(burnout, stage + 1, stage)
+      burnt[burnout] = 0.
+      hold[burnout] = self.stage_wait
+      fuel = stages.wet_mass[stage, vehicles] - stages.dry_mass[stage, vehicles] - burnt
+
+      # Attitude, slewing towards the commanded direction
+      up = np.arctan2(y, x)
+      target = np.where(prograde, np.arctan2(vy, vx),
+                        up + np.radians(90. - target_pitch))
+      error = (target - attitude + math.pi) % (2 * math.pi) - math.pi
+      slew = self.slew_rate * dt
+      attitude = attitude + np.clip(error, -slew, slew)
+
+      # Thrust, over the part of the step propellant lasts
+      pressure = np.interp(altitude, self.altitudes, self.pressures,
+                           right=0.) * self.atmosphere_scale
+      ratio = np.minimum(pressure / SEA_LEVEL_PRESSURE, 1.)
+      isp_vacuum = stages.isp_vacuum[stage, vehicles]
+      isp = isp_vacuum + (stages.isp_sea_level[stage, vehicles] - isp_vacuum) * ratio
+      flow = stages.mass_flow[stage, vehicles] * np.where(active & (hold <= 0), throttle, 0.)
+      with np.errstate(divide='ignore', invalid='ignore'):
+        burning = np.where(flow > 0, np.clip(fuel / (flow * dt), 0., 1.), 0.)
+      mass = stages.wet_mass[stage, vehicles] - burnt
+      thrust_accel = flow * isp * G0 * burning / mass
+      burnt += flow * dt * burning
+      hold -= dt
+
+      out_of_propellant = ((flow > 0) & (burning < 1) & (stage == last_stage) &
+                           guidance.needs_thrust(phase))
+
+      # Midpoint integration of the active vehicles
+      cda = stages.cda[stage, vehicles]
+      ax, ay, q = self.acceleration(x, y, vx, vy, mass, cda, thrust_accel, attitude)
+      mx, my = x + vx * dt / 2, y + vy * dt / 2
+      mvx, mvy = vx + ax * dt / 2, vy + ay * dt / 2
+      ax, ay, _ = self.acceleration(mx, my, mvx, mvy, mass, cda, thrust_accel, attitude)
+      x = np.where(active, x + mvx * dt, x)
+      y = np.where(active, y + mvy * dt, y)
+      vx = np.where(active, vx + ax * dt, vx)
+      vy = np.where(active, vy + ay * dt, vy)
+
+      delta_v += thrust_accel * dt
+      max_q = np.where(active, np.maximum(max_q, q), max_q)
+      t += dt
+      end_time[active] = t
+
+      crashed = np.hypot(x, y) < self.radius
+      phase[active & (crashed | out_of_propellant)] = FAILED
+      if t > self.max_time:
+        phase[phase < DONE] = FAILED
+
+    altitude, speed, orbit = self.telemetry(x, y, vx, vy)
+    apoapsis = orbit['apoapsis']
+    mass = stages.wet_mass[stage, vehicles] - burnt
+    return AscentResult(
+        reached=phase == DONE,
+        time=end_time,
+        apoapsis_altitude=apoapsis - self.radius,
+        periapsis_altitude=orbit['periapsis'] - self.radius,
+        circularization_delta_v=circularization_delta_v(mu, apoapsis, orbit['semi_major_axis']),
+        delta_v=delta_v,
+        remaining_delta_v=self.remaining_delta_v(stage, mass),
+        max_q=max_q,
+        apt_error=np.sqrt(guidance.squared_error / np.maximum(guidance.tracked, 1)),
+        apt_overshoot=guidance.overshoot)
+
+  def telemetry(self, x, y, vx, vy):
+    """Altitude, surface speed and orbit elements of all vehicles"""
+    mu = self.mu
+    r = np.hypot(x, y)
+    speed = np.hypot(vx + self.rotation * y, vy - self.rotation * x)
+
+    v2 = vx * vx + vy * vy
+    rv = x * vx + y * vy
+    h = x * vy - y * vx
+    inverse_a = 2. / r - v2 / mu
+    bound = inverse_a > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+      a = 1. / inverse_a
+      e = np.sqrt(np.maximum(0., 1. - h * h * inverse_a / mu))
+      mean_motion = np.sqrt(mu * inverse_a**3)
+      anomaly = np.arctan2(rv * np.sqrt(inverse_a / mu), 1. - r * inverse_a)
+      mean_anomaly = anomaly - e * np.sin(anomaly)
+      orbit = {
+          'semi_major_axis': a,
+          'apoapsis': np.where(bound, a * (1 + e), np.inf),
+          'periapsis': a * (1 - e),
+          'period': np.where(bound, 2 * math.pi / mean_motion, np.inf),
+          'time_to_apoapsis': np.where(
+              bound, ((math.pi - mean_anomaly) % (2 * math.pi)) / mean_motion, np.inf),
+          'time_to_periapsis': np.where(
+              bound, ((2 * math.pi - mean_anomaly) % (2 * math.pi)) / mean_motion, np.inf),
+      }
+    return r - self.radius, speed, orbit
+
+  def acceleration(self, x, y, vx, vy, mass, cda, thrust_accel, attitude):
+    """Acceleration of all vehicles, and their dynamic pressure"""
+    r2 = x * x + y * y
+    gravity = -self.mu / (r2 * np.sqrt(r2))
+    altitude = np.sqrt(r2) - self.radius
+    density = np.interp(altitude, self.altitudes, self.densities,
+                        right=0.) * self.atmosphere_scale
+    air_x = vx + self.rotation * y
+    air_y = vy - self.rotation * x
+    air_speed = np.hypot(air_x, air_y)
+    q = 0.5 * density * air_speed * air_speed
+    drag = -q * cda / (mass * np.maximum(air_speed, 1e-9))
+    ax = gravity * x + thrust_accel * np.cos(attitude) + drag * air_x
+    ay = gravity * y + thrust_accel * np.sin(attitude) + drag * air_y
+    return ax, ay, q
+
+  def remaining_delta_v(self, stage, mass):
+    """Vacuum delta-v left in the current stage, from mass, and later ones"""
+    stages = self.stages
+    vehicles = np.arange(self.count)
+    exhaust_velocity = stages.isp_vacuum * G0
+    with np.errstate(divide='ignore', invalid='ignore'):
+      per_stage = np.nan_to_num(rocket_delta_v(exhaust_velocity, stages.wet_mass,
+                                               stages.dry_mass))
+      current = np.nan_to_num(rocket_delta_v(exhaust_velocity[stage, vehicles],
+                                             np.maximum(mass, stages.dry_mass[stage, vehicles]),
+                                             stages.dry_mass[stage, vehicles]))
+    later = np.arange(len(per_stage))[:, np.newaxis] > stage
+    return current + (per_stage * later).sum(axis=0)
+
+
+class Guidance:
+  """Throttle and pitch commands of a launch program, for all vehicles
+
+    step() reads the telemetry of a tick, and updates in place the
+    phase, throttle and attitude command arrays, as the program steps
+    would write them on the control channel.
+  """
+
+  def __init__(self, ascent, params):
+    self.ascent = ascent
+    self.params = params
+    n = ascent.count
+    self.target_apt = params['target_apt'].astype(float)
+    self.throttle_pid = PIDBank(n, *ascent.throttle_gains, *THROTTLE_LIMITS)
+    if ascent.program == 'mission':
+      self.pitch_pid = PIDBank(n, *ascent.pitch_gains,
+                                 params['min_pitch_pid'], params['max_pitch_pid'])
+    else:
+      self.pitch_pid = PIDBank(n, *ascent.pitch_gains, 0, params['pitch_offset'])
+      self.square_root = params['turn_style'] != 'linear'
+    self.turn_start_alt = params['turn_start_alt'].astype(float)
+    self.turn_start_ut = np.full(n, np.nan)
+    self.adjust_pitch = np.zeros(n, dtype=bool)
+    self.last_apt = np.zeros(n)
+    self.last_apt_ut = np.zeros(n)
+    self.captured = np.zeros(n, dtype=bool)
+    self.tracked = np.zeros(n)
+    self.squared_error = np.zeros(n)
+    self.overshoot = np.zeros(n)
+
+  def track(self, apo_time, altitude, mask):
+    """Accounts for the time to apoapsis of vehicles seeking its target"""
+    self.captured |= mask & (apo_time >= self.target_apt - APT_CAPTURE)
+    mask = mask & self.captured & (altitude <= self.ascent.depth)
+    error = np.where(mask, apo_time - self.target_apt, 0.)
+    self.tracked += mask
+    self.squared_error += error * error
+    self.overshoot = np.maximum(self.overshoot, error)
+
+  def staging(self, phase):
+    """Vehicles whose program stages at this tick"""
+    if self.ascent.program == 'mission':
+      return (phase == TURN) | (phase == BURN_TO_APO)
+    return phase < DONE
+
+  def needs_thrust(self, phase):
+    """Vehicles failing if out of propellant"""
+    if self.ascent.program == 'mission':
+      return (phase != COAST) & (phase < DONE)
+    return phase < DONE
+
+  def step(self, ut, *state):
+    if self.ascent.program == 'mission':
+      self.mission_step(ut, *state)
+    else:
+      self.scenario_step(ut, *state)
+
+  def mission_step(self, ut, phase, ticks, altitude, speed, orbit, throttle,
+                   target_pitch, prograde):
+    params = self.params
+    depth = self.ascent.depth
+    apoapsis = orbit['apoapsis'] - self.ascent.radius
+    apo_time = orbit['time_to_apoapsis']
+    target_altitude = params['target_altitude']
+    first = ticks == 0
+
+    # launch: mission steps switch at the end of a tick
+    launch = phase == LAUNCH
+    turn = phase == TURN
+    burn = phase == BURN_TO_APO
+    coast = phase == COAST
+    correct = phase == CORRECT
+
+    started = (launch & (altitude > params['turn_start_alt']) &
+               (speed > params['turn_start_speed']))
+    self.turn_start_alt[started] = altitude[started]
+    phase[started] = TURN
+
+    # gravity_turn
+    self.throttle_pid.reset(turn & first)
+    meco = turn & (apoapsis > target_altitude)
+    throttle[meco] = 0
+    phase[meco] = COAST
+    out = turn & ~meco & (altitude > depth)
+    phase[out] = BURN_TO_APO
+    steer = turn & ~meco & ~out
+    self.target_apt[steer & (altitude > self.ascent.high_alt)] = 60.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+      turn_angle = (90 * (altitude - self.turn_start_alt) /
+                    (params['turn_end_alt'] - self.turn_start_alt))
+    np.copyto(target_pitch, np.maximum(params['min_pitch'], 90 - turn_angle), where=steer)
+    descending = orbit['time_to_periapsis'] < apo_time
+    seek = self.throttle_pid.seek(self.target_apt, apo_time, ut, steer & ~descending)
+    self.track(apo_time, altitude, steer & ~descending)
+    np.copyto(throttle, np.where(descending, 1., seek), where=steer)
+
+    # burn_to_apo
+    self.pitch_pid.reset(burn & first)
+    throttle[burn & first] = 1
+    meco = burn & (apoapsis > target_altitude)
+    throttle[meco] = 0
+    phase[meco] = COAST
+    steer = burn & ~meco
+    late = orbit['period'] / 2 < apo_time
+    seek = self.pitch_pid.seek(self.target_apt, apo_time, ut, steer & ~late)
+    self.track(apo_time, altitude, steer & ~late)
+    np.copyto(target_pitch, np.where(late, params['max_pitch_pid'], seek), where=steer)
+
+    # coast_to_space, then correct_apoapsis
+    throttle[coast & first] = 0
+    prograde[coast & first] = True
+    phase[coast & (altitude > depth)] = CORRECT
+    throttle[correct & first & (apoapsis < target_altitude)] = 0.05
+    done = correct & (apoapsis > target_altitude)
+    throttle[done] = 0
+    phase[done] = DONE
+
+  def scenario_step(self, ut, phase, ticks, altitude, speed, orbit, throttle,
+                    target_pitch, prograde):
+    params = self.params
+    depth = self.ascent.depth
+    apoapsis = orbit['apoapsis'] - self.ascent.radius
+    apo_time = orbit['time_to_apoapsis']
+    target_altitude = params['target_altitude']
+    flying = phase < DONE
+    phase[flying] = TURN
+
+    # LaunchScenario.step: once the target apoapsis is reached, MECO
+    # commands are overwritten by grav_turn until above the atmosphere
+    meco = flying & (apoapsis >= target_altitude)
+    throttle[meco] = 0
+    prograde[meco] = True
+    done = meco & (altitude > depth)
+    phase[done] = DONE
+
+    turning = flying & ~done & (speed > params['turn_start_speed'])
+    starting = turning & np.isnan(self.turn_start_ut)
+    self.turn_start_alt[starting] = altitude[starting]
+    self.turn_start_ut[starting] = ut
+
+    # grav_turn
+    with np.errstate(divide='ignore', invalid='ignore'):
+      fraction = np.maximum(0., (altitude - self.turn_start_alt) /
+                            (params['turn_end_alt'] - self.turn_start_alt))
+    turn_angle = np.where(self.square_root, 90 * np.sqrt(fraction), 90 * fraction)
+    pitch = np.maximum(params['min_pitch'], 90 - turn_angle)
+
+    descending = orbit['time_to_periapsis'] < apo_time
+    seeking = turning & ~descending
+    new_thr = np.where(descending, 1.,
+                       self.throttle_pid.seek(self.target_apt, apo_time, ut, seeking))
+    self.track(apo_time, altitude, seeking)
+    adjusting = seeking & self.adjust_pitch
+    adjustment = self.pitch_pid.seek(self.target_apt, apo_time, ut, adjusting)
+    waiting = seeking & ~self.adjust_pitch
+    self.adjust_pitch[waiting] = ((apo_time < self.target_apt * 0.8) &
+                                  (apo_time < self.last_apt) &
+                                  (altitude > self.ascent.high_alt))[waiting]
+    set_pitch = np.where(descending, pitch + params['pitch_offset'],
+                         np.where(adjusting, pitch + adjustment, pitch))
+
+    near = (altitude > depth) & (target_altitude - apoapsis < 10)
+    new_thr = np.where(near, .1, new_thr)
+    new_thr = np.where(ut - self.turn_start_ut < 1, 1, new_thr)
+
+    np.copyto(throttle, new_thr, where=turning)
+    np.copyto(target_pitch, set_pitch, where=turning)
+    prograde[turning] = False
+
+    track = turning & (ut - self.last_apt_ut > 1)
+    self.last_apt[track & (self.last_apt_ut > 0)] = apo_time[track & (self.last_apt_ut > 0)]
+    self.last_apt_ut[track] = ut
+
@@ -0,0 +1,84 @@
+"""Atmosphere profile module
+
+  Static pressure and density of a body atmosphere against altitude,
+  sampled once every few hundred meters and kept as two float arrays.
+  Lookups interpolate between the two nearest samples in constant
+  time. The altitude where pressure drops below a threshold is found
+  once per threshold, so that flight code can compare altitudes
+  instead of streaming static pressure.
+
+  Profiles are sampled from the body (pressure_at and density_at), and
+  persisted with body constants (see bodies).
+"""
+
+import math
+from array import array
+
+# Largest distance between samples, in meters
+SAMPLE_STEP = 500.
+
+
+class AtmosphereProfile:
+  """Pressure (Pa) and density (kg/m3) sampled every step meters"""
+
+  def __init__(self, name, step, pressures, densities):
+    self.name = name
+    self.step = step
+    self.pressures = array('f', pressures)
+    self.densities = array('f', densities)
+    self.depth = step * (len(self.pressures) - 1)
+    self.crossings = {}
+
+  @classmethod
+  def sample(cls, body, constants, max_step=SAMPLE_STEP):
+    """Samples the atmosphere of a body, given its constants"""
+    if not constants.has_atmosphere:
+      return cls(constants.name, 1., [0.], [0.])
+
+    count = int(math.ceil(constants.atmosphere_depth / max_step))
+    step = constants.atmosphere_depth / count
+    altitudes = [i * step for i in range(count + 1)]
+    return cls(constants.name, step,
+               [body.pressure_at(altitude) for altitude in altitudes],
+               [body.density_at(altitude) for altitude in altitudes])
+
+  def lookup(self, samples, altitude):
+    if altitude <= 0:
+      return samples[0]
+    if altitude >= self.depth:
+      return 0.
+    x = altitude / self.step
+    i = int(x)
+    return samples[i] + (samples[i + 1] - samples[i]) * (x - i)
+
+  def pressure(self, altitude):
+    """Static pressure at altitude, in Pa"""
+    return self.lookup(self.pressures, altitude)
+
+  def density(self, altitude):
+    """Air density at altitude, in kg/m3"""
+    return self.lookup(self.densities, altitude)
+
+  def altitude_below(self, pressure):
+    """Lowest altitude where static pressure is below pressure"""
+    altitude = self.crossings.get(pressure)
+    if altitude is None:
+      altitude = self.depth
+      samples = self.pressures
+      for i in range(len(samples) - 1):
+        if samples[i + 1] < pressure:
+          # Pressure decreases with altitude: the crossing is in this interval
+          fraction = (samples[i] - pressure) / (samples[i] - samples[i + 1])
+          altitude = (i + max(0., fraction)) * self.step
+          break
+      self.crossings[pressure] = altitude
+    return altitude
+
+  def to_dict(self):
+    return {'step': self.step,
+            'pressure': [float('%.6g' % p) for p in self.pressures],
+            'density': [float('%.6g' % d) for d in self.densities]}
+
+  @classmethod
+  def from_dict(cls, name, values):
+    return cls(name, values['step'], values['pressure'], values['density'])
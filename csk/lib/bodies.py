@@ -0,0 +1,137 @@
+"""Celestial body constants module
+
+  Gravitational parameter, surface gravity, radius or atmosphere depth
+  of a body never change during a game, but each read is a remote
+  procedure call. BodyConstants reads them once per body, and persists
+  them to a small JSON file keyed by save game and body name, so that
+  later sessions do not read them at all. Atmosphere profiles (see
+  atmosphere) are persisted the same way, in a file next to it.
+
+  Planet packs change bodies, sometimes keeping stock names: constants
+  read from the file are checked against the live equatorial radius of
+  their body, once per session, and read again (atmosphere profile
+  included) when it differs. A save name keeps the constants of a
+  modded save apart from the stock ones, without any re-read.
+"""
+
+import json
+import os
+import weakref
+from collections import namedtuple
+from .atmosphere import AtmosphereProfile
+
+FIELDS = ('gravitational_parameter', 'surface_gravity', 'equatorial_radius',
+          'atmosphere_depth', 'has_atmosphere', 'rotational_period',
+          'sphere_of_influence')
+
+Constants = namedtuple('Constants', ('name',) + FIELDS)
+Constants.__doc__ = """Constant values of a celestial body"""
+
+DEFAULT_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'ksp_krpc', 'bodies.json')
+
+_tables = weakref.WeakKeyDictionary()
+
+
+def for_connection(conn, save='default', path=DEFAULT_PATH):
+  """Returns the constants table of a connection, created on first call"""
+  table = _tables.get(conn)
+  if table is None:
+    table = BodyConstants(save, path)
+    _tables[conn] = table
+  return table
+
+
+class BodyConstants:
+  """Constants of bodies, read once and persisted
+
+    Without a path, constants are only kept in memory
+  """
+
+  def __init__(self, save='default', path=DEFAULT_PATH):
+    self.save = save
+    self.path = path
+    self.bodies = {}
+    self.handles = {}
+    self.profiles = None
+    # Bodies whose saved constants were found stale this session
+    self.refreshed = set()
+    self.load()
+
+  @property
+  def atmosphere_path(self):
+    if self.path is None:
+      return None
+    return os.path.join(os.path.dirname(self.path), 'atmosphere.json')
+
+  def get(self, body):
+    """Returns the constants of a body, given its remote object"""
+    constants = self.handles.get(body)
+    if constants is None:
+      name = body.name
+      constants = self.bodies.get(name)
+      if constants is not None and body.equatorial_radius != constants.equatorial_radius:
+        print("[bodies]", "Saved constants of %s are stale, reading them again" % name)
+        self.refreshed.add(name)
+        constants = None
+      if constants is None:
+        constants = Constants(name, *[getattr(body, field) for field in FIELDS])
+        self.bodies[name] = constants
+        self.store()
+      self.handles[body] = constants
+    return constants
+
+  def atmosphere(self, body):
+    """Returns the atmosphere profile of a body, sampled on first request"""
+    constants = self.get(body)
+    if self.profiles is None:
+      saved = read_json(self.atmosphere_path).get(self.save, {})
+      self.profiles = {name: AtmosphereProfile.from_dict(name, values)
+                       for name, values in saved.items()}
+
+    profile = self.profiles.get(constants.name)
+    if profile is not None and (constants.name in self.refreshed or
+                                abs(profile.depth - constants.atmosphere_depth) > 1.):
+      profile = None
+    if profile is None:
+      profile = AtmosphereProfile.sample(body, constants)
+      self.profiles[constants.name] = profile
+      update_json(self.atmosphere_path, self.save,
+                  {name: p.to_dict() for name, p in self.profiles.items()})
+    return profile
+
+  def load(self):
+    saved = read_json(self.path).get(self.save, {})
+    for name, values in saved.items():
+      if all(field in values for field in FIELDS):
+        self.bodies[name] = Constants(name, *[values[field] for field in FIELDS])
+
+  def store(self):
+    update_json(self.path, self.save,
+                {name: dict(zip(FIELDS, constants[1:]))
+                 for name, constants in self.bodies.items()})
+
+
+def read_json(path):
+  """Returns the content of a cache file, empty if missing or unreadable"""
+  if path is None:
+    return {}
+  try:
+    with open(path) as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return {}
+
+
+def update_json(path, save, values):
+  """Replaces the values of a save in a cache file"""
+  if path is None:
+    return
+  data = read_json(path)
+  data[save] = values
+  try:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+      json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+  except OSError as e:
+    print("[bodies]", "Cannot write %s: %s" % (path, e))
@@ -0,0 +1,106 @@
+"""Clocks module
+
+  Every wait of the mission loops goes through a clock, so that the
+  same code can follow wall-clock time in flight, or run much faster
+  than real time against a simulated server.
+
+  A clock provides:
+    now(): current time, in seconds
+    sleep(seconds): waits for some time to pass
+    wait(event, timeout): waits for a threading.Event to be set, for
+      at most timeout seconds, and tells if it was
+"""
+
+import time
+
+
+class WallClock:
+  """Real time, as used in flight"""
+
+  def now(self):
+    return time.monotonic()
+
+  def sleep(self, seconds):
+    if seconds > 0:
+      time.sleep(seconds)
+
+  def wait(self, event, timeout):
+    return event.wait(timeout)
+
+
+class GameClock:
+  """Game time, read from a universal time stream
+
+    Sleeping waits for the game UT to advance by the requested amount,
+    so waits are shortened by time warp and stretched by lag.
+  """
+
+  poll = 0.01
+
+  def __init__(self, conn):
+    self.ut = conn.add_stream(getattr, conn.space_center, 'ut')
+
+  def now(self):
+    return self.ut()
+
+  def sleep(self, seconds):
+    end = self.ut() + seconds
+    while self.ut() < end:
+      time.sleep(self.poll)
+
+  def wait(self, event, timeout):
+    end = self.ut() + timeout
+    while not event.is_set() and self.ut() < end:
+      event.wait(self.poll)
+    return event.is_set()
+
+  def close(self):
+    self.ut.remove()
+
+
+class VirtualClock:
+  """Time that only passes when slept on
+
+    advance, if given, is called with the slept duration, to move a
+    simulation forward by as much. time, if given, returns the current
+    time of that simulation, so that jumps made without sleeping (time
+    warp) are followed.
+
+    Waiting for an event sleeps by steps of resolution seconds, giving
+    the simulation a chance to set it in between.
+  """
+
+  resolution = 0.02
+  virtual = True
+
+  def __init__(self, start=0., advance=None, time=None):
+    self.t = start
+    self.advance = advance
+    self.time = time
+
+  def now(self):
+    if self.time is not None:
+      return self.time()
+    return self.t
+
+  def sleep(self, seconds):
+    if seconds > 0:
+      self.t += seconds
+      if self.advance is not None:
+        self.advance(seconds)
+
+  def wait(self, event, timeout):
+    waited = 0.
+    while not event.is_set() and waited < timeout:
+      step = min(self.resolution, timeout - waited)
+      self.sleep(step)
+      waited += step
+    return event.is_set()
+
+
+def default_clock(conn=None):
+  """Clock of a connection: its own if it has one, wall-clock time otherwise"""
+  clock = getattr(conn, 'clock', None)
+  if clock is None:
+    clock = WallClock()
+  return clock
@@ -0,0 +1,128 @@
+"""Control channel module
+
+  Buffers the control commands issued during a tick, drops those that
+  would not change what was last sent, and sends the remaining ones
+  once, when the tick ends.
+"""
+
+
+class ControlChannel:
+  """Write-coalescing facade over vessel control and auto-pilot
+
+    Within a tick, the last write of a command wins. On flush, a
+    command is only sent if it differs from the value last sent by
+    more than its tolerance (numbers, or tuples of numbers), or at
+    all (other values).
+
+    If a command is changed without going through the channel, call
+    forget() so that the next write is sent whatever its value.
+
+    A command can be held at a value, for instance the throttle while
+    staging: writes to it are deferred until release(), which restores
+    the last value written meanwhile, or the one before the hold.
+  """
+
+  tolerances = {'throttle': 0.001, 'pitch_and_heading': 0.05}
+
+  def __init__(self, control, auto_pilot, tolerances=None):
+    self.control = control
+    self.auto_pilot = auto_pilot
+    if type(tolerances) is dict:
+      self.tolerances = {**self.tolerances, **tolerances}
+
+    self.pending = {}
+    self.sent = {}
+    self.held = {}
+    self.deferred = {}
+    self.writes = 0
+    self.sends = 0
+
+  @property
+  def throttle(self):
+    """Last throttle written, read from the vessel if never written"""
+    if 'throttle' in self.pending:
+      return self.pending['throttle']
+    if 'throttle' in self.sent:
+      return self.sent['throttle']
+    return self.control.throttle
+
+  @throttle.setter
+  def throttle(self, value):
+    self.set('throttle', value)
+
+  @property
+  def sas(self):
+    return self.pending.get('sas', self.sent.get('sas'))
+
+  @sas.setter
+  def sas(self, value):
+    self.set('sas', value)
+
+  @property
+  def rcs(self):
+    return self.pending.get('rcs', self.sent.get('rcs'))
+
+  @rcs.setter
+  def rcs(self, value):
+    self.set('rcs', value)
+
+  def target_pitch_and_heading(self, pitch, heading):
+    """Buffers a new auto-pilot target pitch and heading"""
+    self.set('pitch_and_heading', (pitch, heading))
+
+  def set(self, name, value):
+    """Buffers a command until the next flush"""
+    self.writes += 1
+    if name in self.held:
+      self.deferred[name] = value
+    else:
+      self.pending[name] = value
+
+  def hold(self, name, value):
+    """Sends value for a command, ignoring other writes until release()"""
+    if name not in self.held:
+      current = self.pending.get(name, self.sent.get(name))
+      if current is not None:
+        self.deferred[name] = current
+    self.held[name] = value
+    self.pending[name] = value
+
+  def release(self, name):
+    """Ends the hold of a command, restoring the value deferred by it"""
+    if name not in self.held:
+      return
+    del self.held[name]
+    if name in self.deferred:
+      self.pending[name] = self.deferred.pop(name)
+
+  def flush(self):
+    """Sends buffered commands that change what was last sent"""
+    for name, value in self.pending.items():
+      if name in self.sent and self.unchanged(name, self.sent[name], value):
+        continue
+      self.send(name, value)
+      self.sent[name] = value
+      self.sends += 1
+    self.pending = {}
+
+  def forget(self, name=None):
+    """Forgets the value last sent for a command, or for all of them"""
+    if name is None:
+      self.sent = {}
+    else:
+      self.sent.pop(name, None)
+
+  def unchanged(self, name, old, new):
+    """Tells if a new command value is within tolerance of the old one"""
+    tolerance = self.tolerances.get(name)
+    if tolerance is None:
+      return old == new
+    if type(new) is tuple:
+      return all(abs(n - o) <= tolerance for o, n in zip(old, new))
+    return abs(new - old) <= tolerance
+
+  def send(self, name, value):
+    if name == 'pitch_and_heading':
+      self.auto_pilot.target_pitch_and_heading(*value)
+    else:
+      setattr(self.control, name, value)
@@ -0,0 +1,133 @@
+"""Fleet controller module
+
+  Runs the missions of several vessels over a single kRPC connection,
+  sharing one stream registry and one game clock stream.
+
+  Only the active vessel is loaded by the game, so steps that act on
+  the vessel (parts, throttle, attitude) must run while it is active.
+  Such steps are flagged in mission steps:
+    {"name": "burn", "function": burn, "physics": True}
+  Steps flagged "coast" only wait for a deadline, and let the fleet
+  time warp. Other steps are ticked whatever the active vessel.
+
+  Missions declare their next deadline as parameters["burn_ut"]. The
+  fleet keeps running missions ordered by deadline, and switches the
+  active vessel to the earliest one needing it, unless the active
+  vessel is burning.
+"""
+
+from .mission import Mission
+from .streams import StreamRegistry
+from .clock import default_clock
+
+NO_DEADLINE = float('inf')
+
+
+class Fleet:
+  """Multiplexes vessel missions over one connection"""
+
+  # Seconds before a deadline when its vessel is made active
+  switch_lead = 30.
+  # Time warp only when the next deadline is further than this
+  warp_margin = 60.
+
+  def __init__(self, conn, clock=None):
+    self.conn = conn
+    self.clock = clock if clock is not None else default_clock(conn)
+    self.streams = StreamRegistry(conn)
+    self.ut = self.streams.get(conn.space_center, 'ut')
+    self.missions = []
+    self.active = None
+    self.switches = 0
+    self.ticks = 0
+
+  def add(self, vessel, steps, parameters=None, name=None):
+    """Creates the mission of a vessel, and returns it"""
+    mission = Mission(self.conn, steps, parameters, clock=self.clock,
+                      vessel=vessel, streams=self.streams,
+                      name=name if name is not None else vessel.name)
+    self.missions.append(mission)
+    return mission
+
+  def start(self):
+    self.active = self.conn.space_center.active_vessel
+    for mission in self.missions:
+      mission.start()
+
+  @property
+  def running(self):
+    return [m for m in self.missions if m.running]
+
+  @staticmethod
+  def flag(mission, name):
+    """Tells if the current step of a mission has a flag"""
+    step = mission.steps[mission.steps_names.index(mission.current_step["name"])]
+    return step.get(name, False)
+
+  def needs_physics(self, mission):
+    return self.flag(mission, "physics")
+
+  @staticmethod
+  def deadline(mission):
+    return mission.parameters.get("burn_ut", NO_DEADLINE)
+
+  def queue(self):
+    """Running missions, earliest deadline first"""
+    return sorted(self.running, key=self.deadline)
+
+  def busy(self, ut):
+    """Tells if the active vessel is burning, and must stay active"""
+    for mission in self.running:
+      if mission.vessel == self.active:
+        return self.needs_physics(mission) and self.deadline(mission) <= ut
+    return False
+
+  def schedule(self, ut):
+    """Makes active the vessel of the most urgent mission"""
+    for mission in self.queue():
+      if self.needs_physics(mission) or self.deadline(mission) - ut <= self.switch_lead:
+        break
+    else:
+      return
+
+    if mission.vessel == self.active or self.busy(ut):
+      return
+
+    self.conn.space_center.active_vessel = mission.vessel
+    self.active = mission.vessel
+    self.switches += 1
+    mission.log("Active vessel")
+
+  def update(self):
+    """Ticks every mission that can run with the active vessel"""
+    self.schedule(self.ut())
+    for mission in self.running:
+      if not self.needs_physics(mission) or mission.vessel == self.active:
+        mission.update()
+        self.ticks += 1
+
+  def warp(self):
+    """Time warps to the next deadline while all missions coast"""
+    running = self.running
+    if not running or not all(self.flag(m, "coast") for m in running):
+      return
+
+    ut = self.ut()
+    target = min(self.deadline(m) for m in running) - self.switch_lead
+    if target - ut > self.warp_margin:
+      print("[fleet]", "Warping %.0f s" % (target - ut))
+      self.conn.space_center.warp_to(target)
+
+  def run(self, period=0.1):
+    """Runs all missions until they are done"""
+    self.start()
+    while self.running:
+      self.update()
+      self.warp()
+      self.clock.sleep(period)
+    self.terminate()
+
+  def terminate(self):
+    for mission in self.running:
+      mission.terminate()
+    self.streams.remove_all()
@@ -0,0 +1,255 @@
+"""Kepler orbit module
+
+  Between two burns, a vessel follows a Kepler orbit around its body.
+  A KeplerOrbit is fitted once to a state vector (position and
+  velocity in the body non-rotating frame), and then gives apoapsis
+  and periapsis, their times, the period and the state vector at any
+  UT with local maths only.
+
+  An OrbitPropagator keeps a KeplerOrbit seeded from streams, and
+  fits it again whenever the prediction may be off: while thrust is
+  applied, inside the atmosphere (drag), or outside the sphere of
+  influence of the body, and once more when the vessel coasts again.
+"""
+
+import math
+from .vector import Vector3
+
+TWO_PI = 2 * math.pi
+
+
+class KeplerOrbit:
+  """Two-body orbit through a state vector at a given UT
+
+    Radii are measured from the body center, altitudes from its
+    equatorial radius. Hyperbolic orbits have an infinite period and
+    apoapsis. Predicted positions and velocities are Vector3, built
+    from the axes of the perifocal frame.
+  """
+
+  def __init__(self, mu, position, velocity, ut, body_radius=0.):
+    self.mu = mu
+    self.epoch = ut
+    self.body_radius = body_radius
+
+    position = Vector3.of(position)
+    velocity = Vector3.of(velocity)
+    r = position.norm()
+    rv = position.dot(velocity)
+    v2 = velocity.dot(velocity)
+    inverse_a = 2. / r - v2 / mu
+    if abs(inverse_a) < 1e-15:
+      # Parabolic: treat as a barely bound orbit
+      inverse_a = 1e-15
+    self.semi_major_axis = 1. / inverse_a
+
+    e_vec = (position * (v2 - mu / r) - velocity * rv) / mu
+    e = e_vec.norm()
+    self.eccentricity = e
+
+    # Perifocal frame: P towards periapsis, Q along the motion at
+    # periapsis, W along the angular momentum
+    h = position.cross(velocity)
+    if e > 1e-9:
+      p = e_vec / e
+    else:
+      p = position / r
+    q = h.cross(p).normalized()
+    self.perifocal = (p, q, p.cross(q))
+
+    a = abs(self.semi_major_axis)
+    self.mean_motion = math.sqrt(mu / a**3)
+    if e < 1:
+      anomaly = math.atan2(rv / math.sqrt(mu * a), 1. - r / a)
+      self.mean_anomaly = anomaly - e * math.sin(anomaly)
+    else:
+      anomaly = math.asinh(rv / (e * math.sqrt(mu * a)))
+      self.mean_anomaly = e * math.sinh(anomaly) - anomaly
+
+  @property
+  def elliptic(self):
+    return self.eccentricity < 1
+
+  @property
+  def period(self):
+    if not self.elliptic:
+      return math.inf
+    return TWO_PI / self.mean_motion
+
+  @property
+  def apoapsis(self):
+    if not self.elliptic:
+      return math.inf
+    return self.semi_major_axis * (1 + self.eccentricity)
+
+  @property
+  def periapsis(self):
+    return self.semi_major_axis * (1 - self.eccentricity)
+
+  @property
+  def apoapsis_altitude(self):
+    return self.apoapsis - self.body_radius
+
+  @property
+  def periapsis_altitude(self):
+    return self.periapsis - self.body_radius
+
+  def mean_anomaly_at(self, ut):
+    mean_anomaly = self.mean_anomaly + self.mean_motion * (ut - self.epoch)
+    if self.elliptic:
+      return mean_anomaly % TWO_PI
+    return mean_anomaly
+
+  def time_to_periapsis(self, ut):
+    """Time from ut to the next periapsis (negative if past, on escape)"""
+    mean_anomaly = self.mean_anomaly_at(ut)
+    if not self.elliptic:
+      return -mean_anomaly / self.mean_motion
+    return ((TWO_PI - mean_anomaly) % TWO_PI) / self.mean_motion
+
+  def time_to_apoapsis(self, ut):
+    """Time from ut to the next apoapsis"""
+    if not self.elliptic:
+      return math.inf
+    return ((math.pi - self.mean_anomaly_at(ut)) % TWO_PI) / self.mean_motion
+
+  def time_below(self, ut, altitude):
+    """Time from ut until the vessel next goes below altitude
+
+      0 if it is below already, infinite if it never goes below.
+    """
+    e = self.eccentricity
+    a = abs(self.semi_major_axis)
+    radius = altitude + self.body_radius
+    if radius <= self.periapsis:
+      return math.inf
+    mean_anomaly = self.mean_anomaly_at(ut)
+    if self.elliptic:
+      if radius >= self.apoapsis:
+        return 0.
+      # Below radius between the eccentric anomalies -crossing and crossing
+      crossing = math.acos((1. - radius / a) / e)
+      limit = crossing - e * math.sin(crossing)
+      if mean_anomaly < limit or mean_anomaly > TWO_PI - limit:
+        return 0.
+      return (TWO_PI - limit - mean_anomaly) / self.mean_motion
+    crossing = math.acosh((radius / a + 1.) / e)
+    limit = e * math.sinh(crossing) - crossing
+    if abs(mean_anomaly) < limit:
+      return 0.
+    if mean_anomaly > 0:
+      return math.inf
+    return (-limit - mean_anomaly) / self.mean_motion
+
+  def eccentric_anomaly(self, mean_anomaly):
+    """Solves Kepler equation, by Newton iterations"""
+    e = self.eccentricity
+    if self.elliptic:
+      anomaly = mean_anomaly if e < 0.8 else math.pi
+      for i in range(50):
+        step = (anomaly - e * math.sin(anomaly) - mean_anomaly) / (1 - e * math.cos(anomaly))
+        anomaly -= step
+        if abs(step) < 1e-12:
+          break
+    else:
+      anomaly = math.asinh(mean_anomaly / e)
+      for i in range(50):
+        step = (e * math.sinh(anomaly) - anomaly - mean_anomaly) / (e * math.cosh(anomaly) - 1)
+        anomaly -= step
+        if abs(step) < 1e-12:
+          break
+    return anomaly
+
+  def perifocal_state_at(self, ut):
+    """Position and velocity at ut along P and Q (see perifocal)"""
+    e = self.eccentricity
+    a = abs(self.semi_major_axis)
+    anomaly = self.eccentric_anomaly(self.mean_anomaly_at(ut))
+    if self.elliptic:
+      b = math.sqrt(1 - e * e)
+      cos_e, sin_e = math.cos(anomaly), math.sin(anomaly)
+      x, y = a * (cos_e - e), a * b * sin_e
+      rate = math.sqrt(self.mu / a) / (1 - e * cos_e)
+      vx, vy = -rate * sin_e, rate * b * cos_e
+    else:
+      b = math.sqrt(e * e - 1)
+      cosh_h, sinh_h = math.cosh(anomaly), math.sinh(anomaly)
+      x, y = a * (e - cosh_h), a * b * sinh_h
+      rate = math.sqrt(self.mu / a) / (e * cosh_h - 1)
+      vx, vy = -rate * sinh_h, rate * b * cosh_h
+
+    return x, y, vx, vy
+
+  def state_at(self, ut):
+    """Position and velocity at ut, in the frame of the seed state vector"""
+    x, y, vx, vy = self.perifocal_state_at(ut)
+    return (Vector3.from_frame((x, y, 0.), self.perifocal),
+            Vector3.from_frame((vx, vy, 0.), self.perifocal))
+
+  def position_at(self, ut):
+    x, y, vx, vy = self.perifocal_state_at(ut)
+    return Vector3.from_frame((x, y, 0.), self.perifocal)
+
+  def altitude_at(self, ut):
+    return self.position_at(ut).norm() - self.body_radius
+
+
+class OrbitPropagator:
+  """Kepler orbit of a vessel, seeded from streams
+
+    position and velocity return the vessel state vector in the body
+    non-rotating frame, ut the game time and thrust the current thrust
+    of the vessel, typically from streams updated together. constants
+    are those of the body (see bodies).
+
+    orbit() returns the current KeplerOrbit, fitted again to the
+    streamed state vector only when needed: otherwise it only reads
+    the thrust and ut streams. The state vector is only consistent
+    with its epoch if position, velocity and ut are streamed in the
+    same priority class (see csk.lib.streams).
+  """
+
+  def __init__(self, constants, position, velocity, ut, thrust):
+    self.constants = constants
+    self.position = position
+    self.velocity = velocity
+    self.ut = ut
+    self.thrust = thrust
+    self.current = None
+    # Whether the current orbit was fitted while the vessel coasted
+    self.coasting = False
+    self.syncs = 0
+
+  def stale(self):
+    """Tells if the orbit may not predict the vessel motion
+
+      An orbit fitted under thrust or in the air is fitted again on
+      every call, and a last time once the vessel coasts again.
+    """
+    if self.current is None or not self.coasting:
+      return True
+    return not self.coasts(self.current)
+
+  def coasts(self, orbit):
+    """Tells if the vessel follows orbit: no thrust, above the air, in the SOI"""
+    if self.thrust() > 0:
+      return False
+    constants = self.constants
+    altitude = orbit.altitude_at(self.ut())
+    if constants.has_atmosphere and altitude < constants.atmosphere_depth:
+      return False
+    return altitude + constants.equatorial_radius <= constants.sphere_of_influence
+
+  def orbit(self):
+    """Returns the orbit of the vessel, resynced if stale"""
+    if self.stale():
+      self.sync()
+    return self.current
+
+  def sync(self):
+    """Fits the orbit to the streamed state vector"""
+    constants = self.constants
+    self.current = KeplerOrbit(constants.gravitational_parameter, self.position(),
+                               self.velocity(), self.ut(), constants.equatorial_radius)
+    self.coasting = self.coasts(self.current)
+    self.syncs += 1
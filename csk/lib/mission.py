@@ -10,9 +10,48 @@
 
   def step_func(mission):
     ...
+
+  Before each tick, the mission reads its telemetry streams into an
+  immutable snapshot available as mission.telemetry, so all steps of a
+  tick see consistent values. Other values should be read through
+  mission.read(obj, attr), which serves them from streams owned by
+  the mission instead of issuing a remote procedure call every tick.
+
+  Telemetry streams are updated at the rate of their priority class
+  (see csk.lib.streams). A step can retune class rates while it runs:
+    {"name": "burn", "function": burn, "rates": {"guidance": 0}}
+
+  Remote object handles of the vessel (control, auto-pilot, orbit,
+  body, flight objects and reference frames) should be taken from
+  mission.vessel_context, which resolves them once per vessel, and
+  body constants from mission.body_constants, and atmosphere
+  pressure and density from mission.atmosphere.
+
+  Throttle, SAS, RCS and auto-pilot pitch and heading should be set
+  through mission.channel, which sends them once at the end of the
+  tick, and only when they changed.
+
+  Steps stage through mission.auto_stage() and
+  mission.release_clamps(), which take at most one staging action
+  per tick and return at once, so that guidance keeps running while
+  staging is in progress.
+
+  Steps and mission loops should wait through mission.clock rather
+  than time.sleep, so that missions flown against a simulated server
+  are not slowed down to real time.
+
+  When run in a csk.lib.runtime.Runtime, step functions may also be
+  coroutine functions, awaiting conditions through mission.runtime.
 """
 
-import time
+import inspect
+from .streams import StreamRegistry, RPCCounter
+from .control import ControlChannel
+from .clock import default_clock
+from .vessel import VesselContext
+from .parts import StagingPlan, AutoStager
+from . import bodies
+from . import telemetry
 
 
 class Mission:
@@ -31,21 +70,118 @@ class Mission:
   steps_names = None
   parameters = {}
   ut = None
+  vessel_context = None
+  telemetry = None
+  telemetry_streams = None
+  channel = None
+  _stager = None
+  streams = None
+  rpc_counter = None
+  rpc_stats = None
+  tick_calls = 0
+  clock = None
+  runtime = None
+  name = None
+  owns_streams = True
 
-  def __init__(self, conn, steps, parameters=None):
-    """Stores kRPC connection and mission steps"""
+  def __init__(self, conn, steps, parameters=None, clock=None, vessel=None,
+               streams=None, name=None):
+    """Stores kRPC connection and mission steps
+
+      Without a clock, the one of the connection is used, or
+      wall-clock time if it has none. Without a vessel, the
+      mission flies the active vessel, and follows it when it
+      changes. A stream registry
+      can be shared between missions, which then leave it open
+      when they terminate.
+    """
     self.conn = conn
+    self.clock = clock if clock is not None else default_clock(conn)
     self.steps = steps
     self.steps_names = [s["name"] for s in steps]
+    self.current_step = {"name": None, "first_call": True, "start_ut": None}
     if type(parameters) is dict:
       self.parameters = parameters
-    self.ut = conn.add_stream(getattr, conn.space_center, 'ut')
+    else:
+      self.parameters = {}
+    self.name = name
+    if streams is None:
+      streams = StreamRegistry(conn)
+    else:
+      self.owns_streams = False
+    self.streams = streams
+    self.vessel_context = VesselContext(conn, vessel, streams)
+    self.ut = self.streams.get(conn.space_center, 'ut')
+    self.rpc_stats = {}
+
+  @property
+  def vessel(self):
+    return self.vessel_context.vessel
+
+  @property
+  def body(self):
+    return self.vessel_context.body
+
+  @property
+  def body_constants(self):
+    """Constants of the body, read once (see csk.lib.bodies)"""
+    return bodies.for_connection(self.conn).get(self.body)
+
+  @property
+  def atmosphere(self):
+    """Atmosphere profile of the body, sampled once (see csk.lib.atmosphere)"""
+    return bodies.for_connection(self.conn).atmosphere(self.body)
+
+  @property
+  def stager(self):
+    """Automatic staging of the vessel, planned once (see csk.lib.parts)"""
+    if self._stager is None:
+      context = self.vessel_context
+      self._stager = AutoStager(StagingPlan(context.parts_index), context.control,
+                                self.channel, self.clock,
+                                max_autostage=self.parameters.get('max_autostage', 0),
+                                stage_wait=self.parameters.get('stage_wait', 0.5))
+    return self._stager
+
+  def auto_stage(self):
+    """Stages if no thrust is available, and tells if staging goes on"""
+    return self.stager.update(self.vessel_context.current_stage,
+                              self.telemetry.available_thrust)
+
+  def release_clamps(self):
+    """Stages toward releasing the launch clamps, and tells if some remain"""
+    return self.stager.release_clamps(self.vessel_context.current_stage)
+
+  def log(self, *args):
+    if self.name is None:
+      print("[mission]", *args)
+    else:
+      print("[mission %s]" % self.name, *args)
+
+  def read(self, obj, attr, priority=None):
+    """Reads obj.attr from a mission stream, opened on first read"""
+    return self.streams.value(obj, attr, priority=priority)
+
+  def count_rpcs(self):
+    """Starts counting remote procedure calls issued by each step"""
+    if self.rpc_counter is None:
+      self.rpc_counter = RPCCounter(self.conn)
+
+  def rpc_report(self):
+    """Returns the average number of RPCs per tick, for each step"""
+    return {name: calls / ticks
+            for name, (ticks, calls) in self.rpc_stats.items()}
 
   def terminate(self):
     """Explicitly stops the update cycle"""
     self.done = True
     self.running = False
-    print("[mission]", "Terminating")
+    self.log("Terminating")
+    self.vessel_context.close()
+    if self.rpc_counter is not None:
+      self.streams.rates.print_report("[mission]")
+    if self.owns_streams:
+      self.streams.remove_all()
 
   def start(self, step=None):
     """Start running the update cycle
@@ -60,23 +196,62 @@ class Mission:
       if step is None:
         step = self.steps_names[0]
 
+      self.fly_vessel()
+
       self.current_step["name"] = step
       self.current_step["start_ut"] = self.ut()
       self.current_step["first_call"] = True
 
       self.running = True
       self.done = False
+      self.retune_streams()
+
+      self.log("Starting at step", step)
 
-      print("[mission]", "Starting at step", step)
+  def fly_vessel(self):
+    """Subscribes to the telemetry and controls of the vessel"""
+    context = self.vessel_context
+    self.telemetry_streams = telemetry.subscribe(self.streams, context)
+    if self._stager is not None:
+      self._stager.cancel()
+      self._stager = None
+    self.channel = ControlChannel(context.control, context.auto_pilot,
+                                  self.parameters.get('control_tolerances'))
 
   def update(self):
     """Executes the current step if mission is running"""
     if self.running:
-      cur_pos = self.steps_names.index(self.current_step["name"])
-      self.steps[cur_pos]["function"](self)
+      cur_pos = self.begin_tick()
+      result = self.steps[cur_pos]["function"](self)
+      if inspect.isawaitable(result):
+        result.close()
+        raise TypeError("Step %s is a coroutine: run the mission in a Runtime" %
+                        self.steps_names[cur_pos])
+      self.end_tick(cur_pos)
+
+  def begin_tick(self):
+    """Reads telemetry before running a step, and returns the step index"""
+    if self.vessel_context.check():
+      self.log("Now flying", self.vessel.name)
+      self.fly_vessel()
+    self.telemetry = telemetry.snapshot(self.telemetry_streams)
+    if self.rpc_counter is not None:
+      self.tick_calls = self.rpc_counter.count
+    return self.steps_names.index(self.current_step["name"])
+
+  def end_tick(self, cur_pos):
+    """Sends controls and records statistics after a step has run"""
+    self.channel.flush()
+
+    if self.rpc_counter is not None:
+      stats = self.rpc_stats.setdefault(self.steps_names[cur_pos], [0, 0])
+      stats[0] += 1
+      stats[1] += self.rpc_counter.count - self.tick_calls
+      if not self.running or self.current_step["name"] != self.steps_names[cur_pos]:
+        self.log_rpcs(self.steps_names[cur_pos])
 
-      next_pos = self.steps_names.index(self.current_step["name"])
-      self.current_step["first_call"] = next_pos != cur_pos
+    next_pos = self.steps_names.index(self.current_step["name"])
+    self.current_step["first_call"] = next_pos != cur_pos
 
   def next(self, step=None, auto_terminate=True):
     """Advances to the next step, if there is one
@@ -98,4 +273,21 @@ class Mission:
     self.current_step["name"] = next_step
     self.current_step["first_call"] = True
     self.current_step["start_ut"] = self.ut()
-    print("[mission]", "Switching to step", self.current_step["name"])
+    if self._stager is not None:
+      self._stager.cancel()
+    self.retune_streams()
+    self.log("Switching to step", self.current_step["name"])
+
+  def retune_streams(self):
+    """Applies the stream rates of the current step
+
+      Missions sharing their streams leave rates to the owner
+    """
+    if self.owns_streams:
+      step = self.steps[self.steps_names.index(self.current_step["name"])]
+      self.streams.rates.phase(step.get("rates"))
+
+  def log_rpcs(self, name):
+    """Prints the average RPCs per tick of a step"""
+    ticks, calls = self.rpc_stats[name]
+    self.log("%s: %.1f RPCs/tick over %d ticks" % (name, calls / ticks, ticks))
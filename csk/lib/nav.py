@@ -1,55 +1,129 @@
 """Utility functions for navigation purposes"""
 
-import math
-from .vector import angle_between_vectors
+import numpy as np
+from .vector import Vector3
+
+# Up axis of surface reference frames
+UP = (1., 0., 0.)
 
 
 def pitch(vessel):
   """Computes current vessel pitch over horizon"""
-  vessel_direction = vessel.direction(vessel.surface_reference_frame)
+  return direction_pitch(vessel.direction(vessel.surface_reference_frame))
+
 
-  # Get the direction of the vessel in the horizon plane
-  horizon_direction = (0, vessel_direction[1], vessel_direction[2])
+def direction_pitch(vessel_direction):
+  """Computes pitch over horizon of a direction in surface reference frame
 
-  # Compute the pitch
-  pitch_degrees = angle_between_vectors(vessel_direction, horizon_direction)
-  if vessel_direction[0] < 0:
-    pitch_degrees = -pitch_degrees
+    Read every tick: computed on a Vector3 rather than by the
+    direction_pitches kernel, whose array setup costs more than the
+    maths for a single direction.
+  """
+  return 90. - Vector3.of(vessel_direction).angle(UP)
 
-  return pitch_degrees
 
+def compute_burn_time(vessel, delta_v, telemetry=None, body=None):
+  """Computes time needed to burn delta_v using currently active engines
 
-def compute_burn_time(vessel, delta_v):
-  F = vessel.available_thrust
-  Isp = vessel.specific_impulse * vessel.orbit.body.surface_gravity
-  m0 = vessel.mass
-  m1 = m0 / math.exp(delta_v / Isp)
-  flow_rate = F / Isp
-  return (m0 - m1) / flow_rate
+    Thrust, specific impulse and mass are read from telemetry,
+    a snapshot of the current tick, when given. Body values are
+    read from body, constants of csk.lib.bodies, when given
+  """
+  source = vessel if telemetry is None else telemetry
+  if body is None:
+    body = vessel.orbit.body
+  exhaust_velocity = source.specific_impulse * body.surface_gravity
+  return float(rocket_burn_time(delta_v, source.mass, source.available_thrust,
+                                exhaust_velocity))
 
 
-def compute_circ_burn(vessel):
+def compute_circ_burn(vessel, telemetry=None, body=None, performance=None):
   """Computes burn parameters to circularize current orbit
 
     First parameter is deltaV needed for the burn
 
     Second one is the time needed to perform the burn using
     currently active engines
+
+    Orbit values are read from telemetry, a snapshot of the
+    current tick, when given, and body values from body,
+    constants of csk.lib.bodies, when given. With a performance
+    model (see csk.lib.performance), the burn time is computed
+    locally, across stages if needed
   """
+  source = vessel.orbit if telemetry is None else telemetry
+  if body is None:
+    body = vessel.orbit.body
 
   # Use vis-viva equation to compute required delta v
-  mu = vessel.orbit.body.gravitational_parameter
-  r = vessel.orbit.apoapsis
-  a1 = vessel.orbit.semi_major_axis
-  a2 = r
-  v1 = math.sqrt(mu * ((2. / r) - (1. / a1)))
-  v2 = math.sqrt(mu * ((2. / r) - (1. / a2)))
-  delta_v = v2 - v1
+  delta_v = float(circularization_delta_v(body.gravitational_parameter,
+                                          source.apoapsis, source.semi_major_axis))
 
   # Use rocket equation to compute burn time
-  burn_time = compute_burn_time(vessel, delta_v)
+  if performance is not None:
+    mass = None if telemetry is None else telemetry.mass
+    burn_time = performance.burn_time(delta_v, mass)
+  else:
+    burn_time = compute_burn_time(vessel, delta_v, telemetry, body)
 
   return {"delta_v": delta_v,
           "burn_time": burn_time
           }
 
+
+###################################
+
+# Array kernels
+#
+# Pure functions of NumPy arrays (or scalars), broadcasting their
+# arguments, so that one call evaluates thousands of cases for planning
+# or Monte Carlo runs. Radii are measured from the body center, speeds
+# in m/s, masses in kg, thrusts in N and exhaust velocities in m/s
+# (specific impulse times g0).
+
+
+def vis_viva(mu, radius, semi_major_axis):
+  """Orbital speed at radius on orbits of the given semi-major axes"""
+  return np.sqrt(mu * (2. / radius - 1. / semi_major_axis))
+
+
+def circularization_delta_v(mu, radius, semi_major_axis):
+  """Delta-v circularizing orbits at radius (an apsis of them)"""
+  return vis_viva(mu, radius, radius) - vis_viva(mu, radius, semi_major_axis)
+
+
+def hohmann_delta_v(mu, radius_from, radius_to):
+  """Delta-v of both burns of Hohmann transfers between circular orbits
+
+    Returns the departure and arrival burns, positive when prograde
+  """
+  transfer = (radius_from + radius_to) / 2.
+  departure = vis_viva(mu, radius_from, transfer) - vis_viva(mu, radius_from, radius_from)
+  arrival = vis_viva(mu, radius_to, radius_to) - vis_viva(mu, radius_to, transfer)
+  return departure, arrival
+
+
+def rocket_delta_v(exhaust_velocity, wet_mass, dry_mass):
+  """Delta-v from burning wet_mass down to dry_mass (rocket equation)"""
+  return exhaust_velocity * np.log(wet_mass / dry_mass)
+
+
+def rocket_burn_time(delta_v, mass, thrust, exhaust_velocity):
+  """Time to burn delta_v at full thrust, starting at mass
+
+    Infinite without thrust
+  """
+  burnt = mass * -np.expm1(-delta_v / exhaust_velocity)
+  with np.errstate(divide='ignore'):
+    return burnt * exhaust_velocity / thrust
+
+
+def direction_pitches(directions):
+  """Pitch over horizon, in degrees, of directions in surface reference frame
+
+    directions is an array of shape (..., 3), the first component
+    being up
+  """
+  directions = np.asarray(directions, dtype=float)
+  horizontal = np.hypot(directions[..., 1], directions[..., 2])
+  return np.degrees(np.arctan2(directions[..., 0], horizontal))
@@ -1,5 +1,8 @@
 """Utility functions to manipulate vessel parts"""
 
+from collections import namedtuple
+from .streams import StreamPool
+
 
 def find_all_fairings(vessel):
   """Finds all vessel fairings, both stock and procedural ones"""
@@ -18,3 +21,231 @@ def jettison_fairing(part):
     for module in part.modules:
       if module.name == "ProceduralFairingDecoupler":
         module.trigger_event("Jettison")
+
+
+IndexedPart = namedtuple('IndexedPart', ['part', 'name', 'tag', 'stage',
+                                         'decouple_stage', 'modules'])
+IndexedPart.__doc__ = """Values of a part, read when the parts index was built
+
+  modules maps module names to the remote modules of the part
+"""
+
+FAIRING_MODULES = ('ModuleProceduralFairing', 'ProceduralFairingDecoupler')
+
+
+class PartsIndex:
+  """Local index of the parts of a vessel
+
+    Reads the name, tag, stages and modules of each part once, so that
+    lookups by module name, part name, tag or stage are local. Each
+    lookup reads two streams, opened through streams (a StreamRegistry
+    or StreamPool, a private pool if not given): the current stage,
+    and the parts list at the logging rate. When the vessel staged,
+    the parts list is read at once, as staging may have dropped parts;
+    when the streamed list changed length, it is used. Either way,
+    only parts new to the index are read.
+  """
+
+  def __init__(self, conn, parts, control, streams=None):
+    self.owns_streams = streams is None
+    self.streams = StreamPool(conn) if streams is None else streams
+    self.remote_parts = parts
+    self.stage_stream = self.streams.acquire(control, 'current_stage', priority='guidance')
+    self.parts_stream = self.streams.acquire(parts, 'all', priority='logging')
+    self.stage = None
+    self.listed = None
+    self.parts = []
+    self.builds = 0
+    self.reads = 0
+
+  def refresh(self):
+    """Updates the index if the vessel staged or lost parts"""
+    stage = self.stage_stream()
+    listed = len(self.parts_stream())
+    if stage != self.stage and self.stage is not None:
+      parts = self.remote_parts.all
+    elif listed != self.listed:
+      parts = self.parts_stream()
+    else:
+      return
+    self.stage = stage
+    self.listed = listed
+    self.build(parts)
+
+  def build(self, parts):
+    """Indexes parts, reading the values of those not indexed yet"""
+    known = {record.part: record for record in self.parts}
+    self.parts = []
+    self.by_module = {}
+    self.by_name = {}
+    self.by_tag = {}
+    self.by_stage = {}
+    self.by_decouple_stage = {}
+
+    for part in parts:
+      record = known.get(part)
+      if record is None:
+        record = IndexedPart(part, part.name, part.tag, part.stage, part.decouple_stage,
+                             {module.name: module for module in part.modules})
+        self.reads += 1
+      self.parts.append(record)
+      for name in record.modules:
+        self.by_module.setdefault(name, []).append(record)
+      self.by_name.setdefault(record.name, []).append(record)
+      self.by_tag.setdefault(record.tag, []).append(record)
+      self.by_stage.setdefault(record.stage, []).append(record)
+      self.by_decouple_stage.setdefault(record.decouple_stage, []).append(record)
+    self.builds += 1
+
+  def with_module(self, module_name):
+    self.refresh()
+    return self.by_module.get(module_name, [])
+
+  def with_name(self, name):
+    self.refresh()
+    return self.by_name.get(name, [])
+
+  def with_tag(self, tag):
+    self.refresh()
+    return self.by_tag.get(tag, [])
+
+  def in_stage(self, stage):
+    """Parts activated by a stage"""
+    self.refresh()
+    return self.by_stage.get(stage, [])
+
+  def in_decouple_stage(self, stage):
+    """Parts detached by a stage"""
+    self.refresh()
+    return self.by_decouple_stage.get(stage, [])
+
+  def module(self, record, module_name):
+    """Returns a module of an indexed part, or None"""
+    return record.modules.get(module_name)
+
+  def fairings(self):
+    """Stock and procedural fairings"""
+    self.refresh()
+    return [record for record in self.parts
+            if any(name in record.modules for name in FAIRING_MODULES)]
+
+  def close(self):
+    self.streams.release(self.stage_stream)
+    self.streams.release(self.parts_stream)
+    if self.owns_streams:
+      self.streams.close()
+
+
+def jettison_indexed_fairing(record):
+  """Jettisons a fairing found by a parts index"""
+  module = record.modules.get('ProceduralFairingDecoupler')
+  if module is not None:
+    module.trigger_event("Jettison")
+  else:
+    record.part.fairing.jettison()
+
+
+ENGINE_MODULES = ('ModuleEngines', 'ModuleEnginesFX', 'ModuleEnginesRF')
+DECOUPLER_MODULES = ('ModuleDecouple', 'ModuleAnchoredDecoupler')
+CLAMP_MODULES = ('LaunchClamp',)
+
+
+class StagingPlan:
+  """Engines, decouplers and launch clamps of each stage
+
+    Built once from a parts index: each part is listed under the stage
+    that activates it (ignites an engine, fires a decoupler, releases
+    a clamp). Stage numbers do not change when parts are dropped, so
+    the plan stays valid for the whole flight of a vessel.
+  """
+
+  def __init__(self, index):
+    index.refresh()
+    self.engines = self.by_stage(index, ENGINE_MODULES)
+    self.decouplers = self.by_stage(index, DECOUPLER_MODULES)
+    self.clamps = self.by_stage(index, CLAMP_MODULES)
+
+  def by_stage(self, index, module_names):
+    stages = {}
+    for record in index.parts:
+      if any(name in record.modules for name in module_names):
+        stages.setdefault(record.stage, []).append(record)
+    return stages
+
+  def next_engine_stage(self, stage, lowest=0):
+    """Highest stage below stage, down to lowest, igniting engines, or None"""
+    below = [s for s in self.engines if lowest <= s < stage]
+    return max(below) if below else None
+
+  def clamp_stage(self, stage):
+    """Stage releasing the launch clamps still held at stage, or None"""
+    below = [s for s in self.clamps if s < stage]
+    return min(below) if below else None
+
+
+class AutoStager:
+  """Non-blocking automatic staging, one action per tick
+
+    update() should be called once per tick with the current stage and
+    the available thrust, and returns at once. When thrust drops to
+    zero while engines remain in later stages (not below max_autostage),
+    the throttle is held at zero through the control channel, and one
+    stage is activated every stage_wait seconds until thrust is back;
+    then the throttle is released. Guidance keeps running meanwhile.
+
+    release_clamps() activates stages the same way until the launch
+    clamps are released. cancel() should be called when the code
+    calling update() stops doing so.
+  """
+
+  def __init__(self, plan, control, channel, clock, max_autostage=0, stage_wait=0.5):
+    self.plan = plan
+    self.control = control
+    self.channel = channel
+    self.clock = clock
+    self.max_autostage = max_autostage
+    self.stage_wait = stage_wait
+    self.staging = False
+    self.next_time = None
+    self.activations = 0
+
+  def can_stage(self, stage):
+    return self.plan.next_engine_stage(stage, self.max_autostage) is not None
+
+  def update(self, stage, available_thrust):
+    """Takes at most one staging action, and tells if staging goes on"""
+    if not self.staging:
+      if available_thrust or not self.can_stage(stage):
+        return False
+      self.channel.hold('throttle', 0)
+      self.staging = True
+      self.next_time = self.clock.now() + self.stage_wait
+      return True
+
+    if available_thrust or not self.can_stage(stage):
+      self.cancel()
+      return False
+
+    self.activate()
+    return True
+
+  def cancel(self):
+    """Stops staging in progress, releasing the throttle"""
+    if self.staging:
+      self.channel.release('throttle')
+      self.staging = False
+
+  def release_clamps(self, stage):
+    """Takes at most one action releasing the clamps, and tells if some remain"""
+    if self.plan.clamp_stage(stage) is None:
+      return False
+    self.activate()
+    return True
+
+  def activate(self):
+    """Activates the next stage, unless the last one was too recent"""
+    now = self.clock.now()
+    if self.next_time is None or now >= self.next_time:
+      self.control.activate_next_stage()
+      self.activations += 1
+      self.next_time = now + self.stage_wait
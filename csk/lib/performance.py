@@ -0,0 +1,129 @@
+"""Vessel performance module
+
+  Thrust, specific impulse and mass of a vessel, stage by stage, read
+  once from the parts tree, so that burn times and delta-v estimates
+  are local computations. A stage here is the flight phase while the
+  vessel current stage is a given number: engines activated by it or
+  earlier ones burn, until the propellant they can reach runs out.
+
+  Engines are assumed to burn the propellant of the parts dropped
+  along with them (sharing their decouple stage), which holds for
+  stacked stages and boosters without crossfeed. Values are vacuum
+  ones: estimates are meant for burns above the atmosphere.
+"""
+
+import math
+from collections import namedtuple
+from .parts import ENGINE_MODULES
+
+# Standard gravity, converting specific impulse to exhaust velocity
+G0 = 9.80665
+
+StagePerformance = namedtuple('StagePerformance', ['stage', 'wet_mass', 'dry_mass',
+                                                   'thrust', 'isp', 'mass_flow'])
+StagePerformance.__doc__ = """Performance of the vessel while its current stage is stage
+
+  Masses in kg, vacuum thrust (thrust limiters applied) in N, specific
+  impulse in s and mass flow in kg/s. A stage without engines or
+  propellant has no thrust or no propellant (wet_mass equals dry_mass).
+"""
+
+
+class PerformanceModel:
+  """Per-stage performance of a vessel, from its current stage down
+
+    Built from a parts index (see parts), reading the mass of each
+    part and the vacuum thrust, thrust limiter and specific impulse of
+    each engine once. It describes the vessel as it was when built, minus the
+    stages burnt since: staged() should be called when the vessel
+    stages, which VesselContext does.
+  """
+
+  def __init__(self, index, current_stage):
+    index.refresh()
+    self.current_stage = current_stage
+    self.stages = self.build(index.parts, current_stage)
+
+  def build(self, records, current_stage):
+    parts = []
+    for record in records:
+      engine = None
+      if any(name in record.modules for name in ENGINE_MODULES):
+        remote_engine = record.part.engine
+        # Thrust limiters cut the mass flow, at the same specific impulse
+        engine = (remote_engine.max_vacuum_thrust * remote_engine.thrust_limit,
+                  remote_engine.vacuum_specific_impulse)
+      mass = record.part.mass
+      parts.append((record, mass, mass - record.part.dry_mass, engine))
+
+    propellant = {id(record): fuel for record, mass, fuel, engine in parts}
+    stages = []
+    for stage in range(current_stage, -1, -1):
+      attached = [p for p in parts if p[0].decouple_stage < stage]
+      engines = [(record, engine) for record, mass, fuel, engine in attached
+                 if engine is not None and record.stage >= stage and engine[0] > 0]
+      groups = set(record.decouple_stage for record, engine in engines)
+
+      wet_mass = sum(mass - fuel + propellant[id(record)]
+                     for record, mass, fuel, engine in attached)
+      fuel = 0.
+      for record, mass, part_fuel, engine in attached:
+        if record.decouple_stage in groups:
+          fuel += propellant[id(record)]
+          propellant[id(record)] = 0.
+
+      thrust = sum(engine[0] for record, engine in engines)
+      mass_flow = sum(engine[0] / (engine[1] * G0)
+                      for record, engine in engines if engine[1] > 0)
+      isp = thrust / (mass_flow * G0) if mass_flow > 0 else 0.
+      stages.append(StagePerformance(stage, wet_mass, wet_mass - fuel, thrust, isp, mass_flow))
+    return stages
+
+  def staged(self, current_stage):
+    """Drops the stages the vessel left behind when staging"""
+    self.stages = [stage for stage in self.stages if stage.stage <= current_stage]
+    self.current_stage = current_stage
+
+  def stage(self, number):
+    """Performance of a stage, or None if dropped or not known"""
+    index = self.current_stage - number
+    if 0 <= index < len(self.stages):
+      return self.stages[index]
+    return None
+
+  def remaining(self, mass=None):
+    """Stages left to burn, the current one starting at mass if given"""
+    stages = list(self.stages)
+    if mass is not None and len(stages) > 0:
+      current = stages[0]
+      stages[0] = current._replace(wet_mass=max(current.dry_mass, mass))
+    return stages
+
+  def delta_v(self, mass=None):
+    """Delta-v left in all stages, in m/s"""
+    return sum(stage_delta_v(stage) for stage in self.remaining(mass))
+
+  def burn_time(self, delta_v, mass=None):
+    """Time to burn delta_v at full thrust, staging as needed
+
+      Returns infinity if the vessel has not enough delta-v
+    """
+    time = 0.
+    for stage in self.remaining(mass):
+      available = stage_delta_v(stage)
+      if available <= 0:
+        continue
+      if delta_v <= available:
+        exhaust_velocity = stage.isp * G0
+        burnt = stage.wet_mass - stage.wet_mass / math.exp(delta_v / exhaust_velocity)
+        return time + burnt / stage.mass_flow
+      time += (stage.wet_mass - stage.dry_mass) / stage.mass_flow
+      delta_v -= available
+    return math.inf if delta_v > 0 else time
+
+
+def stage_delta_v(stage):
+  """Delta-v of a stage, from the rocket equation"""
+  if stage.mass_flow <= 0 or stage.dry_mass <= 0 or stage.wet_mass <= stage.dry_mass:
+    return 0.
+  return stage.isp * G0 * math.log(stage.wet_mass / stage.dry_mass)
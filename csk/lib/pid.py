@@ -1,21 +1,35 @@
 """PID controller module"""
 
+import numpy as np
+
 
 class PID:
   """Generic PID controller class
 
     This class allows to control an input/output relationship
     through a PID controller, tuned by 3 parameters Kp, Ki and Kd.
+
+    With a time constant Tf (in s), the derivative term is low-pass
+    filtered, so that a noisy output (like time to apoapsis) does not
+    make the input chatter. Instances are slotted, and seek() creates
+    no other objects than the float values it computes.
   """
 
-  def __init__(self, Kp=0.2, Ki=0.0, Kd=0.0, cMin=0, cMax=1):
+  __slots__ = ('Kp', 'Ki', 'Kd', 'cMin', 'cMax', 'Tf',
+               'seekP', 'P', 'I', 'D', 'oldT', 'oldInput')
+
+  def __init__(self, Kp=0.2, Ki=0.0, Kd=0.0, cMin=0, cMax=1, Tf=0.):
 
     self.Kp = Kp
     self.Ki = Ki
     self.Kd = Kd
     self.cMin = cMin
     self.cMax = cMax
+    self.Tf = Tf
+    self.reset()
 
+  def reset(self):
+    """Forgets past values, as a new controller"""
     self.seekP = 0.0
     self.P = 0.0
     self.I = 0.0
@@ -27,30 +41,106 @@ class PID:
     """Computes new input value based on current and expected output values"""
 
     P = seekVal - curVal
-    D = self.D
-    I = self.I
+    oldT = self.oldT
     newInput = self.oldInput
-    t = ut
-    dT = t - self.oldT
 
-    if self.oldT >= 0:
+    if oldT >= 0:
+      dT = ut - oldT
       if dT > 0:
         D = (P - self.P) / dT
+        if self.Tf > 0:
+          D = self.D + (D - self.D) * dT / (self.Tf + dT)
         onlyPD = self.Kp * P + self.Kd * D
 
-        if ((self.I > 0 or onlyPD > self.cMin)
-        and (self.I < 0 or onlyPD < self.cMax)):
-          I = self.I + P * dT
+        I = self.I
+        if ((I > 0 or onlyPD > self.cMin)
+        and (I < 0 or onlyPD < self.cMax)):
+          I = I + P * dT
+          self.I = I
 
         newInput = onlyPD + self.Ki * I
+        self.D = D
 
-    newInput = max(self.cMin, min(self.cMax, newInput))
+    # Same results as max(cMin, min(cMax, newInput)), without the calls
+    if not newInput < self.cMax:
+      newInput = self.cMax
+    if not newInput > self.cMin:
+      newInput = self.cMin
 
     self.seekP = seekVal
     self.P = P
-    self.I = I
-    self.D = D
-    self.oldT = t
+    self.oldT = ut
     self.oldInput = newInput
 
     return newInput
+
+
+class PIDBank:
+  """Bank of PID controllers, seeking together
+
+    Gains, limits and state of each controller are kept in NumPy
+    arrays, and seek() updates them all at once, with the semantics
+    of PID.seek (including its anti-windup clamping): controller i
+    gives bit for bit what a PID with the same parameters would, fed
+    the same values. Gains and limits are scalars or arrays of one
+    value per controller, and so are derivative filter time constants
+    (see PID).
+
+    A bank holds many vehicles in batch simulations, or several loops
+    of one vehicle.
+  """
+
+  def __init__(self, count, Kp=0.2, Ki=0.0, Kd=0.0, cMin=0, cMax=1, Tf=0.):
+    self.count = count
+    self.Kp = np.broadcast_to(np.asarray(Kp, dtype=float), (count,))
+    self.Ki = np.broadcast_to(np.asarray(Ki, dtype=float), (count,))
+    self.Kd = np.broadcast_to(np.asarray(Kd, dtype=float), (count,))
+    self.cMin = np.broadcast_to(np.asarray(cMin, dtype=float), (count,))
+    self.cMax = np.broadcast_to(np.asarray(cMax, dtype=float), (count,))
+    self.Tf = np.broadcast_to(np.asarray(Tf, dtype=float), (count,))
+
+    self.seekP = np.zeros(count)
+    self.P = np.zeros(count)
+    self.I = np.zeros(count)
+    self.D = np.zeros(count)
+    self.oldT = np.full(count, -1.)
+    self.oldInput = np.zeros(count)
+
+  def reset(self, mask=None):
+    """Controllers in mask (all by default) start over, as new PIDs"""
+    if mask is None:
+      mask = np.ones(self.count, dtype=bool)
+    for state in (self.seekP, self.P, self.I, self.D, self.oldInput):
+      state[mask] = 0.
+    self.oldT[mask] = -1.
+
+  def seek(self, seekVal, curVal, ut, mask=None):
+    """Computes new input values based on current and expected output values
+
+      Values and ut are scalars or arrays of one value per controller.
+      With a mask, only the controllers in it seek: the others keep
+      their state, and their returned values are meaningless.
+    """
+    P = seekVal - curVal
+    dT = ut - self.oldT
+    update = (self.oldT >= 0) & (dT > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+      D = (P - self.P) / dT
+      D = np.where(self.Tf > 0, self.D + (D - self.D) * dT / (self.Tf + dT), D)
+      D = np.where(update, D, self.D)
+      onlyPD = self.Kp * P + self.Kd * D
+      integrate = (update & ((self.I > 0) | (onlyPD > self.cMin)) &
+                   ((self.I < 0) | (onlyPD < self.cMax)))
+      I = np.where(integrate, self.I + P * dT, self.I)
+      newInput = np.where(update, onlyPD + self.Ki * I, self.oldInput)
+    newInput = np.maximum(self.cMin, np.minimum(self.cMax, newInput))
+
+    if mask is None:
+      mask = True
+    np.copyto(self.seekP, seekVal, where=mask)
+    np.copyto(self.P, P, where=mask)
+    np.copyto(self.I, I, where=mask)
+    np.copyto(self.D, D, where=mask)
+    np.copyto(self.oldT, ut, where=mask)
+    np.copyto(self.oldInput, newInput, where=mask)
+    return newInput
@@ -0,0 +1,216 @@
+"""Asynchronous runtime module
+
+  Runs missions, scenarios and periodic tasks (HUD, telemetry logging)
+  side by side in one asyncio event loop, sharing a kRPC connection.
+
+  Steps may be coroutine functions, awaiting the runtime:
+    await runtime.sleep(seconds)
+    await runtime.until(stream, '>', value)
+    await runtime.changed(stream)
+    await runtime.until_ut(ut)
+  Synchronous steps keep working unchanged: they are simply called.
+
+  Stream conditions are resolved from stream update callbacks. With a
+  virtual clock, the runtime also drives time: whenever every task is
+  waiting, the clock is slept up to the earliest deadline (or by its
+  resolution while conditions are awaited).
+"""
+
+import asyncio
+import heapq
+import inspect
+import itertools
+import operator
+from .clock import default_clock
+
+OPERATORS = {'<': operator.lt,
+             '<=': operator.le,
+             '>': operator.gt,
+             '>=': operator.ge,
+             '==': operator.eq,
+             '!=': operator.ne}
+
+
+class Runtime:
+  """Event loop shared by several missions or scenarios"""
+
+  def __init__(self, conn, clock=None):
+    self.conn = conn
+    self.clock = clock if clock is not None else default_clock(conn)
+    self.virtual = getattr(self.clock, 'virtual', False)
+    self.loop = None
+    self.pending = []
+    self.tasks = []
+    self.deadlines = []
+    self.sequence = itertools.count()
+    self.watching = 0
+    self.ut_stream = None
+
+  # Awaitables
+
+  async def sleep(self, seconds):
+    """Waits for some time, as measured by the runtime clock"""
+    if not self.virtual:
+      await asyncio.sleep(seconds)
+      return
+
+    future = self.loop.create_future()
+    heapq.heappush(self.deadlines,
+                   (self.clock.now() + seconds, next(self.sequence), future))
+    await future
+
+  async def until(self, stream, op, value):
+    """Waits for op(stream(), value) to be true, and returns the stream value"""
+    compare = OPERATORS[op]
+    current = stream()
+    if compare(current, value):
+      return current
+
+    future = self.loop.create_future()
+
+    def callback(new_value):
+      if compare(new_value, value):
+        self.loop.call_soon_threadsafe(resolve, future, new_value)
+
+    stream.add_callback(callback)
+    self.watching += 1
+    try:
+      return await future
+    finally:
+      self.watching -= 1
+      stream.remove_callback(callback)
+
+  async def changed(self, stream):
+    """Waits for the value of a stream to change, and returns it"""
+    return await self.until(stream, '!=', stream())
+
+  async def until_ut(self, ut):
+    """Waits for game time to reach ut"""
+    if self.ut_stream is None:
+      self.ut_stream = self.conn.add_stream(getattr, self.conn.space_center, 'ut')
+    return await self.until(self.ut_stream, '>=', ut)
+
+  async def wait_event(self, event, timeout):
+    """Waits for a threading.Event, for at most timeout seconds"""
+    if not self.virtual:
+      return await self.loop.run_in_executor(None, event.wait, timeout)
+
+    waited = 0.
+    while not event.is_set() and waited < timeout:
+      await self.sleep(self.clock.resolution)
+      waited += self.clock.resolution
+    return event.is_set()
+
+  # Tasks
+
+  def add(self, coroutine):
+    """Schedules a coroutine, to be run with the others by run()"""
+    if self.loop is None:
+      self.pending.append(coroutine)
+    else:
+      self.tasks.append(self.loop.create_task(coroutine))
+
+  def mission(self, mission, period=0.1):
+    """Schedules a mission, ticking every period seconds"""
+    self.add(self.run_mission(mission, period))
+
+  def scenario(self, scenario):
+    """Schedules a scenario"""
+    self.add(self.run_scenario(scenario))
+
+  def every(self, period, func, stop_when=None):
+    """Schedules a synchronous function to be called every period seconds
+
+      until stop_when(), if given, returns True
+    """
+    self.add(self.run_periodic(period, func, stop_when))
+
+  def run(self):
+    """Runs all scheduled tasks until they are done"""
+    return asyncio.run(self.main())
+
+  async def main(self):
+    self.loop = asyncio.get_running_loop()
+    self.tasks = [self.loop.create_task(c) for c in self.pending]
+    self.pending = []
+
+    driver = None
+    if self.virtual:
+      driver = self.loop.create_task(self.drive())
+
+    try:
+      results = []
+      while len(results) < len(self.tasks):
+        results = await asyncio.gather(*self.tasks)
+      return results
+    finally:
+      if driver is not None:
+        driver.cancel()
+      if self.ut_stream is not None:
+        self.ut_stream.remove()
+        self.ut_stream = None
+      self.loop = None
+
+  async def drive(self):
+    """Moves a virtual clock forward whenever all tasks are waiting"""
+    while True:
+      await asyncio.sleep(0)
+
+      now = self.clock.now()
+      if self.deadlines and self.deadlines[0][0] <= now + 1e-9:
+        while self.deadlines and self.deadlines[0][0] <= now + 1e-9:
+          resolve(heapq.heappop(self.deadlines)[2], None)
+        continue
+
+      step = self.clock.resolution
+      if self.deadlines and self.watching == 0:
+        step = self.deadlines[0][0] - now
+      elif self.deadlines:
+        step = min(step, self.deadlines[0][0] - now)
+      self.clock.sleep(step)
+
+  # Adapters
+
+  async def run_mission(self, mission, period):
+    """Ticks a csk Mission, awaiting its step when it is a coroutine"""
+    mission.runtime = self
+    if not mission.running and not mission.done:
+      mission.start()
+
+    while mission.running:
+      cur_pos = mission.begin_tick()
+      result = mission.steps[cur_pos]["function"](mission)
+      if inspect.isawaitable(result):
+        await result
+      mission.end_tick(cur_pos)
+      await self.sleep(period)
+
+  async def run_scenario(self, scenario):
+    """Runs a Scenario, awaiting its step when it is a coroutine"""
+    scenario.runtime = self
+    scenario.begin()
+
+    while True:
+      result = scenario.step()
+      if inspect.isawaitable(result):
+        result = await result
+      if not scenario.after_step(result):
+        break
+
+      if scenario.arm_wait():
+        await self.wait_event(scenario.waker.event, scenario.max_wait)
+      else:
+        await self.sleep(scenario.poll_period)
+      scenario.woke()
+
+    scenario.end()
+
+  async def run_periodic(self, period, func, stop_when):
+    while stop_when is None or not stop_when():
+      func()
+      await self.sleep(period)
+
+
+def resolve(future, value):
+  if not future.done():
+    future.set_result(value)
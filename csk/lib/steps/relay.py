@@ -0,0 +1,98 @@
+"""
+  Functions to be used as mission steps
+  for relay satellites: antennas activation,
+  then execution of maneuver nodes (station keeping)
+
+  Steps flagged "physics" need their vessel to be the
+  active one, steps flagged "coast" only wait for the
+  next burn (see csk.lib.fleet)
+"""
+
+
+def activate_antennas(mission):
+  """Activate RemoteTech antennas"""
+  for antenna in mission.vessel_context.parts_index.with_module('ModuleRTAntenna'):
+    module = antenna.modules['ModuleRTAntenna']
+    if module.has_event('Activate'):
+      module.trigger_event('Activate')
+  mission.next()
+
+
+def plan_node_burn(mission):
+  """Compute when to start burning the next node, complete if none
+
+    Maneuver nodes, parts and engines are only known for a loaded
+    vessel: the step is flagged "physics".
+  """
+  nodes = mission.vessel_context.control.nodes
+  if len(nodes) == 0:
+    mission.terminate()
+    return
+
+  node = nodes[0]
+  burn_time = mission.vessel_context.performance.burn_time(node.delta_v,
+                                                          mission.telemetry.mass)
+  mission.parameters["node"] = node
+  mission.parameters["burn_ut"] = node.ut - burn_time / 2.
+  mission.next()
+
+
+def coast_to_node(mission):
+  """Wait until it is time to orient for the burn"""
+  lead_time = mission.parameters.get('lead_time', 15)
+  if mission.telemetry.ut >= mission.parameters["burn_ut"] - lead_time:
+    mission.next()
+
+
+def orient_to_node(mission):
+  """Point to the node burn vector until burn time"""
+  ap = mission.vessel_context.auto_pilot
+
+  if mission.current_step["first_call"]:
+    mission.channel.rcs = mission.parameters.get('use_rcs', True)
+    ap.engage()
+    ap.reference_frame = mission.parameters["node"].reference_frame
+    ap.target_direction = (0, 1, 0)
+
+  if mission.telemetry.ut >= mission.parameters["burn_ut"]:
+    mission.next()
+
+
+def burn_node(mission):
+  """Burn until the node remaining delta-v stops decreasing"""
+  node = mission.parameters["node"]
+  remaining_delta_v = mission.read(node, 'remaining_delta_v')
+
+  if mission.current_step["first_call"]:
+    mission.parameters["remaining_delta_v"] = remaining_delta_v
+
+  if (remaining_delta_v <= 0 or
+      remaining_delta_v > mission.parameters["remaining_delta_v"]):
+    mission.channel.throttle = 0
+    mission.streams.discard(node)
+    node.remove()
+    mission.vessel_context.auto_pilot.disengage()
+    del mission.parameters["node"]
+    del mission.parameters["burn_ut"]
+    mission.parameters["burns"] = mission.parameters.get("burns", 0) + 1
+    mission.next('plan_node_burn')
+    return
+
+  performance = mission.vessel_context.performance
+  if performance.burn_time(remaining_delta_v, mission.telemetry.mass) > 1:
+    mission.channel.throttle = 1
+  else:
+    mission.channel.throttle = 0.05
+
+  mission.parameters["remaining_delta_v"] = remaining_delta_v
+
+
+###################################
+
+all_steps = [
+    {"name": "activate_antennas", "function": activate_antennas, "physics": True},
+    {"name": "plan_node_burn", "function": plan_node_burn, "physics": True},
+    {"name": "coast_to_node", "function": coast_to_node, "coast": True},
+    {"name": "orient_to_node", "function": orient_to_node, "physics": True},
+    {"name": "burn_node", "function": burn_node, "physics": True},
+]
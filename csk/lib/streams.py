@@ -0,0 +1,272 @@
+"""Telemetry streams module
+
+  Keeps kRPC streams alive for the duration of a mission, so that
+  telemetry values are read from the local stream cache instead of
+  being fetched through a blocking remote procedure call on every tick.
+
+  StreamRegistry serves a single mission. StreamPool is shared by a
+  chain of scenarios, which acquire and release the streams they use.
+
+  Streams are opened in a priority class, which sets their update rate:
+    control:  values feeding control loops every tick (0: every update)
+    guidance: values deciding the next step or target
+    hud:      values only displayed
+    logging:  values only recorded
+  Class rates can be retuned for a flight phase through StreamRates.
+"""
+
+# Priority classes, from the most to the least urgent
+PRIORITIES = ('control', 'guidance', 'hud', 'logging')
+
+# Default update rates of priority classes, in Hz (0: every server update)
+DEFAULT_RATES = {'control': 0, 'guidance': 10, 'hud': 2, 'logging': 0.5}
+
+# Update rate assumed for unlimited streams in bandwidth reports:
+# the server sends stream updates at most once per physics frame
+SERVER_RATE = 50
+
+
+class StreamRates:
+  """Update rates of stream priority classes
+
+    Each stream belongs to one class, and is updated at the rate of
+    its class. Streams opened without a class are put in the control
+    class, which keeps the default unlimited rate of kRPC streams.
+  """
+
+  def __init__(self, rates=None):
+    self.defaults = dict(DEFAULT_RATES)
+    if rates is not None:
+      self.defaults.update(rates)
+    self.rates = dict(self.defaults)
+    self.members = {priority: [] for priority in PRIORITIES}
+    self.priorities = {}
+
+  def assign(self, stream, priority=None):
+    """Puts a stream in a class, unless it is in a more urgent one already"""
+    current = self.priorities.get(id(stream))
+    if priority is None:
+      if current is not None:
+        return
+      priority = PRIORITIES[0]
+    elif current is not None:
+      if PRIORITIES.index(current) <= PRIORITIES.index(priority):
+        return
+      self.members[current].remove(stream)
+
+    self.members[priority].append(stream)
+    self.priorities[id(stream)] = priority
+    set_rate(stream, self.rates[priority])
+
+  def forget(self, stream):
+    """Removes a closed stream from its class"""
+    priority = self.priorities.pop(id(stream), None)
+    if priority is not None:
+      self.members[priority].remove(stream)
+
+  def retune(self, priority, rate):
+    """Changes the update rate of a class, and of all its streams"""
+    self.rates[priority] = rate
+    for stream in self.members[priority]:
+      set_rate(stream, rate)
+
+  def phase(self, rates=None):
+    """Restores default rates, overridden by the rates of a flight phase"""
+    for priority in PRIORITIES:
+      rate = self.defaults[priority]
+      if rates is not None:
+        rate = rates.get(priority, rate)
+      if rate != self.rates[priority]:
+        self.retune(priority, rate)
+
+  def report(self):
+    """Returns (streams, rate, maximum updates/s) for each class"""
+    report = {}
+    for priority in PRIORITIES:
+      count = len(self.members[priority])
+      rate = self.rates[priority]
+      report[priority] = (count, rate, count * (rate if rate > 0 else SERVER_RATE))
+    return report
+
+  def print_report(self, prefix="[streams]"):
+    for priority, (count, rate, updates) in self.report().items():
+      print(prefix, "%-8s %2d streams at %s: up to %.0f updates/s" %
+            (priority, count, "%g Hz" % rate if rate > 0 else "every update", updates))
+
+
+def set_rate(stream, rate):
+  # Setting the rate of a kRPC stream is a remote call: skip it if unchanged
+  if stream.rate != rate:
+    stream.rate = rate
+
+
+class StreamRegistry:
+  """Lazily creates and reuses streams
+
+    Streams are keyed by (object, attribute[, arguments]): the first
+    request for a given key opens a stream, later requests return the
+    same one.
+  """
+
+  def __init__(self, conn, rates=None):
+    self.conn = conn
+    self.streams = {}
+    self.rates = StreamRates(rates)
+
+  def get(self, obj, attr, *args, priority=None):
+    """Returns the stream of obj.attr, opening it on first request
+
+      When args are given, attr is a method and the stream
+      follows the result of obj.attr(*args). The stream is put
+      in the given priority class, or kept in a more urgent one.
+    """
+    key = (obj, attr) + args
+    stream = self.streams.get(key)
+    if stream is None:
+      if args:
+        stream = self.conn.add_stream(getattr(obj, attr), *args)
+      else:
+        stream = self.conn.add_stream(getattr, obj, attr)
+      self.streams[key] = stream
+    self.rates.assign(stream, priority)
+    return stream
+
+  def value(self, obj, attr, *args, priority=None):
+    """Returns the latest streamed value of obj.attr"""
+    return self.get(obj, attr, *args, priority=priority)()
+
+  def acquire(self, obj, attr, *args, priority=None):
+    """Same as get, for code written against a StreamPool"""
+    return self.get(obj, attr, *args, priority=priority)
+
+  def release(self, stream):
+    """Does nothing: registry streams stay open until remove_all()"""
+
+  def discard(self, obj):
+    """Closes the streams of an object about to be removed"""
+    for key in [k for k in self.streams if k[0] == obj]:
+      self.remove(self.streams.pop(key))
+
+  def remove(self, stream):
+    self.rates.forget(stream)
+    stream.remove()
+
+  def remove_all(self):
+    """Closes every stream opened by this registry"""
+    for stream in self.streams.values():
+      self.remove(stream)
+    self.streams = {}
+
+
+class StreamPool:
+  """Reference-counted streams, shared by consecutive users
+
+    acquire() returns the stream of obj.attr, opening it only if it is
+    not open yet, and release() gives it back. Streams nobody holds
+    stay open until collect() is called, so that a scenario following
+    another one reuses the streams it acquires again instead of
+    opening new ones.
+
+    Used as a context manager, the pool closes all its streams on exit.
+  """
+
+  def __init__(self, conn, rates=None):
+    self.conn = conn
+    self.rates = StreamRates(rates)
+    self.streams = {}
+    self.refs = {}
+    self.keys = {}
+    self.opened = 0
+    self.reused = 0
+
+  def acquire(self, obj, attr, *args, priority=None):
+    """Returns the stream of obj.attr, and holds it until released
+
+      The stream is put in the given priority class, or kept in
+      a more urgent one.
+    """
+    key = (obj, attr) + args
+    stream = self.streams.get(key)
+    if stream is None:
+      if args:
+        stream = self.conn.add_stream(getattr(obj, attr), *args)
+      else:
+        stream = self.conn.add_stream(getattr, obj, attr)
+      self.streams[key] = stream
+      self.refs[key] = 0
+      self.keys[id(stream)] = key
+      self.opened += 1
+    elif self.refs[key] == 0:
+      self.reused += 1
+    self.refs[key] += 1
+    self.rates.assign(stream, priority)
+    return stream
+
+  def release(self, stream):
+    """Gives back a stream, which stays open until collected"""
+    key = self.keys.get(id(stream))
+    if key is not None:
+      self.refs[key] = max(0, self.refs[key] - 1)
+
+  def discard(self, obj):
+    """Closes the streams of an object about to be removed, even if held"""
+    for key in [k for k in self.streams if k[0] == obj]:
+      self.remove(key)
+
+  def collect(self):
+    """Closes the streams nobody holds, and returns how many"""
+    idle = [key for key, refs in self.refs.items() if refs == 0]
+    for key in idle:
+      self.remove(key)
+    return len(idle)
+
+  def remove(self, key):
+    stream = self.streams.pop(key)
+    del self.refs[key]
+    del self.keys[id(stream)]
+    self.rates.forget(stream)
+    stream.remove()
+
+  @property
+  def open_streams(self):
+    """Number of streams currently open"""
+    return len(self.streams)
+
+  @property
+  def held_streams(self):
+    """Number of open streams held by at least one user"""
+    return sum(1 for refs in self.refs.values() if refs > 0)
+
+  def close(self):
+    """Closes every stream of the pool, held or not"""
+    for key in list(self.streams):
+      self.remove(key)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc):
+    self.close()
+
+
+class RPCCounter:
+  """Counts remote procedure calls issued through a connection
+
+    Wraps the connection invoke method, so every synchronous call
+    (property read, property write, method call) is counted. Stream
+    updates are pushed by the server and are not counted.
+  """
+
+  def __init__(self, conn):
+    self.conn = conn
+    self.count = 0
+    self._invoke = conn._invoke
+    conn._invoke = self._counted_invoke
+
+  def _counted_invoke(self, *args, **kwargs):
+    self.count += 1
+    return self._invoke(*args, **kwargs)
+
+  def detach(self):
+    """Restores the original invoke method of the connection"""
+    self.conn._invoke = self._invoke
@@ -0,0 +1,78 @@
+"""Telemetry snapshot module
+
+  A snapshot holds the values of every telemetry stream a mission
+  subscribes to, read together once per tick and tagged with the
+  game UT, so that all steps of a tick see consistent values.
+"""
+
+from collections import namedtuple
+
+
+# Snapshot fields, with the object and attribute they are streamed from,
+# followed by the arguments of the attribute when it is a method
+FIELDS = (
+    ('ut', 'space_center', 'ut'),
+    ('mean_altitude', 'flight', 'mean_altitude'),
+    ('speed', 'surface_flight', 'speed'),
+    ('latitude', 'flight', 'latitude'),
+    ('longitude', 'flight', 'longitude'),
+    ('apoapsis', 'orbit', 'apoapsis'),
+    ('apoapsis_altitude', 'orbit', 'apoapsis_altitude'),
+    ('periapsis_altitude', 'orbit', 'periapsis_altitude'),
+    ('semi_major_axis', 'orbit', 'semi_major_axis'),
+    ('period', 'orbit', 'period'),
+    ('time_to_apoapsis', 'orbit', 'time_to_apoapsis'),
+    ('time_to_periapsis', 'orbit', 'time_to_periapsis'),
+    ('mass', 'vessel', 'mass'),
+    ('available_thrust', 'vessel', 'available_thrust'),
+    ('specific_impulse', 'vessel', 'specific_impulse'),
+    ('throttle', 'control', 'throttle'),
+    ('direction', 'vessel', 'direction', 'surface_frame'),
+)
+
+# Priority class of each field stream (see csk.lib.streams)
+PRIORITIES = {
+    'ut': 'control',
+    'time_to_apoapsis': 'control',
+    'mean_altitude': 'guidance',
+    'latitude': 'guidance',
+    'longitude': 'guidance',
+    'apoapsis': 'guidance',
+    'apoapsis_altitude': 'guidance',
+    'periapsis_altitude': 'guidance',
+    'semi_major_axis': 'guidance',
+    'period': 'guidance',
+    'time_to_periapsis': 'guidance',
+    'mass': 'guidance',
+    'available_thrust': 'guidance',
+    'specific_impulse': 'guidance',
+    'speed': 'guidance',
+    'throttle': 'hud',
+    'direction': 'hud',
+}
+
+Telemetry = namedtuple('Telemetry', [f[0] for f in FIELDS])
+Telemetry.__doc__ = """Immutable telemetry values of one tick"""
+
+
+def subscribe(streams, context):
+  """Opens the streams feeding snapshots of the vessel of a VesselContext
+
+    Returns the streams in snapshot field order
+  """
+  sources = {'space_center': context.space_center,
+             'vessel': context.vessel,
+             'orbit': context.orbit,
+             'control': context.control,
+             'flight': context.flight,
+             'surface_flight': context.surface_flight,
+             'surface_frame': context.surface_frame}
+
+  return [streams.get(sources[source], attr, *[sources[a] for a in args],
+                      priority=PRIORITIES[name])
+          for name, source, attr, *args in FIELDS]
+
+
+def snapshot(subscribed):
+  """Reads all subscribed streams into a new snapshot"""
+  return Telemetry._make([stream() for stream in subscribed])
@@ -1,9 +1,18 @@
 """Vector maths functions
 
-  Vectors are represented by lists containing 3 numbers
+  Vectors are represented by lists containing 3 numbers. Scalar hot
+  paths may use Vector3 (and Quaternion for rotations), whose slots
+  keep them small and their components quick to read; batch
+  computations use the functions of NumPy arrays at the end of this
+  module.
+
+  Building a Vector3 costs more than building a tuple: it pays off
+  where components are read more than vectors are built (dot, norm,
+  angle, frame transforms), not for a lone cross product.
 """
 
 import math
+import numpy as np
 
 
 def dot_product(x, y):
@@ -11,6 +20,13 @@ def dot_product(x, y):
   return x[0] * y[0] + x[1] * y[1] + x[2] * y[2]
 
 
+def cross_product(x, y):
+  """Computes cross product of vectors x and y"""
+  return (x[1] * y[2] - x[2] * y[1],
+          x[2] * y[0] - x[0] * y[2],
+          x[0] * y[1] - x[1] * y[0])
+
+
 def magnitude(x):
   """Computes magnitude of the vector x"""
   return math.sqrt(x[0]**2 + x[1]**2 + x[2]**2)
@@ -24,3 +40,242 @@ def angle_between_vectors(x, y):
   xm = magnitude(x)
   ym = magnitude(y)
   return math.acos(dp / (xm * ym)) * (180. / math.pi)
+
+
+class Vector3:
+  """3D vector of floats, for scalar hot paths
+
+    Accepted wherever a 3-element sequence is (it iterates and indexes
+    like one); tuple(v) gives what remote calls expect.
+  """
+
+  __slots__ = ('x', 'y', 'z')
+
+  def __init__(self, x=0., y=0., z=0.):
+    self.x = x
+    self.y = y
+    self.z = z
+
+  @classmethod
+  def of(cls, values):
+    """Vector3 of a 3-element sequence"""
+    x, y, z = values
+    return cls(x, y, z)
+
+  def __iter__(self):
+    return iter((self.x, self.y, self.z))
+
+  def __len__(self):
+    return 3
+
+  def __getitem__(self, index):
+    return (self.x, self.y, self.z)[index]
+
+  def __eq__(self, other):
+    return tuple(self) == tuple(other)
+
+  def __repr__(self):
+    return "Vector3(%r, %r, %r)" % (self.x, self.y, self.z)
+
+  def __add__(self, other):
+    ox, oy, oz = other
+    return _vector3(self.x + ox, self.y + oy, self.z + oz)
+
+  __radd__ = __add__
+
+  def __sub__(self, other):
+    ox, oy, oz = other
+    return _vector3(self.x - ox, self.y - oy, self.z - oz)
+
+  def __rsub__(self, other):
+    ox, oy, oz = other
+    return _vector3(ox - self.x, oy - self.y, oz - self.z)
+
+  def __mul__(self, factor):
+    return _vector3(self.x * factor, self.y * factor, self.z * factor)
+
+  __rmul__ = __mul__
+
+  def __truediv__(self, divisor):
+    return _vector3(self.x / divisor, self.y / divisor, self.z / divisor)
+
+  def __neg__(self):
+    return _vector3(-self.x, -self.y, -self.z)
+
+  def dot(self, other):
+    ox, oy, oz = other
+    return self.x * ox + self.y * oy + self.z * oz
+
+  def cross(self, other):
+    x, y, z = self.x, self.y, self.z
+    ox, oy, oz = other
+    return _vector3(y * oz - z * oy, z * ox - x * oz, x * oy - y * ox)
+
+  def norm(self):
+    return math.sqrt(self.x * self.x + self.y * self.y + self.z * self.z)
+
+  def normalized(self):
+    """Unit vector of the same direction (null vectors stay null)"""
+    n = self.norm()
+    if n == 0:
+      return Vector3()
+    return _vector3(self.x / n, self.y / n, self.z / n)
+
+  def angle(self, other):
+    """Angle with another vector, in degrees (0 if either is null)"""
+    ox, oy, oz = other
+    norms = math.sqrt((self.x * self.x + self.y * self.y + self.z * self.z) *
+                      (ox * ox + oy * oy + oz * oz))
+    if norms == 0:
+      return 0.
+    cosine = (self.x * ox + self.y * oy + self.z * oz) / norms
+    return math.degrees(math.acos(max(-1., min(1., cosine))))
+
+  def to_frame(self, axes):
+    """Components along the axes of a frame
+
+      axes are three Vector3, the unit axes of the frame, expressed
+      in the frame of this vector
+    """
+    x, y, z = self.x, self.y, self.z
+    a, b, c = axes
+    return _vector3(x * a.x + y * a.y + z * a.z,
+                    x * b.x + y * b.y + z * b.z,
+                    x * c.x + y * c.y + z * c.z)
+
+  @classmethod
+  def from_frame(cls, components, axes):
+    """Vector given by its components along the axes of a frame (Vector3)"""
+    x, y, z = components
+    a, b, c = axes
+    return _vector3(x * a.x + y * b.x + z * c.x,
+                    x * a.y + y * b.y + z * c.y,
+                    x * a.z + y * b.z + z * c.z)
+
+
+_new = object.__new__
+
+
+def _vector3(x, y, z):
+  # Vector3(x, y, z), without the cost of calling __init__
+  vector = _new(Vector3)
+  vector.x = x
+  vector.y = y
+  vector.z = z
+  return vector
+
+
+class Quaternion:
+  """Rotation quaternion, in kRPC (x, y, z, w) order"""
+
+  __slots__ = ('x', 'y', 'z', 'w')
+
+  def __init__(self, x=0., y=0., z=0., w=1.):
+    self.x = x
+    self.y = y
+    self.z = z
+    self.w = w
+
+  @classmethod
+  def of(cls, values):
+    x, y, z, w = values
+    return cls(x, y, z, w)
+
+  @classmethod
+  def from_axis_angle(cls, axis, degrees):
+    """Rotation of degrees around axis (right hand rule)"""
+    half = math.radians(degrees) / 2
+    x, y, z = Vector3.of(axis).normalized() * math.sin(half)
+    return cls(x, y, z, math.cos(half))
+
+  def __iter__(self):
+    yield self.x
+    yield self.y
+    yield self.z
+    yield self.w
+
+  def __repr__(self):
+    return "Quaternion(%r, %r, %r, %r)" % (self.x, self.y, self.z, self.w)
+
+  def __mul__(self, other):
+    """Composition: rotating by self * other rotates by other, then self"""
+    x1, y1, z1, w1 = self
+    x2, y2, z2, w2 = other
+    return Quaternion(w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                      w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                      w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2,
+                      w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2)
+
+  def conjugate(self):
+    """Inverse rotation (of a unit quaternion)"""
+    return Quaternion(-self.x, -self.y, -self.z, self.w)
+
+  def rotate(self, vector):
+    """Rotates a vector"""
+    x, y, z, w = self.x, self.y, self.z, self.w
+    vx, vy, vz = vector
+    # v + 2w (q x v) + 2 q x (q x v)
+    tx = 2 * (y * vz - z * vy)
+    ty = 2 * (z * vx - x * vz)
+    tz = 2 * (x * vy - y * vx)
+    return _vector3(vx + w * tx + y * tz - z * ty,
+                    vy + w * ty + z * tx - x * tz,
+                    vz + w * tz + x * ty - y * tx)
+
+
+###################################
+
+# Batch operations
+#
+# Functions of NumPy arrays of vectors, of shape (..., 3), or of
+# quaternions, of shape (..., 4) in (x, y, z, w) order, broadcasting
+# their arguments.
+
+
+def dot(a, b):
+  return np.einsum('...i,...i->...', np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+
+
+def cross(a, b):
+  return np.cross(a, b)
+
+
+def norm(a):
+  return np.sqrt(dot(a, a))
+
+
+def normalize(a):
+  """Unit vectors of the same directions (null vectors stay null)"""
+  a = np.asarray(a, dtype=float)
+  n = norm(a)[..., np.newaxis]
+  return np.divide(a, n, out=np.zeros_like(a), where=n > 0)
+
+
+def angle(a, b):
+  """Angles between vectors, in degrees (0 if either is null)"""
+  norms = norm(a) * norm(b)
+  cosines = np.divide(dot(a, b), norms, out=np.ones_like(norms), where=norms > 0)
+  return np.degrees(np.arccos(np.clip(cosines, -1., 1.)))
+
+
+def rotate(quaternions, vectors):
+  """Rotates vectors by unit quaternions"""
+  quaternions = np.asarray(quaternions, dtype=float)
+  q = quaternions[..., :3]
+  w = quaternions[..., 3:]
+  t = 2 * np.cross(q, vectors)
+  return vectors + w * t + np.cross(q, t)
+
+
+def to_frame(vectors, axes):
+  """Components of vectors along the axes of a frame
+
+    axes is a (3, 3) array whose rows are the unit axes of the frame,
+    expressed in the frame of the vectors
+  """
+  return np.asarray(vectors, dtype=float) @ np.asarray(axes, dtype=float).T
+
+
+def from_frame(vectors, axes):
+  """Vectors given by their components along the axes of a frame"""
+  return np.asarray(vectors, dtype=float) @ np.asarray(axes, dtype=float)
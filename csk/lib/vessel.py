@@ -0,0 +1,182 @@
+"""Vessel handles module
+
+  Each access to a remote object attribute such as vessel.control,
+  vessel.flight() or vessel.orbital_reference_frame is a remote
+  procedure call returning a new handle. A VesselContext resolves the
+  handles of a vessel once, and keeps them until they are stale, when
+  the active vessel changes. Staging only updates what it changes:
+  the parts index drops the parts left behind, and the performance
+  model the stages burnt.
+"""
+
+from .streams import StreamPool
+from .parts import PartsIndex
+from .performance import PerformanceModel
+
+
+class VesselContext:
+  """Remote object handles of a vessel, resolved on first use
+
+    Without a vessel, the context follows the active vessel. check()
+    should be called once per tick: it drops the cached handles if
+    the active vessel changed, at the cost of two stream reads
+    otherwise. Streams are opened through streams, a StreamRegistry
+    or StreamPool (a private pool if not given): the active vessel in
+    the hud class, the current stage in the guidance one.
+  """
+
+  def __init__(self, conn, vessel=None, streams=None):
+    self.conn = conn
+    self.space_center = conn.space_center
+    self.owns_streams = streams is None
+    self.streams = StreamPool(conn) if streams is None else streams
+    self.follow_active = vessel is None
+    self._vessel = vessel
+    self.handles = {}
+    self.generation = 0
+    self.stage = None
+    self.active_stream = None
+    self.stage_stream = None
+
+  def resolve(self, name, func):
+    """Returns a cached handle, resolving it with func on first use"""
+    handle = self.handles.get(name)
+    if handle is None:
+      handle = func()
+      self.handles[name] = handle
+    return handle
+
+  @property
+  def vessel(self):
+    if self._vessel is None:
+      self._vessel = self.space_center.active_vessel
+    return self._vessel
+
+  @property
+  def control(self):
+    return self.resolve('control', lambda: self.vessel.control)
+
+  @property
+  def auto_pilot(self):
+    return self.resolve('auto_pilot', lambda: self.vessel.auto_pilot)
+
+  @property
+  def parts(self):
+    return self.resolve('parts', lambda: self.vessel.parts)
+
+  @property
+  def parts_index(self):
+    """Local index of the parts (see parts.PartsIndex)"""
+    return self.resolve('parts_index', lambda: PartsIndex(self.conn, self.parts,
+                                                          self.control, self.streams))
+
+  @property
+  def performance(self):
+    """Per-stage thrust and masses (see performance.PerformanceModel)"""
+    return self.resolve('performance',
+                        lambda: PerformanceModel(self.parts_index, self.current_stage))
+
+  @property
+  def orbit(self):
+    return self.resolve('orbit', lambda: self.vessel.orbit)
+
+  @property
+  def body(self):
+    return self.resolve('body', lambda: self.orbit.body)
+
+  @property
+  def body_frame(self):
+    return self.resolve('body_frame', lambda: self.body.reference_frame)
+
+  @property
+  def non_rotating_frame(self):
+    """Body frame not rotating with it, where Kepler orbits are fixed"""
+    return self.resolve('non_rotating_frame', lambda: self.body.non_rotating_reference_frame)
+
+  @property
+  def orbital_frame(self):
+    return self.resolve('orbital_frame', lambda: self.vessel.orbital_reference_frame)
+
+  @property
+  def surface_frame(self):
+    return self.resolve('surface_frame', lambda: self.vessel.surface_reference_frame)
+
+  @property
+  def surface_velocity_frame(self):
+    return self.resolve('surface_velocity_frame',
+                        lambda: self.vessel.surface_velocity_reference_frame)
+
+  @property
+  def flight(self):
+    """Flight telemetry in the vessel surface frame (vessel.flight())"""
+    return self.resolve('flight', lambda: self.vessel.flight())
+
+  @property
+  def surface_flight(self):
+    """Flight telemetry in the body frame, for surface speed"""
+    return self.resolve('surface_flight', lambda: self.vessel.flight(self.body_frame))
+
+  @property
+  def current_stage(self):
+    """Current stage, read from the stream watching it"""
+    if self.stage_stream is None:
+      self.watch()
+    return self.stage_stream()
+
+  def watch(self):
+    if self.follow_active and self.active_stream is None:
+      self.active_stream = self.streams.acquire(self.space_center, 'active_vessel',
+                                                priority='hud')
+    self.stage_stream = self.streams.acquire(self.control, 'current_stage',
+                                             priority='guidance')
+    self.stage = self.stage_stream()
+
+  def check(self):
+    """Drops stale handles, and tells if the vessel changed"""
+    if self.stage_stream is None:
+      self.watch()
+      return False
+
+    if self.follow_active and self.active_stream() != self._vessel:
+      return self.invalidate()
+    stage = self.stage_stream()
+    if stage != self.stage:
+      self.staged(stage)
+    return False
+
+  def staged(self, stage):
+    """Keeps the handles of a vessel that staged, updating its performance"""
+    self.stage = stage
+    performance = self.handles.get('performance')
+    if performance is not None:
+      performance.staged(stage)
+
+  def invalidate(self):
+    """Drops all handles, and tells if the vessel changed"""
+    previous = self._vessel
+    self.drop_handles()
+    if self.follow_active:
+      self._vessel = None
+    self.streams.release(self.stage_stream)
+    self.watch()
+
+    if self.vessel != previous:
+      self.generation += 1
+      return True
+    return False
+
+  def drop_handles(self):
+    index = self.handles.get('parts_index')
+    if index is not None:
+      index.close()
+    self.handles = {}
+
+  def close(self):
+    self.drop_handles()
+    for stream in (self.active_stream, self.stage_stream):
+      if stream is not None:
+        self.streams.release(stream)
+    if self.owns_streams:
+      self.streams.close()
+    self.active_stream = None
+    self.stage_stream = None
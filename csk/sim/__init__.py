@@ -0,0 +1,25 @@
+"""Local kRPC stand-in
+
+  Lets missions run without the game, against a point-mass flight
+  model of a rocket standing on the Kerbal Space Center launch pad:
+
+    conn = csk.sim.connect()
+
+  instead of krpc.connect(). Scripts take a --sim option to do so, in
+  virtual time (time_scale=None), so that flights take seconds.
+"""
+
+from .server import SimServer, SimConnection
+from .vehicles import SIM_ROCKET
+
+
+def connect(vehicle=SIM_ROCKET, time_scale=1.):
+  """Returns a connection to a new simulated universe
+
+    time_scale is the ratio of game time to wall-clock time. With None,
+    game time only advances when conn.clock is slept on (or when
+    conn.server.advance() is called).
+  """
+  server = SimServer(time_scale=time_scale)
+  server.spawn(vehicle)
+  return SimConnection(server)
@@ -0,0 +1,526 @@
+"""Point-mass flight model used by the kRPC stand-in
+
+  Vessels are integrated as point masses in the non-rotating frame of
+  their body (x and y in the equatorial plane, z towards the north
+  pole), under gravity, thrust and drag in an exponential atmosphere
+  rotating with the body. Engines burn propellant from tanks of their
+  own decoupling group, and staging ignites, releases or drops parts.
+
+  Vectors are represented by tuples containing 3 numbers
+"""
+
+import math
+
+G0 = 9.80665
+
+
+###################################
+
+# Vector maths
+
+
+def add(x, y):
+  return (x[0] + y[0], x[1] + y[1], x[2] + y[2])
+
+
+def sub(x, y):
+  return (x[0] - y[0], x[1] - y[1], x[2] - y[2])
+
+
+def scale(x, k):
+  return (x[0] * k, x[1] * k, x[2] * k)
+
+
+def dot(x, y):
+  return x[0] * y[0] + x[1] * y[1] + x[2] * y[2]
+
+
+def cross(x, y):
+  return (x[1] * y[2] - x[2] * y[1],
+          x[2] * y[0] - x[0] * y[2],
+          x[0] * y[1] - x[1] * y[0])
+
+
+def norm(x):
+  return math.sqrt(x[0] * x[0] + x[1] * x[1] + x[2] * x[2])
+
+
+def unit(x):
+  n = norm(x)
+  if n == 0:
+    return (0., 0., 0.)
+  return (x[0] / n, x[1] / n, x[2] / n)
+
+
+def angle(x, y):
+  """Angle, in degrees, between vectors x and y"""
+  c = dot(unit(x), unit(y))
+  return math.degrees(math.acos(max(-1., min(1., c))))
+
+
+def rotate_towards(x, y, max_angle):
+  """Rotates unit vector x towards unit vector y, by at most max_angle degrees"""
+  a = angle(x, y)
+  if a <= max_angle or a == 0:
+    return y
+  # Spherical interpolation, falling back on any orthogonal axis when opposed
+  t = max_angle / a
+  theta = math.radians(a)
+  s = math.sin(theta)
+  if s < 1e-9:
+    ortho = unit(cross(x, (0., 0., 1.)))
+    if norm(ortho) == 0:
+      ortho = unit(cross(x, (1., 0., 0.)))
+    return unit(add(scale(x, math.cos(math.radians(max_angle))),
+                    scale(ortho, math.sin(math.radians(max_angle)))))
+  k0 = math.sin((1 - t) * theta) / s
+  k1 = math.sin(t * theta) / s
+  return unit(add(scale(x, k0), scale(y, k1)))
+
+
+###################################
+
+# Celestial bodies
+
+
+class Body:
+  """Spherical, uniformly rotating body with an exponential atmosphere"""
+
+  def __init__(self, name, radius, mu, rotational_period,
+               atmosphere_depth=0, sea_level_pressure=0, sea_level_density=0,
+               scale_height=1, sphere_of_influence=float('inf'),
+               initial_rotation=0):
+    self.name = name
+    self.radius = radius
+    self.mu = mu
+    self.rotational_period = rotational_period
+    self.rotational_speed = 2 * math.pi / rotational_period
+    self.atmosphere_depth = atmosphere_depth
+    self.sea_level_pressure = sea_level_pressure
+    self.sea_level_density = sea_level_density
+    self.scale_height = scale_height
+    self.sphere_of_influence = sphere_of_influence
+    self.initial_rotation = initial_rotation
+    self.surface_gravity = mu / radius**2
+
+  @property
+  def has_atmosphere(self):
+    return self.atmosphere_depth > 0
+
+  def pressure(self, altitude):
+    """Static pressure, in Pa"""
+    if altitude >= self.atmosphere_depth:
+      return 0.
+    return self.sea_level_pressure * math.exp(-max(altitude, 0) / self.scale_height)
+
+  def density(self, altitude):
+    """Atmosphere density, in kg/m3"""
+    if altitude >= self.atmosphere_depth:
+      return 0.
+    return self.sea_level_density * math.exp(-max(altitude, 0) / self.scale_height)
+
+  def rotation(self, ut):
+    """Rotation angle of the body, in radians, at a given UT"""
+    return self.initial_rotation + self.rotational_speed * ut
+
+  def air_velocity(self, r):
+    """Velocity of the atmosphere at position r"""
+    return (-self.rotational_speed * r[1], self.rotational_speed * r[0], 0.)
+
+  def surface_position(self, latitude, longitude, altitude, ut):
+    """Non-rotating position of a point given in body coordinates"""
+    lat = math.radians(latitude)
+    lon = math.radians(longitude) + self.rotation(ut)
+    d = self.radius + altitude
+    return (d * math.cos(lat) * math.cos(lon),
+            d * math.cos(lat) * math.sin(lon),
+            d * math.sin(lat))
+
+  def coordinates(self, r, ut):
+    """Latitude and longitude, in degrees, of position r"""
+    lat = math.degrees(math.asin(max(-1., min(1., r[2] / norm(r)))))
+    lon = math.atan2(r[1], r[0]) - self.rotation(ut)
+    lon = (math.degrees(lon) + 180) % 360 - 180
+    return lat, lon
+
+
+KERBIN = Body('Kerbin', radius=600000., mu=3.5316e12,
+              rotational_period=21549.425,
+              atmosphere_depth=70000., sea_level_pressure=101325.,
+              sea_level_density=1.225, scale_height=5600.,
+              sphere_of_influence=84159286.)
+
+
+###################################
+
+# Orbits
+
+
+def elements(r, v, mu):
+  """Computes orbital elements of the state vector (r, v)"""
+  rn = norm(r)
+  h = cross(r, v)
+  hn = norm(h)
+  energy = dot(v, v) / 2 - mu / rn
+  e_vec = sub(scale(cross(v, h), 1 / mu), scale(r, 1 / rn))
+  e = norm(e_vec)
+
+  if abs(energy) < 1e-12:
+    energy = -1e-12
+  a = -mu / (2 * energy)
+
+  if e > 1e-9:
+    cos_nu = dot(e_vec, r) / (e * rn)
+    nu = math.acos(max(-1., min(1., cos_nu)))
+    if dot(r, v) < 0:
+      nu = 2 * math.pi - nu
+  else:
+    nu = 0.
+
+  el = {'semi_major_axis': a,
+        'eccentricity': e,
+        'inclination': math.acos(max(-1., min(1., h[2] / hn))) if hn > 0 else 0.,
+        'true_anomaly': nu,
+        'radius': rn,
+        'speed': norm(v)}
+
+  if e < 1:
+    n = math.sqrt(mu / a**3)
+    E = 2 * math.atan2(math.sqrt(1 - e) * math.sin(nu / 2),
+                       math.sqrt(1 + e) * math.cos(nu / 2))
+    M = (E - e * math.sin(E)) % (2 * math.pi)
+    el['apoapsis'] = a * (1 + e)
+    el['periapsis'] = a * (1 - e)
+    el['period'] = 2 * math.pi / n
+    el['mean_anomaly'] = M
+    el['time_to_periapsis'] = ((2 * math.pi - M) % (2 * math.pi)) / n
+    el['time_to_apoapsis'] = ((math.pi - M) % (2 * math.pi)) / n
+  else:
+    el['apoapsis'] = float('inf')
+    el['periapsis'] = a * (1 - e)
+    el['period'] = float('inf')
+    el['mean_anomaly'] = 0.
+    el['time_to_apoapsis'] = float('inf')
+    el['time_to_periapsis'] = float('inf')
+
+  return el
+
+
+def gravity(r, mu):
+  rn = norm(r)
+  return scale(r, -mu / rn**3)
+
+
+def coast(r, v, mu, duration, max_step=1.):
+  """Propagates a state vector under gravity only"""
+  steps = max(1, int(math.ceil(abs(duration) / max_step)))
+  dt = duration / steps
+  for _ in range(steps):
+    r, v = rk4(r, v, dt, lambda r, v: gravity(r, mu))
+  return r, v
+
+
+def rk4(r, v, dt, accel):
+  """One Runge-Kutta 4 step of dr = v, dv = accel(r, v)"""
+  a1 = accel(r, v)
+  r2 = add(r, scale(v, dt / 2))
+  v2 = add(v, scale(a1, dt / 2))
+  a2 = accel(r2, v2)
+  r3 = add(r, scale(v2, dt / 2))
+  v3 = add(v, scale(a2, dt / 2))
+  a3 = accel(r3, v3)
+  r4 = add(r, scale(v3, dt))
+  v4 = add(v, scale(a3, dt))
+  a4 = accel(r4, v4)
+  r = add(r, scale(add(add(v, v4), scale(add(v2, v3), 2)), dt / 6))
+  v = add(v, scale(add(add(a1, a4), scale(add(a2, a3), 2)), dt / 6))
+  return r, v
+
+
+###################################
+
+# Vessels
+
+
+# Module every part of a kind has in KSP, besides those of its spec
+KIND_MODULES = {'command': 'ModuleCommand', 'engine': 'ModuleEngines',
+                'decoupler': 'ModuleDecouple', 'clamp': 'LaunchClamp',
+                'solar_panel': 'ModuleDeployableSolarPanel',
+                'parachute': 'ModuleParachute'}
+
+
+class Part:
+  """Simulated part
+
+    kind is one of 'command', 'engine', 'tank', 'decoupler', 'clamp',
+    'fairing', 'solar_panel', 'parachute', 'antenna' or 'generic'
+  """
+
+  def __init__(self, spec):
+    self.name = spec['name']
+    self.title = spec.get('title', self.name)
+    self.tag = spec.get('tag', '')
+    self.kind = spec.get('kind', 'generic')
+    self.stage = spec.get('stage', -1)
+    self.decouple_stage = spec.get('decouple_stage', -1)
+    self.dry_mass = spec.get('dry_mass', spec.get('mass', 0.))
+    self.fuel = spec.get('fuel', 0.)
+    self.cda = spec.get('cda', 0.)
+    self.modules = [dict(m) for m in spec.get('modules', [])]
+    if self.kind in KIND_MODULES:
+      self.modules.insert(0, {'name': KIND_MODULES[self.kind]})
+
+    # Engines
+    self.max_vacuum_thrust = spec.get('thrust', 0.)
+    self.thrust_limit = spec.get('thrust_limit', 1.)
+    self.vacuum_isp = spec.get('isp_vac', 0.)
+    self.sea_level_isp = spec.get('isp_asl', 0.)
+    self.engine_active = False
+
+    # Fairings and parachutes
+    self.panel_mass = spec.get('panel_mass', 0.)
+    self.jettisoned = False
+    self.deployed = False
+
+  @property
+  def mass(self):
+    return self.dry_mass + self.fuel + (0. if self.jettisoned else self.panel_mass)
+
+  def isp(self, pressure):
+    """Engine specific impulse at a given static pressure"""
+    ratio = min(pressure / KERBIN.sea_level_pressure, 1.)
+    return self.vacuum_isp + (self.sea_level_isp - self.vacuum_isp) * ratio
+
+  def max_mass_flow(self):
+    if self.vacuum_isp == 0:
+      return 0.
+    return self.max_vacuum_thrust / (self.vacuum_isp * G0)
+
+  def mass_flow(self):
+    """Engine mass flow at full throttle, with its thrust limiter"""
+    return self.max_mass_flow() * self.thrust_limit
+
+
+class VesselModel:
+  """State and dynamics of a simulated vessel"""
+
+  def __init__(self, name, parts, body, r, v, current_stage=None, clamped=False,
+               slew_rate=15.):
+    self.name = name
+    self.parts = parts
+    self.body = body
+    self.r = r
+    self.v = v
+    self.attitude = unit(r)
+    self.throttle = 0.
+    self.sas = False
+    self.rcs = False
+    self.clamped = clamped
+    self.landed = clamped
+    self.launched = not clamped
+    self.start_altitude = self.altitude
+    self.slew_rate = slew_rate
+    self.autopilot_target = None
+    self.applied_delta_v = (0., 0., 0.)
+    if current_stage is None:
+      current_stage = max([p.stage for p in parts] + [0]) + 1
+    self.current_stage = current_stage
+    self.debris = False
+    self.met = 0.
+
+  # Mass and propulsion
+
+  @property
+  def mass(self):
+    return sum(p.mass for p in self.parts)
+
+  @property
+  def dry_mass(self):
+    return sum(p.mass - p.fuel for p in self.parts)
+
+  def fuel(self, group):
+    return sum(p.fuel for p in self.parts if p.kind == 'tank' and p.decouple_stage == group)
+
+  def burning_engines(self):
+    """Engines that are active and have propellant"""
+    return [p for p in self.parts
+            if p.kind == 'engine' and p.engine_active and self.fuel(p.decouple_stage) > 0]
+
+  def pressure(self):
+    return self.body.pressure(self.altitude)
+
+  def available_thrust(self, pressure=None):
+    if pressure is None:
+      pressure = self.pressure()
+    return sum(e.mass_flow() * e.isp(pressure) * G0 for e in self.burning_engines())
+
+  def max_thrust(self, pressure=None):
+    """Thrust of burning engines at full throttle, ignoring thrust limiters"""
+    if pressure is None:
+      pressure = self.pressure()
+    return sum(e.max_mass_flow() * e.isp(pressure) * G0 for e in self.burning_engines())
+
+  def specific_impulse(self, pressure=None):
+    """Combined specific impulse of burning engines"""
+    if pressure is None:
+      pressure = self.pressure()
+    engines = self.burning_engines()
+    flow = sum(e.mass_flow() for e in engines)
+    if flow == 0:
+      return 0.
+    return sum(e.mass_flow() * e.isp(pressure) for e in engines) / flow
+
+  @property
+  def cda(self):
+    drag = max([p.cda for p in self.parts if p.kind != 'parachute'] + [0.])
+    chutes = sum(p.cda for p in self.parts if p.kind == 'parachute' and p.deployed)
+    return drag + chutes
+
+  # State
+
+  @property
+  def altitude(self):
+    return norm(self.r) - self.body.radius
+
+  def surface_velocity(self):
+    return sub(self.v, self.body.air_velocity(self.r))
+
+  def situation(self):
+    if not self.launched:
+      return 'pre_launch'
+    if self.landed:
+      return 'landed'
+    if self.altitude < self.body.atmosphere_depth:
+      return 'flying'
+    el = elements(self.r, self.v, self.body.mu)
+    if el['eccentricity'] >= 1:
+      return 'escaping'
+    if el['periapsis'] - self.body.radius > self.body.atmosphere_depth:
+      return 'orbiting'
+    return 'sub_orbital'
+
+  # Staging
+
+  def activate_next_stage(self):
+    """Activates the next stage, and returns the parts decoupled by it"""
+    if self.current_stage <= 0:
+      return []
+    self.current_stage -= 1
+    stage = self.current_stage
+
+    dropped = [p for p in self.parts
+               if p.decouple_stage == stage and p.kind in ('decoupler', 'clamp')]
+    if any(p.kind == 'clamp' for p in dropped):
+      self.clamped = False
+    if any(p.kind == 'decoupler' for p in dropped):
+      dropped = [p for p in self.parts if p.decouple_stage == stage]
+    self.parts = [p for p in self.parts if p not in dropped]
+
+    for p in self.parts:
+      if p.stage == stage:
+        if p.kind == 'engine':
+          p.engine_active = True
+        elif p.kind == 'parachute':
+          p.deployed = True
+
+    return [p for p in dropped if p.kind != 'clamp']
+
+  # Dynamics
+
+  def step(self, ut, dt, loaded=True):
+    """Advances the vessel state from ut to ut + dt
+
+      Vessels that are not loaded (out of physics range of the active
+      vessel) are on rails: they neither turn nor thrust.
+    """
+    body = self.body
+    self.met += dt
+
+    if loaded and self.autopilot_target is not None:
+      target = self.autopilot_target(self)
+      if target is not None:
+        self.attitude = rotate_towards(self.attitude, unit(target), self.slew_rate * dt)
+
+    pressure = self.pressure()
+    engines = self.burning_engines()
+    throttle = self.throttle
+    thrust = 0.
+    if loaded and throttle > 0:
+      for e in engines:
+        flow = e.mass_flow() * throttle
+        thrust += flow * e.isp(pressure) * G0
+        self.burn(e.decouple_stage, flow * dt)
+
+    mass = self.mass
+    thrust_accel = scale(self.attitude, thrust / mass) if mass > 0 else (0., 0., 0.)
+    self.applied_delta_v = add(self.applied_delta_v, scale(thrust_accel, dt))
+
+    if self.clamped:
+      lat, lon = body.coordinates(self.r, ut)
+      self.r = body.surface_position(lat, lon, self.altitude, ut + dt)
+      self.v = body.air_velocity(self.r)
+      return
+
+    cda = self.cda
+
+    def accel(r, v):
+      a = add(gravity(r, body.mu), thrust_accel)
+      altitude = norm(r) - body.radius
+      rho = body.density(altitude)
+      if rho > 0 and cda > 0:
+        air = sub(v, body.air_velocity(r))
+        speed = norm(air)
+        a = add(a, scale(air, -0.5 * rho * speed * cda / mass))
+      return a
+
+    self.r, self.v = rk4(self.r, self.v, dt, accel)
+
+    if self.altitude <= 0:
+      self.r = scale(unit(self.r), body.radius)
+      self.v = body.air_velocity(self.r)
+      if self.launched:
+        self.landed = True
+    elif self.altitude > self.start_altitude + 10:
+      self.launched = True
+      self.landed = False
+
+  def burn(self, group, amount):
+    tanks = [p for p in self.parts if p.kind == 'tank' and p.decouple_stage == group and p.fuel > 0]
+    for tank in tanks:
+      used = min(tank.fuel, amount)
+      tank.fuel -= used
+      amount -= used
+      if amount <= 0:
+        return
+
+
+def ascent_stages(vehicle):
+  """Burn stages of a vehicle, for the batch ascent simulator
+
+    Activates the stages of a new model of the vehicle one by one, as
+    auto staging does from the launch pad, and returns one AscentStage
+    (see csk.lib.ascent) per set of burning engines, each burning the
+    propellant of its decoupling groups to the end.
+  """
+  from ..lib.ascent import AscentStage
+
+  parts = [Part(spec) for spec in vehicle['parts']]
+  model = VesselModel(vehicle['name'], parts, KERBIN, (KERBIN.radius, 0., 0.), (0., 0., 0.))
+  stages = []
+  while model.current_stage > 0:
+    model.activate_next_stage()
+    engines = model.burning_engines()
+    if len(engines) == 0:
+      continue
+    flow = sum(e.mass_flow() for e in engines)
+    wet_mass = model.mass
+    groups = set(e.decouple_stage for e in engines)
+    for p in model.parts:
+      if p.kind == 'tank' and p.decouple_stage in groups:
+        p.fuel = 0.
+    stages.append(AscentStage(
+        wet_mass, model.mass, flow,
+        sum(e.mass_flow() * e.vacuum_isp for e in engines) / flow,
+        sum(e.mass_flow() * e.sea_level_isp for e in engines) / flow,
+        model.cda))
+  return stages
@@ -0,0 +1,1586 @@
+"""kRPC stand-in
+
+  Serves the subset of the kRPC API used by the project on top of the
+  flight model of csk.sim.physics, so that missions can be flown
+  without a running game.
+
+  Property reads and method calls of the stand-in objects go through
+  SimConnection._invoke, the way remote calls go through the invoke
+  method of a kRPC client, so they can be counted the same way. Stream
+  reads are served locally and are not counted.
+"""
+
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+from . import physics
+from .physics import add, sub, scale, dot, cross, norm, unit, angle
+from ..lib.clock import VirtualClock
+from ..lib import bodies
+from .vehicles import SIM_ROCKET, KSC_LATITUDE, KSC_LONGITUDE, KSC_ALTITUDE
+
+# Time warp rates of KSP, indexed by rails warp factor
+WARP_RATES = [1, 5, 10, 50, 100, 1000, 10000, 100000]
+
+
+def remote(fget, fset=None):
+  """Turns accessors into a property served through a simulated call"""
+  def getter(self):
+    return self._conn._call(fget, self)
+
+  setter = None
+  if fset is not None:
+    def setter(self, value):
+      self._conn._call(fset, self, value)
+
+  return property(getter, setter, doc=fget.__doc__)
+
+
+def rpc(fn):
+  """Turns a method into a simulated remote call"""
+  @functools.wraps(fn)
+  def call(self, *args, **kwargs):
+    return self._conn._call(fn, self, *args, **kwargs)
+  return call
+
+
+###################################
+
+# Server
+
+
+class SimServer:
+  """Simulated universe: one body, its vessels and the game clock
+
+    With a time_scale, game time follows wall-clock time multiplied by
+    time_scale (and by the time warp rate), and catches up whenever
+    the stand-in is called. Without one, game time only moves when
+    advance() or warp_to() is called.
+  """
+
+  atmosphere_step = 0.02
+  coast_step = 1.
+
+  def __init__(self, body=physics.KERBIN, time_scale=1.):
+    self.body = body
+    self.ut = 0.
+    self.vessels = []
+    self.active_vessel = None
+    self.time_scale = time_scale
+    self.rails_warp_factor = 0
+    self.streams = []
+    self.wall = None
+    self.lock = threading.RLock()
+
+  def spawn(self, vehicle=SIM_ROCKET, latitude=KSC_LATITUDE,
+            longitude=KSC_LONGITUDE, altitude=KSC_ALTITUDE):
+    """Puts a new vehicle on the surface, and makes it the active vessel"""
+    parts = [physics.Part(spec) for spec in vehicle['parts']]
+    r = self.body.surface_position(latitude, longitude, altitude, self.ut)
+    clamped = any(p.kind == 'clamp' for p in parts)
+    model = physics.VesselModel(vehicle['name'], parts, self.body, r,
+                                self.body.air_velocity(r), clamped=clamped)
+    self.vessels.append(model)
+    if self.active_vessel is None:
+      self.active_vessel = model
+    return model
+
+  def spawn_orbit(self, vehicle, altitude, phase=0., name=None):
+    """Puts a new vehicle on a circular equatorial orbit
+
+      phase is the angle, in degrees, of its position from the
+      x axis of the non-rotating body frame
+    """
+    parts = [physics.Part(spec) for spec in vehicle['parts']]
+    radius = self.body.radius + altitude
+    angle = physics.math.radians(phase)
+    speed = physics.math.sqrt(self.body.mu / radius)
+    r = (radius * physics.math.cos(angle), radius * physics.math.sin(angle), 0.)
+    v = (-speed * physics.math.sin(angle), speed * physics.math.cos(angle), 0.)
+    model = physics.VesselModel(name or vehicle['name'], parts, self.body, r, v)
+    model.attitude = physics.unit(v)
+    # Stage until its engines are ignited, as after a launch
+    while model.current_stage > 0 and not any(p.engine_active for p in parts):
+      model.activate_next_stage()
+    self.vessels.append(model)
+    if self.active_vessel is None:
+      self.active_vessel = model
+    return model
+
+  def sync(self):
+    """Catches game time up with wall-clock time"""
+    if self.time_scale is None:
+      return
+    now = time.monotonic()
+    if self.wall is not None:
+      self.advance((now - self.wall) * self.time_scale * self.warp_rate())
+    self.wall = now
+
+  def warp_rate(self):
+    v = self.active_vessel
+    if v is not None and v.throttle > 0 and v.available_thrust() > 0:
+      return 1
+    return WARP_RATES[self.rails_warp_factor]
+
+  def live_vessels(self):
+    return [v for v in self.vessels if not v.debris]
+
+  def step_size(self):
+    """Integration step: short while the active vessel flies or thrusts"""
+    v = self.active_vessel
+    if v is not None and (v.clamped or v.altitude < self.body.atmosphere_depth or
+                          (v.throttle > 0 and v.burning_engines())):
+      return self.atmosphere_step
+    return self.coast_step
+
+  def advance(self, duration):
+    """Advances game time by duration seconds"""
+    with self.lock:
+      end = self.ut + duration
+      while self.ut < end - 1e-9:
+        dt = min(self.step_size(), end - self.ut)
+        for v in self.live_vessels():
+          v.step(self.ut, dt, v is self.active_vessel)
+        self.ut += dt
+        self.push_streams()
+
+  def warp_to(self, ut):
+    if ut > self.ut:
+      self.advance(ut - self.ut)
+    if self.time_scale is not None:
+      self.wall = time.monotonic()
+
+  def wait(self, timeout=None):
+    """Lets game time pass while a caller waits for an update"""
+    if self.time_scale is None:
+      return
+    time.sleep(min(timeout or 0.01, 0.01))
+    self.sync()
+
+  def push_streams(self):
+    for stream in self.streams:
+      if stream.started and stream.watched():
+        stream.push()
+
+
+###################################
+
+# Connection
+
+
+class SimConnection:
+  """Stand-in for a kRPC client connection
+
+    When game time only advances on demand, the connection carries a
+    virtual clock (conn.clock) whose sleeps advance it, so that loops
+    waiting on that clock run as fast as the flight model allows.
+  """
+
+  def __init__(self, server):
+    self.server = server
+    self._streaming = 0
+    self.clock = None
+    if server.time_scale is None:
+      self.clock = VirtualClock(server.ut, server.advance, lambda: server.ut)
+    self.space_center = SpaceCenter(self)
+    self.ui = UI(self)
+    self.krpc = KRPC(self)
+    self.remote_tech = RemoteTech(self)
+    # The stand-in bodies are defined in code: keep their constants in memory
+    bodies.for_connection(self, save='sim', path=None)
+
+  def _invoke(self, fn, *args, **kwargs):
+    """Executes a simulated remote call"""
+    self.server.sync()
+    return fn(*args, **kwargs)
+
+  def _call(self, fn, *args, **kwargs):
+    if self._streaming:
+      return fn(*args, **kwargs)
+    return self._invoke(fn, *args, **kwargs)
+
+  @contextmanager
+  def _stream_call(self):
+    self._streaming += 1
+    try:
+      yield
+    finally:
+      self._streaming -= 1
+
+  def add_stream(self, func, *args, **kwargs):
+    if func is setattr:
+      raise ValueError("Cannot stream a property setter")
+    return Stream(self, func, args, kwargs)
+
+  @staticmethod
+  def get_call(func, *args, **kwargs):
+    if func is setattr:
+      raise ValueError("Cannot create a call for a property setter")
+    return lambda: func(*args, **kwargs)
+
+  @contextmanager
+  def stream(self, func, *args, **kwargs):
+    stream = self.add_stream(func, *args, **kwargs)
+    try:
+      yield stream
+    finally:
+      stream.remove()
+
+  def close(self):
+    for stream in list(self.server.streams):
+      stream.remove()
+
+
+class Stream:
+  """Stand-in for a kRPC stream
+
+    The value is computed when read, at most once per 1 / rate seconds
+    of game time. Streams with callbacks or waiters are also refreshed
+    each time game time advances.
+  """
+
+  def __init__(self, conn, func, args, kwargs):
+    self._conn = conn
+    self._func = func
+    self._args = args
+    self._kwargs = kwargs
+    self._rate = 0.
+    self._value = None
+    self._updated = None
+    self._callbacks = []
+    self._waiters = 0
+    self.started = False
+    self.updates = 0
+    self.condition = threading.Condition()
+    conn.server.streams.append(self)
+
+  def start(self, wait=True):
+    if not self.started:
+      self.started = True
+      self._refresh()
+
+  @property
+  def rate(self):
+    return self._rate
+
+  @rate.setter
+  def rate(self, value):
+    self._rate = value
+
+  def __call__(self):
+    if not self.started:
+      self.start()
+    server = self._conn.server
+    server.sync()
+    if (self._rate == 0 or self._updated is None or
+        server.ut - self._updated >= 1. / self._rate):
+      self._refresh()
+    if isinstance(self._value, Exception):
+      raise self._value
+    return self._value
+
+  def _refresh(self):
+    with self._conn._stream_call():
+      try:
+        value = self._func(*self._args, **self._kwargs)
+      except Exception as e:
+        value = e
+    changed = value != self._value
+    self._value = value
+    self._updated = self._conn.server.ut
+    self.updates += 1
+    return changed
+
+  def watched(self):
+    return len(self._callbacks) > 0 or self._waiters > 0
+
+  def push(self):
+    if self._rate > 0 and self._updated is not None:
+      if self._conn.server.ut - self._updated < 1. / self._rate:
+        return
+    if self._refresh():
+      with self.condition:
+        self.condition.notify_all()
+      for callback in list(self._callbacks):
+        callback(self._value)
+
+  def wait(self, timeout=None):
+    if not self.started:
+      self.start()
+    self._waiters += 1
+    try:
+      self._conn.server.wait(timeout)
+    finally:
+      self._waiters -= 1
+
+  def add_callback(self, callback):
+    self._callbacks.append(callback)
+
+  def remove_callback(self, callback):
+    if callback in self._callbacks:
+      self._callbacks.remove(callback)
+
+  def remove(self):
+    if self in self._conn.server.streams:
+      self._conn.server.streams.remove(self)
+    self.started = False
+
+
+###################################
+
+# Remote objects
+
+
+class Proxy:
+  """Base of stand-in remote objects
+
+    Two proxies of the same object compare equal, as kRPC remote
+    objects do, so they can be used as dictionary keys
+  """
+
+  def __init__(self, conn, target):
+    self._conn = conn
+    self._target = target
+
+  def _key(self):
+    return (type(self), id(self._target))
+
+  def __eq__(self, other):
+    return isinstance(other, Proxy) and self._key() == other._key()
+
+  def __hash__(self):
+    return hash(self._key())
+
+
+class Enum:
+  """Stand-in for kRPC enumeration values"""
+
+  def __init__(self, name):
+    self.name = name
+
+  def __eq__(self, other):
+    return isinstance(other, Enum) and other.name == self.name
+
+  def __hash__(self):
+    return hash(self.name)
+
+  def __repr__(self):
+    return '<%s>' % self.name
+
+
+class ReferenceFrame(Proxy):
+  """Reference frame, defined by a function returning its axes"""
+
+  def __init__(self, conn, target, kind):
+    Proxy.__init__(self, conn, target)
+    self.kind = kind
+
+  def _key(self):
+    return (type(self), id(self._target), self.kind)
+
+  def axes(self):
+    """Unit vectors of the frame axes, in the non-rotating body frame"""
+    server = self._conn.server
+    body = server.body
+    kind = self.kind
+    t = self._target
+
+    if kind == 'body':
+      theta = body.rotation(server.ut)
+      x = (physics.math.cos(theta), physics.math.sin(theta), 0.)
+      y = (0., 0., 1.)
+      return x, y, cross(x, y)
+
+    if kind == 'body_non_rotating':
+      return (1., 0., 0.), (0., 0., 1.), (0., -1., 0.)
+
+    if kind == 'node':
+      return orthonormal(t.burn, scale(t.vessel.r, -1.))
+
+    if kind == 'surface':
+      up = unit(t.r)
+      east = unit(cross((0., 0., 1.), up))
+      if norm(east) == 0:
+        east = (0., 1., 0.)
+      north = cross(up, east)
+      return up, north, east
+
+    if kind == 'orbital':
+      return orthonormal(t.v, scale(t.r, -1.))
+
+    if kind == 'surface_velocity':
+      air = t.surface_velocity()
+      if norm(air) < 1e-6:
+        air = t.r
+      return orthonormal(air, t.r)
+
+    # vessel
+    return orthonormal(t.attitude, t.r)
+
+  def rotating(self):
+    return self.kind in ('body', 'surface')
+
+  def to_frame(self, vector):
+    x, y, z = self.axes()
+    return (dot(vector, x), dot(vector, y), dot(vector, z))
+
+  def from_frame(self, vector):
+    x, y, z = self.axes()
+    return add(add(scale(x, vector[0]), scale(y, vector[1])), scale(z, vector[2]))
+
+
+def orthonormal(y, x_hint):
+  """Axes with y along a direction, and x as close as possible to x_hint"""
+  y = unit(y)
+  x = sub(x_hint, scale(y, dot(x_hint, y)))
+  if norm(x) < 1e-9:
+    x = cross(y, (0., 0., 1.)) if abs(y[2]) < 0.9 else cross(y, (1., 0., 0.))
+  x = unit(x)
+  return x, y, cross(x, y)
+
+
+class SpaceCenter(Proxy):
+
+  def __init__(self, conn):
+    Proxy.__init__(self, conn, conn.server)
+
+  def _ut(self):
+    """Current universal time, in seconds"""
+    return self._target.ut
+
+  ut = remote(_ut)
+
+  def _get_active_vessel(self):
+    return Vessel(self._conn, self._target.active_vessel)
+
+  def _set_active_vessel(self, vessel):
+    self._target.active_vessel = vessel._target
+
+  active_vessel = remote(_get_active_vessel, _set_active_vessel)
+
+  def _vessels(self):
+    return [Vessel(self._conn, v) for v in self._target.vessels]
+
+  vessels = remote(_vessels)
+
+  def _bodies(self):
+    return {self._target.body.name: CelestialBody(self._conn, self._target.body)}
+
+  bodies = remote(_bodies)
+
+  def _get_rails_warp_factor(self):
+    return self._target.rails_warp_factor
+
+  def _set_rails_warp_factor(self, factor):
+    self._target.sync()
+    self._target.rails_warp_factor = max(0, min(len(WARP_RATES) - 1, int(factor)))
+
+  rails_warp_factor = remote(_get_rails_warp_factor, _set_rails_warp_factor)
+
+  def _physics_warp_factor(self):
+    return 0
+
+  physics_warp_factor = remote(_physics_warp_factor)
+
+  @rpc
+  def warp_to(self, ut, max_rails_rate=100000., max_physics_rate=2.):
+    self._target.warp_to(ut)
+
+  @rpc
+  def launch_vessel(self, craft_directory=None, name=None, launch_site=None,
+                    vehicle=SIM_ROCKET):
+    self._target.active_vessel = self._target.spawn(vehicle)
+
+
+class CelestialBody(Proxy):
+
+  def _name(self):
+    return self._target.name
+
+  name = remote(_name)
+
+  def _gravitational_parameter(self):
+    return self._target.mu
+
+  gravitational_parameter = remote(_gravitational_parameter)
+
+  def _surface_gravity(self):
+    return self._target.surface_gravity
+
+  surface_gravity = remote(_surface_gravity)
+
+  def _equatorial_radius(self):
+    return self._target.radius
+
+  equatorial_radius = remote(_equatorial_radius)
+
+  def _mass(self):
+    return self._target.mu / 6.67408e-11
+
+  mass = remote(_mass)
+
+  def _atmosphere_depth(self):
+    return self._target.atmosphere_depth
+
+  atmosphere_depth = remote(_atmosphere_depth)
+
+  def _has_atmosphere(self):
+    return self._target.has_atmosphere
+
+  has_atmosphere = remote(_has_atmosphere)
+
+  def _rotational_period(self):
+    return self._target.rotational_period
+
+  rotational_period = remote(_rotational_period)
+
+  def _rotational_speed(self):
+    return self._target.rotational_speed
+
+  rotational_speed = remote(_rotational_speed)
+
+  def _sphere_of_influence(self):
+    return self._target.sphere_of_influence
+
+  sphere_of_influence = remote(_sphere_of_influence)
+
+  def _reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'body')
+
+  reference_frame = remote(_reference_frame)
+
+  def _non_rotating_reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'body_non_rotating')
+
+  non_rotating_reference_frame = remote(_non_rotating_reference_frame)
+
+  @rpc
+  def pressure_at(self, altitude):
+    return self._target.pressure(altitude)
+
+  @rpc
+  def density_at(self, altitude, position=None):
+    return self._target.density(altitude)
+
+
+class Vessel(Proxy):
+
+  def _name(self):
+    return self._target.name
+
+  name = remote(_name)
+
+  def _situation(self):
+    return Enum(self._target.situation())
+
+  situation = remote(_situation)
+
+  def _met(self):
+    return self._target.met
+
+  met = remote(_met)
+
+  def _mass(self):
+    return self._target.mass
+
+  mass = remote(_mass)
+
+  def _dry_mass(self):
+    return self._target.dry_mass
+
+  dry_mass = remote(_dry_mass)
+
+  def _thrust(self):
+    return self._target.available_thrust() * self._target.throttle
+
+  thrust = remote(_thrust)
+
+  def _available_thrust(self):
+    return self._target.available_thrust()
+
+  available_thrust = remote(_available_thrust)
+
+  def _max_thrust(self):
+    return self._target.max_thrust()
+
+  max_thrust = remote(_max_thrust)
+
+  def _max_vacuum_thrust(self):
+    return self._target.max_thrust(0.)
+
+  max_vacuum_thrust = remote(_max_vacuum_thrust)
+
+  def _specific_impulse(self):
+    return self._target.specific_impulse()
+
+  specific_impulse = remote(_specific_impulse)
+
+  def _vacuum_specific_impulse(self):
+    return self._target.specific_impulse(0.)
+
+  vacuum_specific_impulse = remote(_vacuum_specific_impulse)
+
+  def _kerbin_sea_level_specific_impulse(self):
+    return self._target.specific_impulse(physics.KERBIN.sea_level_pressure)
+
+  kerbin_sea_level_specific_impulse = remote(_kerbin_sea_level_specific_impulse)
+
+  def _orbit(self):
+    return Orbit(self._conn, self._target)
+
+  orbit = remote(_orbit)
+
+  def _control(self):
+    return Control(self._conn, self._target)
+
+  control = remote(_control)
+
+  def _auto_pilot(self):
+    return AutoPilot(self._conn, self._target)
+
+  auto_pilot = remote(_auto_pilot)
+
+  def _parts(self):
+    return Parts(self._conn, self._target)
+
+  parts = remote(_parts)
+
+  def _reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'vessel')
+
+  reference_frame = remote(_reference_frame)
+
+  def _orbital_reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'orbital')
+
+  orbital_reference_frame = remote(_orbital_reference_frame)
+
+  def _surface_reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'surface')
+
+  surface_reference_frame = remote(_surface_reference_frame)
+
+  def _surface_velocity_reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'surface_velocity')
+
+  surface_velocity_reference_frame = remote(_surface_velocity_reference_frame)
+
+  @rpc
+  def flight(self, reference_frame=None):
+    if reference_frame is None:
+      reference_frame = ReferenceFrame(self._conn, self._target, 'surface')
+    return Flight(self._conn, self._target, reference_frame)
+
+  @rpc
+  def direction(self, reference_frame):
+    return reference_frame.to_frame(self._target.attitude)
+
+  @rpc
+  def velocity(self, reference_frame):
+    v = self._target.v
+    if reference_frame.rotating():
+      v = self._target.surface_velocity()
+    return reference_frame.to_frame(v)
+
+  @rpc
+  def position(self, reference_frame):
+    if reference_frame.kind not in ('body', 'body_non_rotating'):
+      return (0., 0., 0.)
+    return reference_frame.to_frame(self._target.r)
+
+
+class Orbit(Proxy):
+  """Orbit of a vessel, computed from its current state vector"""
+
+  def elements(self):
+    v = self._target
+    return physics.elements(v.r, v.v, v.body.mu)
+
+  def _body(self):
+    return CelestialBody(self._conn, self._target.body)
+
+  body = remote(_body)
+
+  def _apoapsis(self):
+    return self.elements()['apoapsis']
+
+  apoapsis = remote(_apoapsis)
+
+  def _periapsis(self):
+    return self.elements()['periapsis']
+
+  periapsis = remote(_periapsis)
+
+  def _apoapsis_altitude(self):
+    return self.elements()['apoapsis'] - self._target.body.radius
+
+  apoapsis_altitude = remote(_apoapsis_altitude)
+
+  def _periapsis_altitude(self):
+    return self.elements()['periapsis'] - self._target.body.radius
+
+  periapsis_altitude = remote(_periapsis_altitude)
+
+  def _semi_major_axis(self):
+    return self.elements()['semi_major_axis']
+
+  semi_major_axis = remote(_semi_major_axis)
+
+  def _eccentricity(self):
+    return self.elements()['eccentricity']
+
+  eccentricity = remote(_eccentricity)
+
+  def _inclination(self):
+    return self.elements()['inclination']
+
+  inclination = remote(_inclination)
+
+  def _period(self):
+    return self.elements()['period']
+
+  period = remote(_period)
+
+  def _time_to_apoapsis(self):
+    return self.elements()['time_to_apoapsis']
+
+  time_to_apoapsis = remote(_time_to_apoapsis)
+
+  def _time_to_periapsis(self):
+    return self.elements()['time_to_periapsis']
+
+  time_to_periapsis = remote(_time_to_periapsis)
+
+  def _speed(self):
+    return norm(self._target.v)
+
+  speed = remote(_speed)
+
+  def _radius(self):
+    return norm(self._target.r)
+
+  radius = remote(_radius)
+
+  def _true_anomaly(self):
+    return self.elements()['true_anomaly']
+
+  true_anomaly = remote(_true_anomaly)
+
+  def _mean_anomaly(self):
+    return self.elements()['mean_anomaly']
+
+  mean_anomaly = remote(_mean_anomaly)
+
+
+class Flight(Proxy):
+
+  def __init__(self, conn, target, reference_frame):
+    Proxy.__init__(self, conn, target)
+    self.frame = reference_frame
+
+  def _key(self):
+    return (type(self), id(self._target), self.frame._key())
+
+  def _mean_altitude(self):
+    return self._target.altitude
+
+  mean_altitude = remote(_mean_altitude)
+  surface_altitude = mean_altitude
+  bedrock_altitude = mean_altitude
+
+  def _speed(self):
+    if self.frame.kind == 'body_non_rotating':
+      return norm(self._target.v)
+    return norm(self._target.surface_velocity())
+
+  speed = remote(_speed)
+
+  def _vertical_speed(self):
+    return dot(self._target.surface_velocity(), unit(self._target.r))
+
+  vertical_speed = remote(_vertical_speed)
+
+  def _horizontal_speed(self):
+    air = self._target.surface_velocity()
+    up = unit(self._target.r)
+    return norm(sub(air, scale(up, dot(air, up))))
+
+  horizontal_speed = remote(_horizontal_speed)
+
+  def _static_pressure(self):
+    return self._target.pressure()
+
+  static_pressure = remote(_static_pressure)
+
+  def _atmosphere_density(self):
+    return self._target.body.density(self._target.altitude)
+
+  atmosphere_density = remote(_atmosphere_density)
+
+  def _dynamic_pressure(self):
+    air = self._target.surface_velocity()
+    return 0.5 * self._target.body.density(self._target.altitude) * dot(air, air)
+
+  dynamic_pressure = remote(_dynamic_pressure)
+
+  def _latitude(self):
+    v = self._target
+    return v.body.coordinates(v.r, self._conn.server.ut)[0]
+
+  latitude = remote(_latitude)
+
+  def _longitude(self):
+    v = self._target
+    return v.body.coordinates(v.r, self._conn.server.ut)[1]
+
+  longitude = remote(_longitude)
+
+  def _pitch(self):
+    up = unit(self._target.r)
+    return 90. - angle(self._target.attitude, up)
+
+  pitch = remote(_pitch)
+
+  def _heading(self):
+    frame = ReferenceFrame(self._conn, self._target, 'surface')
+    d = frame.to_frame(self._target.attitude)
+    return physics.math.degrees(physics.math.atan2(d[2], d[1])) % 360
+
+  heading = remote(_heading)
+
+
+class Control(Proxy):
+
+  def _get_throttle(self):
+    return self._target.throttle
+
+  def _set_throttle(self, value):
+    self._target.throttle = max(0., min(1., float(value)))
+
+  throttle = remote(_get_throttle, _set_throttle)
+
+  def _get_sas(self):
+    return self._target.sas
+
+  def _set_sas(self, value):
+    self._target.sas = bool(value)
+
+  sas = remote(_get_sas, _set_sas)
+
+  def _get_rcs(self):
+    return self._target.rcs
+
+  def _set_rcs(self, value):
+    self._target.rcs = bool(value)
+
+  rcs = remote(_get_rcs, _set_rcs)
+
+  def _current_stage(self):
+    return self._target.current_stage
+
+  current_stage = remote(_current_stage)
+
+  @rpc
+  def activate_next_stage(self):
+    server = self._conn.server
+    dropped = self._target.activate_next_stage()
+    if not dropped:
+      return []
+    debris = physics.VesselModel(self._target.name + ' Debris', dropped,
+                                 self._target.body, self._target.r, self._target.v)
+    debris.debris = True
+    server.vessels.append(debris)
+    return [Vessel(self._conn, debris)]
+
+  def _nodes(self):
+    return [Node(self._conn, n) for n in getattr(self._target, 'nodes', [])]
+
+  nodes = remote(_nodes)
+
+  @rpc
+  def add_node(self, ut, prograde=0., normal=0., radial=0.):
+    node = NodeModel(self._target, self._conn.server.ut, ut, prograde, normal, radial)
+    if not hasattr(self._target, 'nodes'):
+      self._target.nodes = []
+    self._target.nodes.append(node)
+    return Node(self._conn, node)
+
+  @rpc
+  def remove_nodes(self):
+    self._target.nodes = []
+
+
+class NodeModel:
+  """Maneuver node: a burn vector fixed at creation, in inertial space"""
+
+  def __init__(self, vessel, now, ut, prograde, normal, radial):
+    self.vessel = vessel
+    self.ut = ut
+    self.prograde = prograde
+    self.normal = normal
+    self.radial = radial
+    self.start_delta_v = vessel.applied_delta_v
+
+    r, v = vessel.r, vessel.v
+    if ut > now:
+      r, v = physics.coast(r, v, vessel.body.mu, ut - now, 10.)
+    p = unit(v)
+    n = unit(cross(r, v))
+    radial_out = cross(p, n)
+    self.burn = add(add(scale(p, prograde), scale(n, normal)), scale(radial_out, radial))
+
+  def applied(self):
+    return sub(self.vessel.applied_delta_v, self.start_delta_v)
+
+  def remaining(self):
+    return sub(self.burn, self.applied())
+
+
+class Node(Proxy):
+
+  def _ut(self):
+    return self._target.ut
+
+  ut = remote(_ut)
+
+  def _prograde(self):
+    return self._target.prograde
+
+  prograde = remote(_prograde)
+
+  def _delta_v(self):
+    return norm(self._target.burn)
+
+  delta_v = remote(_delta_v)
+
+  def _remaining_delta_v(self):
+    if self._target not in getattr(self._target.vessel, 'nodes', []):
+      raise ValueError("Node does not exist")
+    return norm(self._target.remaining())
+
+  remaining_delta_v = remote(_remaining_delta_v)
+
+  def _time_to(self):
+    return self._target.ut - self._conn.server.ut
+
+  time_to = remote(_time_to)
+
+  def _reference_frame(self):
+    return ReferenceFrame(self._conn, self._target, 'node')
+
+  reference_frame = remote(_reference_frame)
+
+  @rpc
+  def burn_vector(self, reference_frame=None):
+    if reference_frame is None:
+      return (0., norm(self._target.burn), 0.)
+    return reference_frame.to_frame(self._target.burn)
+
+  @rpc
+  def remaining_burn_vector(self, reference_frame=None):
+    if reference_frame is None:
+      return (0., norm(self._target.remaining()), 0.)
+    return reference_frame.to_frame(self._target.remaining())
+
+  @rpc
+  def remove(self):
+    nodes = getattr(self._target.vessel, 'nodes', [])
+    if self._target in nodes:
+      nodes.remove(self._target)
+
+
+class AutoPilot(Proxy):
+  """Auto-pilot, slewing the vessel attitude towards its target
+
+    The target is kept as a direction in the auto-pilot reference
+    frame, and followed as the frame moves with the vessel
+  """
+
+  def state(self):
+    v = self._target
+    if not hasattr(v, 'ap_frame'):
+      v.ap_frame = ReferenceFrame(self._conn, v, 'surface')
+      v.ap_direction = None
+      v.ap_engaged = False
+    return v
+
+  def target_vector(self):
+    v = self.state()
+    if not v.ap_engaged or v.ap_direction is None:
+      return None
+    return v.ap_frame.from_frame(v.ap_direction)
+
+  @rpc
+  def engage(self):
+    v = self.state()
+    v.ap_engaged = True
+    v.autopilot_target = lambda model: self.target_vector()
+
+  @rpc
+  def disengage(self):
+    v = self.state()
+    v.ap_engaged = False
+    v.autopilot_target = None
+
+  @rpc
+  def target_pitch_and_heading(self, pitch, heading):
+    v = self.state()
+    p = physics.math.radians(pitch)
+    h = physics.math.radians(heading)
+    v.ap_direction = (physics.math.sin(p),
+                      physics.math.cos(p) * physics.math.cos(h),
+                      physics.math.cos(p) * physics.math.sin(h))
+
+  def _get_reference_frame(self):
+    return self.state().ap_frame
+
+  def _set_reference_frame(self, frame):
+    self.state().ap_frame = frame
+
+  reference_frame = remote(_get_reference_frame, _set_reference_frame)
+
+  def _get_target_direction(self):
+    return self.state().ap_direction
+
+  def _set_target_direction(self, direction):
+    self.state().ap_direction = unit(tuple(direction))
+
+  target_direction = remote(_get_target_direction, _set_target_direction)
+
+  def _error(self):
+    target = self.target_vector()
+    if target is None:
+      return 0.
+    return angle(self._target.attitude, target)
+
+  error = remote(_error)
+
+  @rpc
+  def wait(self):
+    server = self._conn.server
+    deadline = server.ut + 60
+    while self._error() > 0.5 and server.ut < deadline:
+      if server.time_scale is None:
+        server.advance(0.1)
+      else:
+        server.wait(0.05)
+
+
+class Parts(Proxy):
+
+  def parts(self, kind=None):
+    return [Part(self._conn, p) for p in self._target.parts
+            if kind is None or p.kind == kind]
+
+  def _all(self):
+    return self.parts()
+
+  all = remote(_all)
+
+  def _root(self):
+    return self.parts()[0]
+
+  root = remote(_root)
+
+  def _engines(self):
+    return [p.engine for p in self.parts('engine')]
+
+  engines = remote(_engines)
+
+  def _launch_clamps(self):
+    return [LaunchClamp(self._conn, p._target) for p in self.parts('clamp')]
+
+  launch_clamps = remote(_launch_clamps)
+
+  def _fairings(self):
+    return [Fairing(self._conn, p._target) for p in self.parts('fairing')]
+
+  fairings = remote(_fairings)
+
+  def _decouplers(self):
+    return [Decoupler(self._conn, p._target) for p in self.parts('decoupler')]
+
+  decouplers = remote(_decouplers)
+
+  def _solar_panels(self):
+    return [SolarPanel(self._conn, p._target) for p in self.parts('solar_panel')]
+
+  solar_panels = remote(_solar_panels)
+
+  def _parachutes(self):
+    return [Parachute(self._conn, p._target) for p in self.parts('parachute')]
+
+  parachutes = remote(_parachutes)
+
+  @rpc
+  def with_name(self, name):
+    return [p for p in self.parts() if p._target.name == name]
+
+  @rpc
+  def with_title(self, title):
+    return [p for p in self.parts() if p._target.title == title]
+
+  @rpc
+  def with_tag(self, tag):
+    return [p for p in self.parts() if p._target.tag == tag]
+
+  @rpc
+  def with_module(self, module_name):
+    return [p for p in self.parts()
+            if any(m['name'] == module_name for m in p._target.modules)]
+
+  @rpc
+  def in_stage(self, stage):
+    return [p for p in self.parts() if p._target.stage == stage]
+
+  @rpc
+  def in_decouple_stage(self, stage):
+    return [p for p in self.parts() if p._target.decouple_stage == stage]
+
+  @rpc
+  def modules_with_name(self, module_name):
+    return [m for p in self.parts() for m in p._modules() if m.name == module_name]
+
+
+class Part(Proxy):
+
+  def _name(self):
+    return self._target.name
+
+  name = remote(_name)
+
+  def _title(self):
+    return self._target.title
+
+  title = remote(_title)
+
+  def _get_tag(self):
+    return self._target.tag
+
+  def _set_tag(self, tag):
+    self._target.tag = tag
+
+  tag = remote(_get_tag, _set_tag)
+
+  def _stage(self):
+    return self._target.stage
+
+  stage = remote(_stage)
+
+  def _decouple_stage(self):
+    return self._target.decouple_stage
+
+  decouple_stage = remote(_decouple_stage)
+
+  def _mass(self):
+    return self._target.mass
+
+  mass = remote(_mass)
+
+  def _dry_mass(self):
+    return self._target.mass - self._target.fuel
+
+  dry_mass = remote(_dry_mass)
+
+  def _modules(self):
+    return [Module(self._conn, self._target, m) for m in self._target.modules]
+
+  modules = remote(_modules)
+
+  def _engine(self):
+    if self._target.kind != 'engine':
+      return None
+    return Engine(self._conn, self._target)
+
+  engine = remote(_engine)
+
+  def _fairing(self):
+    if self._target.kind != 'fairing':
+      return None
+    return Fairing(self._conn, self._target)
+
+  fairing = remote(_fairing)
+
+  def _decoupler(self):
+    if self._target.kind != 'decoupler':
+      return None
+    return Decoupler(self._conn, self._target)
+
+  decoupler = remote(_decoupler)
+
+  def _launch_clamp(self):
+    if self._target.kind != 'clamp':
+      return None
+    return LaunchClamp(self._conn, self._target)
+
+  launch_clamp = remote(_launch_clamp)
+
+  def _parachute(self):
+    if self._target.kind != 'parachute':
+      return None
+    return Parachute(self._conn, self._target)
+
+  parachute = remote(_parachute)
+
+  def _solar_panel(self):
+    if self._target.kind != 'solar_panel':
+      return None
+    return SolarPanel(self._conn, self._target)
+
+  solar_panel = remote(_solar_panel)
+
+
+class Module(Proxy):
+
+  def __init__(self, conn, part, module):
+    Proxy.__init__(self, conn, part)
+    self.module = module
+
+  def _key(self):
+    return (type(self), id(self._target), id(self.module))
+
+  def _name(self):
+    return self.module['name']
+
+  name = remote(_name)
+
+  def _part(self):
+    return Part(self._conn, self._target)
+
+  part = remote(_part)
+
+  def _events(self):
+    return list(self.module.get('events', []))
+
+  events = remote(_events)
+
+  @rpc
+  def has_event(self, name):
+    return name in self.module.get('events', [])
+
+  @rpc
+  def trigger_event(self, name):
+    if name not in self.module.get('events', []):
+      raise ValueError("Event %s not found" % name)
+    self.module.setdefault('triggered', []).append(name)
+    if self.module['name'] == 'ProceduralFairingDecoupler' and name == 'Jettison':
+      self._target.jettisoned = True
+
+
+class PartFunction(Proxy):
+  """Base of part function objects (engine, fairing...)"""
+
+  def _part(self):
+    return Part(self._conn, self._target)
+
+  part = remote(_part)
+
+
+class Engine(PartFunction):
+
+  def vessel(self):
+    for v in self._conn.server.vessels:
+      if self._target in v.parts:
+        return v
+
+  def _get_active(self):
+    return self._target.engine_active
+
+  def _set_active(self, value):
+    self._target.engine_active = bool(value)
+
+  active = remote(_get_active, _set_active)
+
+  def _has_fuel(self):
+    v = self.vessel()
+    return v is not None and v.fuel(self._target.decouple_stage) > 0
+
+  has_fuel = remote(_has_fuel)
+
+  def _available_thrust(self):
+    v = self.vessel()
+    if v is None or not self._target.engine_active or not self._has_fuel():
+      return 0.
+    return self._target.mass_flow() * self._target.isp(v.pressure()) * physics.G0
+
+  available_thrust = remote(_available_thrust)
+
+  def _get_thrust_limit(self):
+    return self._target.thrust_limit
+
+  def _set_thrust_limit(self, value):
+    self._target.thrust_limit = min(max(float(value), 0.), 1.)
+
+  thrust_limit = remote(_get_thrust_limit, _set_thrust_limit)
+
+  def _thrust(self):
+    v = self.vessel()
+    return self._available_thrust() * (v.throttle if v is not None else 0.)
+
+  thrust = remote(_thrust)
+
+  def _max_thrust(self):
+    v = self.vessel()
+    pressure = v.pressure() if v is not None else 0.
+    return self._target.max_mass_flow() * self._target.isp(pressure) * physics.G0
+
+  max_thrust = remote(_max_thrust)
+
+  def _max_vacuum_thrust(self):
+    return self._target.max_vacuum_thrust
+
+  max_vacuum_thrust = remote(_max_vacuum_thrust)
+
+  def _specific_impulse(self):
+    v = self.vessel()
+    return self._target.isp(v.pressure() if v is not None else 0.)
+
+  specific_impulse = remote(_specific_impulse)
+
+  def _vacuum_specific_impulse(self):
+    return self._target.vacuum_isp
+
+  vacuum_specific_impulse = remote(_vacuum_specific_impulse)
+
+  def _kerbin_sea_level_specific_impulse(self):
+    return self._target.sea_level_isp
+
+  kerbin_sea_level_specific_impulse = remote(_kerbin_sea_level_specific_impulse)
+
+
+class Fairing(PartFunction):
+
+  @rpc
+  def jettison(self):
+    self._target.jettisoned = True
+
+  def _jettisoned(self):
+    return self._target.jettisoned
+
+  jettisoned = remote(_jettisoned)
+
+
+class Decoupler(PartFunction):
+
+  def _decoupled(self):
+    return not any(self._target in v.parts for v in self._conn.server.live_vessels())
+
+  decoupled = remote(_decoupled)
+
+
+class LaunchClamp(PartFunction):
+
+  @rpc
+  def release(self):
+    for v in self._conn.server.live_vessels():
+      if self._target in v.parts:
+        v.parts.remove(self._target)
+        v.clamped = any(p.kind == 'clamp' for p in v.parts)
+
+
+class SolarPanel(PartFunction):
+
+  def _sun_exposure(self):
+    return 1.
+
+  sun_exposure = remote(_sun_exposure)
+
+
+class Parachute(PartFunction):
+
+  @rpc
+  def deploy(self):
+    self._target.deployed = True
+
+  def _deployed(self):
+    return self._target.deployed
+
+  deployed = remote(_deployed)
+
+
+###################################
+
+# Other services
+
+
+class RemoteTech(Proxy):
+
+  def __init__(self, conn):
+    Proxy.__init__(self, conn, conn.server)
+
+  @rpc
+  def comms(self, vessel):
+    return Comms(self._conn, vessel._target)
+
+
+class Comms(Proxy):
+
+  def _antennas(self):
+    return [Antenna(self._conn, p) for p in self._target.parts if p.kind == 'antenna']
+
+  antennas = remote(_antennas)
+
+
+class Antenna(PartFunction):
+  pass
+
+
+class KRPC(Proxy):
+
+  def __init__(self, conn):
+    Proxy.__init__(self, conn, conn.server)
+
+  def _current_game_scene(self):
+    return Enum('flight')
+
+  current_game_scene = remote(_current_game_scene)
+
+  @rpc
+  def add_event(self, expression):
+    return Event(self._conn, expression)
+
+
+class Expression:
+  """Server-side expressions, evaluated when their event stream updates"""
+
+  @staticmethod
+  def call(call):
+    return call
+
+  @staticmethod
+  def constant_double(value):
+    return lambda: value
+
+  constant_float = constant_double
+  constant_int = constant_double
+  constant_bool = constant_double
+
+  @staticmethod
+  def less_than(x, y):
+    return lambda: x() < y()
+
+  @staticmethod
+  def less_than_or_equal(x, y):
+    return lambda: x() <= y()
+
+  @staticmethod
+  def greater_than(x, y):
+    return lambda: x() > y()
+
+  @staticmethod
+  def greater_than_or_equal(x, y):
+    return lambda: x() >= y()
+
+  @staticmethod
+  def equal(x, y):
+    return lambda: x() == y()
+
+  @staticmethod
+  def not_equal(x, y):
+    return lambda: x() != y()
+
+  @staticmethod
+  def and_(x, y):
+    return lambda: x() and y()
+
+  @staticmethod
+  def or_(x, y):
+    return lambda: x() or y()
+
+  @staticmethod
+  def not_(x):
+    return lambda: not x()
+
+
+KRPC.Expression = Expression
+
+
+class Event:
+  """Stand-in for a kRPC event: a boolean stream over an expression"""
+
+  def __init__(self, conn, expression):
+    self.stream = Stream(conn, expression, (), {})
+    self.callbacks = {}
+
+  @property
+  def condition(self):
+    return self.stream.condition
+
+  def start(self):
+    self.stream.start()
+
+  def wait(self, timeout=None):
+    self.stream.wait(timeout)
+
+  def add_callback(self, callback):
+    def wrapper(value):
+      if value:
+        callback()
+    self.callbacks[callback] = wrapper
+    self.stream.add_callback(wrapper)
+
+  def remove_callback(self, callback):
+    if callback in self.callbacks:
+      self.stream.remove_callback(self.callbacks.pop(callback))
+
+  def remove(self):
+    self.stream.remove()
+
+
+class UI:
+  """User interface, keeping displayed values without drawing them"""
+
+  def __init__(self, conn):
+    self.stock_canvas = Canvas()
+
+
+class RectTransform:
+
+  def __init__(self, size=(0, 0)):
+    self.size = size
+    self.position = (0, 0)
+
+
+class Canvas:
+
+  def __init__(self):
+    self.rect_transform = RectTransform((1920, 1080))
+    self.panels = []
+
+  def add_panel(self, visible=True):
+    panel = Panel(self)
+    self.panels.append(panel)
+    return panel
+
+
+class Panel:
+
+  def __init__(self, canvas):
+    self.canvas = canvas
+    self.rect_transform = RectTransform()
+    self.texts = []
+    self.visible = True
+
+  def add_panel(self, visible=True):
+    return Panel(self.canvas)
+
+  def add_text(self, content, visible=True):
+    text = Text(content)
+    self.texts.append(text)
+    return text
+
+  def remove(self):
+    if self in self.canvas.panels:
+      self.canvas.panels.remove(self)
+
+
+class Text:
+
+  def __init__(self, content):
+    self.content = content
+    self.rect_transform = RectTransform()
+    self.color = (1, 1, 1)
+    self.size = 14
+    self.visible = True
@@ -0,0 +1,93 @@
+"""Vehicles flown by the kRPC stand-in
+
+  A vehicle is described by the list of its parts. Stage numbers follow
+  KSP: the highest stage is activated first, and a part is dropped when
+  the stage matching its decouple_stage is activated. Engines burn the
+  propellant of tanks sharing their decouple_stage.
+
+  Masses are in kg, thrusts in N, drag areas (cda, drag coefficient
+  times frontal area) in m2. An engine thrust_limit (0 to 1, 1 by
+  default) cuts its mass flow, as the thrust limiter of KSP does.
+"""
+
+# Kerbal Space Center launch pad
+KSC_LATITUDE = -0.0972
+KSC_LONGITUDE = -74.5577
+KSC_ALTITUDE = 70.
+
+# Two stages to orbit, with a fairing, a camera and a parachute
+SIM_ROCKET = {
+    'name': 'Sim Rocket',
+    'parts': [
+        {'name': 'probeCoreOcto', 'title': 'Probodobodyne OKTO', 'kind': 'command',
+         'mass': 800.},
+        {'name': 'RTShortAntenna1', 'kind': 'antenna', 'mass': 50.,
+         'modules': [{'name': 'ModuleRTAntenna', 'events': ['Activate']}]},
+        {'name': 'solarPanels5', 'kind': 'solar_panel', 'mass': 20.},
+        {'name': 'hc.kazzelblad', 'kind': 'generic', 'mass': 50.,
+         'modules': [{'name': 'MuMechModuleHullCameraZoom',
+                      'events': ['Activate Camera']}]},
+        {'name': 'parachuteSingle', 'kind': 'parachute', 'mass': 100.,
+         'stage': 0, 'cda': 400.},
+        {'name': 'fairingSize1', 'kind': 'fairing', 'mass': 100.,
+         'panel_mass': 200., 'cda': 0.6,
+         'modules': [{'name': 'ModuleProceduralFairing', 'events': ['Deploy']}]},
+        {'name': 'fuelTank', 'kind': 'tank', 'mass': 300., 'fuel': 2300.,
+         'cda': 0.5},
+        {'name': 'liquidEngine3.v2', 'title': 'LV-909 "Terrier"', 'kind': 'engine',
+         'mass': 500., 'stage': 1, 'thrust': 60000., 'isp_vac': 345.,
+         'isp_asl': 85.},
+        {'name': 'Decoupler.1', 'kind': 'decoupler', 'mass': 50.,
+         'stage': 2, 'decouple_stage': 2},
+        {'name': 'fuelTank4-2', 'kind': 'tank', 'mass': 1700., 'fuel': 12300.,
+         'decouple_stage': 2, 'cda': 0.8},
+        {'name': 'liquidEngine2', 'title': 'LV-T45 "Swivel"', 'kind': 'engine',
+         'mass': 1500., 'stage': 4, 'decouple_stage': 2, 'thrust': 360000.,
+         'isp_vac': 310., 'isp_asl': 265.},
+        {'name': 'launchClamp1', 'kind': 'clamp', 'mass': 0.,
+         'stage': 3, 'decouple_stage': 3},
+    ]
+}
+
+# Relay satellite with a small engine for station keeping
+SIM_RELAY = {
+    'name': 'Sim Relay',
+    'parts': [
+        {'name': 'probeCoreOcto', 'title': 'Probodobodyne OKTO', 'kind': 'command',
+         'mass': 100.},
+        {'name': 'RTShortAntenna1', 'kind': 'antenna', 'mass': 50.,
+         'modules': [{'name': 'ModuleRTAntenna', 'events': ['Activate']}]},
+        {'name': 'solarPanels5', 'kind': 'solar_panel', 'mass': 20.},
+        {'name': 'fuelTankSmallFlat', 'kind': 'tank', 'mass': 60., 'fuel': 500.},
+        {'name': 'microEngine.v2', 'title': 'LV-1 "Ant"', 'kind': 'engine',
+         'mass': 20., 'stage': 0, 'thrust': 2000., 'isp_vac': 315.,
+         'isp_asl': 80.},
+    ]
+}
+
+# Capsule on a booster, as flown by alternative/icarus.py: the booster is
+# dropped after the launch, and the capsule circularizes with its
+# SuperDraco engine
+SIM_CAPSULE = {
+    'name': 'Sim Capsule',
+    'parts': [
+        {'name': 'mk1-3pod', 'title': 'Mk1-3 Command Pod', 'kind': 'command',
+         'mass': 1500., 'cda': 1.},
+        {'name': 'parachuteLarge', 'kind': 'parachute', 'mass': 100.,
+         'stage': 0, 'cda': 500.},
+        {'name': 'fuelTank', 'kind': 'tank', 'mass': 250., 'fuel': 1600.,
+         'cda': 0.5},
+        {'name': 'SSTU-SC-ENG-SuperDraco-L', 'title': 'SuperDraco', 'kind': 'engine',
+         'mass': 200., 'stage': 1, 'thrust': 70000., 'isp_vac': 300.,
+         'isp_asl': 240.},
+        {'name': 'Decoupler.2', 'kind': 'decoupler', 'mass': 50.,
+         'stage': 2, 'decouple_stage': 2},
+        {'name': 'fuelTank4-2', 'kind': 'tank', 'mass': 1700., 'fuel': 12300.,
+         'decouple_stage': 2, 'cda': 0.8},
+        {'name': 'liquidEngine2', 'title': 'LV-T45 "Swivel"', 'kind': 'engine',
+         'mass': 1500., 'stage': 4, 'decouple_stage': 2, 'thrust': 360000.,
+         'isp_vac': 310., 'isp_asl': 265.},
+        {'name': 'launchClamp1', 'kind': 'clamp', 'mass': 0.,
+         'stage': 3, 'decouple_stage': 3},
+    ]
+}
@@ -1,9 +1,11 @@
 """Generic mission to launch to orbit around orbit"""
 
-import time
+import sys
 import krpc
+import csk.sim
 from csk.lib.mission import Mission
-from csk.lib.nav import pitch
+from csk.lib.runtime import Runtime
+from csk.lib.nav import direction_pitch
 from csk.lib.steps.launch import all_steps
 
 
@@ -66,48 +68,47 @@ def init_ui(conn):
   return {'panel': panel, 'texts': texts}
 
 
+
+def update_ui(ui, mission):
+  telemetry = mission.telemetry
+  if telemetry is None:
+    return
+
+  target_apt = mission.parameters.get('target_apt')
+  target_pitch = mission.parameters.get('target_pitch', None)
+
+  step_name = mission.current_step['name'].replace('_', ' ').title()
+
+  if target_pitch is None:
+    ui['texts']['target_pitch'].content = "Tgt. pitch: N/A"
+  else:
+    ui['texts']['target_pitch'].content = "Tgt. pitch: %d °" % target_pitch
+  ui['texts']['speed'].content = "Speed: %d m/s" % telemetry.speed
+  ui['texts']['throttle'].content = "Throttle: %.1f %%" % (telemetry.throttle * 100.0)
+  ui['texts']['altitude'].content = "Altitude: %d m" % telemetry.mean_altitude
+  ui['texts']['current_pitch'].content = "Cur. pitch: %d °" % direction_pitch(telemetry.direction)
+  ui['texts']['target_apt'].content = "Tgt. APT: %.1f s" % target_apt
+  ui['texts']['current_apt'].content = "Cur. APT: %.1f s" % telemetry.time_to_apoapsis
+  ui['texts']['step'].content = "Step: %s" % step_name
+
 if __name__ == "__main__":
-  conn = krpc.connect()
-  vessel = conn.space_center.active_vessel
+  if '--sim' in sys.argv:
+    conn = csk.sim.connect(time_scale=None)
+  else:
+    conn = krpc.connect()
 
   params = {'target_altitude': 140000,
             'turn_end_alt': 110000,
             'target_apt': 60}
 
   mission = Mission(conn, all_steps, params)
+  if '--count-rpcs' in sys.argv:
+    mission.count_rpcs()
   ui = init_ui(conn)
 
-  orbit_frame = vessel.orbit.body.reference_frame
-
-  ut = conn.add_stream(getattr, conn.space_center, 'ut')
-  speed = conn.add_stream(getattr, vessel.flight(orbit_frame), 'speed')
-  altitude = conn.add_stream(getattr, vessel.flight(), 'mean_altitude')
-  apo_time = conn.add_stream(getattr, vessel.orbit, 'time_to_apoapsis')
-  thr = conn.add_stream(getattr, vessel.control, 'throttle')
-
-  mission.start()
-  last_log = ut()
-
-  while mission.running:
-    mission.update()
-
-    if ut() - last_log > 1:
-      target_apt = mission.parameters.get('target_apt')
-      target_pitch = mission.parameters.get('target_pitch', None)
-
-      step_name = mission.current_step['name'].replace('_', ' ').title()
-
-      if target_pitch is None:
-        ui['texts']['target_pitch'].content = "Tgt. pitch: N/A"
-      else:
-        ui['texts']['target_pitch'].content = "Tgt. pitch: %d °" % target_pitch
-      ui['texts']['speed'].content = "Speed: %d m/s" % speed()
-      ui['texts']['throttle'].content = "Throttle: %.1f %%" % (thr() * 100.0)
-      ui['texts']['altitude'].content = "Altitude: %d m" % altitude()
-      ui['texts']['current_pitch'].content = "Cur. pitch: %d °" % pitch(vessel)
-      ui['texts']['target_apt'].content = "Tgt. APT: %.1f s" % target_apt
-      ui['texts']['current_apt'].content = "Cur. APT: %.1f s" % apo_time()
-      ui['texts']['step'].content = "Step: %s" % step_name
-      last_log = ut()
-
-    time.sleep(0.1)
+  # Guidance and HUD run side by side, in the same event loop
+  runtime = Runtime(conn, mission.clock)
+  runtime.mission(mission)
+  runtime.every(1, lambda: update_ui(ui, mission),
+                stop_when=lambda: not mission.running)
+  runtime.run()
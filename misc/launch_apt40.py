@@ -1,9 +1,19 @@
-import time
-from lib.pid import PID
-from lib.nav import pitch, compute_circ_burn
+import os
+import sys
 
+# Shared modules live in the csk package at the repository root
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+  sys.path.append(_root)
 
-def launch(conn):
+from csk.lib.pid import PID
+from csk.lib.nav import pitch, compute_circ_burn
+from csk.lib.clock import default_clock
+
+
+def launch(conn, clock=None):
+  if clock is None:
+    clock = default_clock(conn)
 
   vessel = conn.space_center.active_vessel
   ap = vessel.auto_pilot
@@ -34,7 +44,7 @@ def launch(conn):
 
   # Launch
   while len(vessel.parts.launch_clamps) > 0:
-    time.sleep(1)
+    clock.sleep(1)
     vessel.control.activate_next_stage()
 
   last_log = ut()
@@ -120,12 +130,12 @@ def launch(conn):
   last_remaining = remaining_delta_v()
   while remaining_delta_v() > 0 and remaining_delta_v() > last_remaining:
     last_remaining = remaining_delta_v()
-    time.sleep(0.01)
+    clock.sleep(0.01)
 
   vessel.control.throttle = 0
   node.remove()
 
-  time.sleep(5)
+  clock.sleep(5)
   ap.disengage()
 
   print('Launch complete')
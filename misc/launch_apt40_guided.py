@@ -1,10 +1,22 @@
-import time
-from lib.pid import PID
-from lib.nav import pitch, compute_circ_burn
-from lib.parts import find_all_fairings, jettison_fairing
+import os
+import sys
 
+# Shared modules live in the csk package at the repository root
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _root not in sys.path:
+  sys.path.append(_root)
 
-def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
+from csk.lib.pid import PID
+from csk.lib.nav import pitch, compute_circ_burn
+from csk.lib.clock import default_clock
+from csk.lib.control import ControlChannel
+from csk.lib.parts import find_all_fairings, jettison_fairing, PartsIndex, StagingPlan, AutoStager
+
+
+def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False,
+           clock=None):
+  if clock is None:
+    clock = default_clock(conn)
 
   ui = init_ui(conn)
 
@@ -14,6 +26,13 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
   all_fairings = find_all_fairings(vessel)
   has_fairings = len(all_fairings) > 0
 
+  # Staging plan, built once; throttle goes through the channel so that
+  # the stager can hold it while staging
+  channel = ControlChannel(vessel.control, ap)
+  index = PartsIndex(conn, vessel.parts, vessel.control)
+  stager = AutoStager(StagingPlan(index), vessel.control, channel, clock, max_autostage)
+  index.close()
+
   target_apt = 40.0
   turn_end_alt = target_altitude * 0.6
   turn_start_alt = 1000
@@ -31,18 +50,20 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
   apo_time = conn.add_stream(getattr, vessel.orbit, 'time_to_apoapsis')
   apoapsis = conn.add_stream(getattr, vessel.orbit, 'apoapsis_altitude')
   static_pressure = conn.add_stream(getattr, vessel.flight(), 'static_pressure')
+  stage = conn.add_stream(getattr, vessel.control, 'current_stage')
+  available_thrust = conn.add_stream(getattr, vessel, 'available_thrust')
 
   # Pre-launch
   ap.engage()
   ap.target_pitch_and_heading(target_pitch, 90)
-  vessel.control.throttle = 1
-  vessel.control.sas = False
-  vessel.control.rcs = use_rcs
+  channel.throttle = 1
+  channel.sas = False
+  channel.rcs = use_rcs
+  channel.flush()
 
   # Launch
-  while len(vessel.parts.launch_clamps) > 0:
-    time.sleep(1)
-    vessel.control.activate_next_stage()
+  while stager.release_clamps(stage()):
+    clock.sleep(0.1)
 
   last_log = ut()
   # Ascent loop
@@ -66,15 +87,15 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
       target_pitch = max(min_pitch, 90 - turn_angle)
       vessel.auto_pilot.target_pitch_and_heading(target_pitch, 90)
 
-      # Staging
-      auto_stage(vessel, max_autostage)
+      # Staging, one action per loop
+      stager.update(stage(), available_thrust())
 
     # Throttle control
     if altitude() > 40000:
       target_apt = 60.0
 
     new_thr = pid.seek(target_apt, apo_time(), ut())
-    vessel.control.throttle = new_thr
+    channel.throttle = new_thr
 
     # Fairings
     if has_fairings:
@@ -92,10 +113,13 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
       ui['texts']['current_apt'].content = "Cur. APT: %.1f s" % apo_time()
       last_log = ut()
 
-    time.sleep(0.01)
+    channel.flush()
+    clock.sleep(0.01)
 
   # MECO
-  vessel.control.throttle = 0
+  stager.cancel()
+  channel.throttle = 0
+  channel.flush()
   ap.reference_frame = vessel.orbital_reference_frame
   ap.target_direction = (0, 1, 0)
   while altitude() < 70000:
@@ -103,10 +127,12 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
 
   # Correct apoapsis
   if apoapsis() < target_altitude:
-    vessel.control.throttle = 0.05
+    channel.throttle = 0.05
+    channel.flush()
     while apoapsis() <= target_altitude:
-      time.sleep(0.01)
-    vessel.control.throttle = 0
+      clock.sleep(0.01)
+    channel.throttle = 0
+    channel.flush()
 
   # Compute circularization burn
   circ_burn = compute_circ_burn(vessel)
@@ -127,51 +153,36 @@ def launch(conn, max_autostage=0, target_altitude=100000, use_rcs=False):
   # Execute burn
   print('Ready to execute burn')
   while apo_time() - (circ_burn["burn_time"] / 2.) > 0:
-    time.sleep(0.01)
+    clock.sleep(0.01)
 
   print('Executing burn')
   remaining_delta_v = conn.add_stream(getattr, node, 'remaining_delta_v')
 
   if circ_burn["burn_time"] > 10:
-    vessel.control.throttle = 1
+    channel.throttle = 1
   else:
-    vessel.control.throttle = 0.05
+    channel.throttle = 0.05
 
   last_remaining = remaining_delta_v()
   while remaining_delta_v() > 0 and remaining_delta_v() <= last_remaining:
     if remaining_delta_v() < 10:
-      vessel.control.throttle = 0.05
-    auto_stage(vessel, max_autostage)
+      channel.throttle = 0.05
+    stager.update(stage(), available_thrust())
+    channel.flush()
     last_remaining = remaining_delta_v()
-    time.sleep(0.01)
+    clock.sleep(0.01)
 
-  vessel.control.throttle = 0
+  stager.cancel()
+  channel.throttle = 0
+  channel.flush()
   node.remove()
 
-  time.sleep(5)
+  clock.sleep(5)
   ap.disengage()
 
   print('Launch complete')
 
 
-def auto_stage(vessel, max_autostage):
-  if not vessel.available_thrust:
-    active_stage = 99
-    active_engines = filter(lambda e: e.active, vessel.parts.engines)
-    for engine in active_engines:
-      active_stage = min(engine.part.stage, active_stage)
-
-    if active_stage > max_autostage:
-      old_thr = vessel.control.throttle
-      vessel.control.throttle = 0
-
-      while not vessel.available_thrust:
-        time.sleep(0.5)
-        vessel.control.activate_next_stage()
-
-      vessel.control.throttle = old_thr
-
-
 def drop_fairings(vessel):
   fairings = filter(lambda f: getattr(f, 'tag', None) != "noauto",
                     find_all_fairings(vessel))
@@ -0,0 +1,226 @@
+"""Monte Carlo launch dispersion analysis
+
+  Flies the launch of a mission script many times with the batch
+  ascent simulator (see csk.lib.ascent), each run with its own engine
+  specific impulse, dry mass, drag area and atmosphere density drawn
+  around the nominal ones, to check the target_altitude and target_apt
+  settings of the script still reach orbit.
+
+  After the ascent, each run circularizes at apoapsis with the delta-v
+  it has left: the final orbit, its periapsis margin above the
+  atmosphere and the delta-v remaining then are its results.
+
+  Runs are drawn and flown in chunks spread over a process pool, and
+  percentiles of the runs so far are printed as chunks complete. Each
+  chunk is appended to a JSON lines results file when done, and drawn
+  from its own seed: an interrupted analysis resumes where it stopped,
+  and more runs can be added later, with the same results.
+
+  Usage: python monte_carlo.py [--mission apogee|icarus] [--runs N]
+                               [--workers N] [--output FILE] ...
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import numpy as np
+import csk.sim
+from csk.sim import vehicles
+from csk.sim.physics import ascent_stages
+from csk.lib import bodies
+from csk.lib.ascent import BatchAscent, AscentStage, circularize
+
+# Launch program and settings of the mission scripts
+MISSIONS = {
+    # apogee.py: Mission with csk launch steps
+    'apogee': ('mission', {'target_altitude': 120000, 'turn_end_alt': 80000,
+                           'target_apt': 50}),
+    # alternative/icarus.py: LaunchScenario
+    'icarus': ('scenario', {'target_altitude': 120000, 'target_apt': 50.0,
+                            'turn_end_alt': 95000}),
+}
+
+# Relative standard deviations of the dispersions, draws being clipped
+# to 3 of them
+SIGMAS = {'isp': 0.01, 'dry_mass': 0.02, 'cda': 0.1, 'atmosphere': 0.05}
+
+FIELDS = ('reached', 'orbit', 'apoapsis_altitude', 'periapsis_altitude',
+          'periapsis_margin', 'remaining_delta_v', 'max_q')
+
+# Result percentiles, with their scale and unit
+PERCENTILES = (5, 50, 95)
+REPORTED = (('apoapsis_altitude', 1000., 'km'), ('periapsis_altitude', 1000., 'km'),
+            ('periapsis_margin', 1000., 'km'), ('remaining_delta_v', 1., 'm/s'))
+
+DEFAULT_PATH = 'monte_carlo.jsonl'
+
+# Flight model and settings of the workers, set by init_worker
+_worker = {}
+
+
+def init_worker(constants, profile, stages, config):
+  _worker.update(constants=constants, profile=profile, stages=stages, config=config)
+
+
+def dispersion(rng, sigma, shape):
+  return 1. + sigma * np.clip(rng.standard_normal(shape), -3, 3)
+
+
+def fly(chunk):
+  """Draws and flies the runs of a chunk, in a worker"""
+  config = _worker['config']
+  constants, stages = _worker['constants'], _worker['stages']
+  program, parameters = MISSIONS[config['mission']]
+  size = config['chunk_size']
+  sigmas = config['sigmas']
+  rng = np.random.default_rng([config['seed'], chunk])
+
+  dispersed = []
+  for stage in stages:
+    isp = dispersion(rng, sigmas['isp'], size)
+    # Dry mass changes with the same propellant load
+    extra_mass = stage.dry_mass * (dispersion(rng, sigmas['dry_mass'], size) - 1)
+    dispersed.append(AscentStage(stage.wet_mass + extra_mass, stage.dry_mass + extra_mass,
+                                 stage.mass_flow, stage.isp_vacuum * isp,
+                                 stage.isp_sea_level * isp,
+                                 stage.cda * dispersion(rng, sigmas['cda'], size)))
+  atmosphere = dispersion(rng, sigmas['atmosphere'], size)
+
+  result = BatchAscent(constants, _worker['profile'], dispersed, parameters,
+                       program=program, atmosphere_scale=atmosphere).run()
+
+  # Circularize at apoapsis, with the delta-v left
+  periapsis_altitude, remaining_delta_v = circularize(constants, result)
+  margin = periapsis_altitude - constants.atmosphere_depth
+
+  runs = {'reached': result.reached,
+          'orbit': result.reached & (margin > 0),
+          'apoapsis_altitude': result.apoapsis_altitude,
+          'periapsis_altitude': periapsis_altitude,
+          'periapsis_margin': margin,
+          'remaining_delta_v': remaining_delta_v,
+          'max_q': result.max_q}
+  return chunk, {name: values.tolist() for name, values in runs.items()}
+
+
+class Results:
+  """Results file of an analysis: a config line, then one line per chunk
+
+    Each line is appended at once and synced to disk, so an interrupted
+    analysis leaves at most a truncated last line: it is dropped on
+    resume, and its chunk flown again.
+  """
+
+  def __init__(self, path, config):
+    self.path = path
+    self.chunks = {}
+    lines = []
+    if os.path.exists(path):
+      with open(path, 'rb') as f:
+        data = f.read()
+      end = data.rfind(b'\n') + 1
+      if end < len(data):
+        print("[monte_carlo]", "Dropping the truncated last line of %s" % path)
+        with open(path, 'r+b') as f:
+          f.truncate(end)
+      lines = [json.loads(line) for line in data[:end].splitlines() if line.strip()]
+    if len(lines) > 0:
+      if lines[0].get('config') != config:
+        raise ValueError("%s holds results of another analysis: %s" %
+                         (path, lines[0].get('config')))
+      for line in lines[1:]:
+        self.chunks[line['chunk']] = line['runs']
+    else:
+      self.append({'config': config})
+
+  def append(self, line):
+    data = (json.dumps(line) + '\n').encode()
+    fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+      # Appended by one write, unless the system cuts it short
+      while data:
+        data = data[os.write(fd, data):]
+      os.fsync(fd)
+    finally:
+      os.close(fd)
+
+  def add(self, chunk, runs):
+    self.chunks[chunk] = runs
+    self.append({'chunk': chunk, 'runs': runs})
+
+  def values(self, count):
+    """Results of the runs done in the first count chunks, as arrays by field
+
+      Chunks of a previous analysis with more runs are left out. None if
+      no chunk is done yet.
+    """
+    chunks = [self.chunks[chunk] for chunk in sorted(self.chunks) if chunk < count]
+    if len(chunks) == 0:
+      return None
+    return {name: np.concatenate([runs[name] for runs in chunks]) for name in FIELDS}
+
+
+def report(results, count, total):
+  values = results.values(count)
+  if values is None:
+    print("[monte_carlo]", "0/%d runs: no runs" % total, flush=True)
+    return
+  done = len(values['reached'])
+  reached = values['reached']
+  line = "%d/%d runs: %.1f%% reach target apoapsis, %.1f%% orbit" % (
+      done, total, 100. * reached.mean(), 100. * values['orbit'].mean())
+  if reached.any():
+    for name, scale, unit in REPORTED:
+      low, median, high = np.percentile(values[name][reached] / scale, PERCENTILES)
+      line += "\n  %-19s p%d %9.1f  p%d %9.1f  p%d %9.1f %s" % (
+          name, PERCENTILES[0], low, PERCENTILES[1], median, PERCENTILES[2], high, unit)
+  print("[monte_carlo]", line, flush=True)
+
+
+def main():
+  specs = {spec['name']: spec for spec in vars(vehicles).values()
+           if isinstance(spec, dict) and 'parts' in spec}
+  parser = argparse.ArgumentParser(description="Launch dispersion analysis")
+  parser.add_argument('--mission', default='apogee', choices=sorted(MISSIONS))
+  parser.add_argument('--vehicle', default=vehicles.SIM_ROCKET['name'], choices=sorted(specs))
+  parser.add_argument('--runs', type=int, default=2000)
+  parser.add_argument('--chunk-size', type=int, default=100)
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--output', default=DEFAULT_PATH)
+  args = parser.parse_args()
+
+  # Anything changing the draws or flights of a chunk
+  config = {'mission': args.mission, 'vehicle': args.vehicle, 'seed': args.seed,
+            'chunk_size': args.chunk_size, 'sigmas': SIGMAS,
+            'settings': MISSIONS[args.mission][1]}
+  results = Results(args.output, config)
+  count = -(-args.runs // args.chunk_size)
+  pending = [chunk for chunk in range(count) if chunk not in results.chunks]
+  total = count * args.chunk_size
+  if len(pending) < count:
+    print("[monte_carlo]", "Resuming: %d chunks done, %d to go" %
+          (count - len(pending), len(pending)))
+
+  vehicle = specs[args.vehicle]
+  conn = csk.sim.connect(vehicle, time_scale=None)
+  table = bodies.BodyConstants(path=None)
+  body = conn.space_center.active_vessel.orbit.body
+  initargs = (table.get(body), table.atmosphere(body), ascent_stages(vehicle), config)
+
+  start = time.perf_counter()
+  with multiprocessing.Pool(args.workers, init_worker, initargs) as pool:
+    for chunk, runs in pool.imap_unordered(fly, pending):
+      results.add(chunk, runs)
+      report(results, count, total)
+  if len(pending) > 0:
+    print("[monte_carlo]", "%d runs on %d workers in %.1f s" %
+          (len(pending) * args.chunk_size, args.workers, time.perf_counter() - start))
+  else:
+    report(results, count, total)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,102 @@
+"""PIDBank against scalar PIDs: outputs and states must match bit for bit
+
+  Run with: python -m pytest tests
+"""
+
+import numpy as np
+from csk.lib.pid import PID, PIDBank
+
+STATE = ('seekP', 'P', 'I', 'D', 'oldT', 'oldInput')
+
+
+def random_bank(count, rng):
+  """Random gains, limits and derivative filters of count controllers"""
+  gains = rng.uniform(0, 1, size=(3, count))
+  low = rng.uniform(-1, 0.5, size=count)
+  limits = (low, low + rng.uniform(0, 2, size=count))
+  filters = np.where(rng.random(count) < 0.5, 0., rng.uniform(0.1, 2, size=count))
+  return (*gains, *limits, filters)
+
+
+def fly(parameters, seek, current, ut, masks=None, resets=None):
+  """Feeds a bank and scalar PIDs the same ticks, and checks they agree
+
+    parameters are arrays of one value per controller, seek and
+    current of shape (ticks, count), ut of shape (ticks,) or (ticks,
+    count). Controllers seek on ticks where masks is true, after
+    starting over where resets is.
+  """
+  ticks, count = seek.shape
+  ut = np.broadcast_to(ut.reshape(ticks, -1), (ticks, count))
+  if masks is None:
+    masks = np.ones((ticks, count), dtype=bool)
+  if resets is None:
+    resets = np.zeros((ticks, count), dtype=bool)
+
+  bank = PIDBank(count, *parameters)
+  scalar = [[float(p[i]) for p in parameters] for i in range(count)]
+  pids = [PID(*p) for p in scalar]
+  for t in range(ticks):
+    bank.reset(resets[t])
+    outputs = bank.seek(seek[t], current[t], ut[t], masks[t])
+    for i in range(count):
+      if resets[t, i]:
+        pids[i] = PID(*scalar[i])
+      if masks[t, i]:
+        expected = pids[i].seek(float(seek[t, i]), float(current[t, i]), float(ut[t, i]))
+        assert outputs[i] == expected, "tick %d, controller %d: %r != %r" % (
+            t, i, outputs[i], expected)
+    for name in STATE:
+      np.testing.assert_array_equal(getattr(bank, name),
+                                    [getattr(pid, name) for pid in pids],
+                                    err_msg="%s after tick %d" % (name, t))
+
+
+def test_random_inputs():
+  rng = np.random.default_rng(1)
+  count, ticks = 200, 300
+  # Repeated times (no update), short and long steps
+  ut = np.cumsum(rng.choice([0., 0.05, 0.1, 0.5], size=ticks))
+  seek = rng.normal(40, 10, size=(ticks, count))
+  current = seek + rng.normal(0, 20, size=(ticks, count))
+  fly(random_bank(count, rng), seek, current, ut,
+      masks=rng.random((ticks, count)) < 0.8,
+      resets=rng.random((ticks, count)) < 0.01)
+
+
+def test_times_of_each_controller():
+  rng = np.random.default_rng(2)
+  count, ticks = 50, 200
+  ut = np.cumsum(rng.choice([0., 0.02, 0.1], size=(ticks, count)), axis=0)
+  seek = np.full((ticks, count), 50.)
+  current = rng.uniform(0, 100, size=(ticks, count))
+  fly(random_bank(count, rng), seek, current, ut)
+
+
+def test_saturation_and_anti_windup():
+  # Errors held far from the target push every controller into its
+  # limits, then reverse: the integral stops growing while saturated.
+  # The PD term of the last one lands exactly on its limits.
+  count, ticks = 5, 100
+  parameters = [np.array(v, dtype=float) for v in
+                ((0.2, 1., 0.05, 2., 0.001), (0.5, 0.1, 1., 0., 0.5),
+                 (0.1, 0., 0.5, 0.2, 0.), (0., -1., 0.1, -0.5, -1.),
+                 (1., 1., 0.2, 0.5, 1.), (0., 0.5, 0., 1., 0.))]
+  error = np.where(np.arange(ticks) < ticks // 2, 1000., -1000.)
+  seek = np.repeat(error[:, np.newaxis], count, axis=1)
+  fly(parameters, seek, np.zeros((ticks, count)), np.arange(ticks) * 0.1)
+
+
+def test_scalar_gains_broadcast():
+  rng = np.random.default_rng(3)
+  count, ticks = 10, 50
+  ut = np.arange(ticks) * 0.1
+  seek = rng.normal(0, 1, size=(ticks, count))
+  current = rng.normal(0, 1, size=(ticks, count))
+  bank = PIDBank(count, 0.2, 0.01, 0.1, 0.1, 1, 0.5)
+  pids = [PID(0.2, 0.01, 0.1, 0.1, 1, 0.5) for i in range(count)]
+  for t in range(ticks):
+    outputs = bank.seek(seek[t], current[t], ut[t])
+    expected = [pid.seek(float(s), float(c), float(ut[t]))
+                for pid, s, c in zip(pids, seek[t], current[t])]
+    np.testing.assert_array_equal(outputs, expected, err_msg="tick %d" % t)
@@ -0,0 +1,304 @@
+"""PID gain tuner
+
+  Searches the Kp, Ki and Kd gains of a launch PID loop (throttle or
+  pitch) against the batch ascent simulator (see csk.lib.ascent),
+  over the launch settings of the mission scripts. Candidates are
+  split in chunks flown on a process pool, each chunk as one batch of
+  vehicles: the work is spread evenly, so that searches scale with
+  the number of workers.
+
+  A candidate is scored on the mean, over the launch settings, of its
+  time to apoapsis tracking error and overshoot (in s) and of the
+  delta-v it uses (in m/s). Each term is divided by the one of the
+  current gains, or by its floor in FLOORS if that is lower, so that
+  the current gains score 1 on each: the terms are then weighted by
+  WEIGHTS. Failing to reach orbit in any setting disqualifies it.
+
+  Searches are a grid of gains around the current ones, or a Bayesian
+  search: a Gaussian process fitted to the scores so far picks each
+  round of candidates by expected improvement. The best gains are
+  written to a JSON table, by vehicle, program and loop.
+
+  Usage: python tune_pid.py [--program mission|scenario] [--loop throttle|pitch]
+                            [--search grid|bayes] [--workers N] ...
+"""
+
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+import numpy as np
+import csk.sim
+from csk.sim import vehicles
+from csk.sim.physics import ascent_stages
+from csk.lib import bodies
+from csk.lib.ascent import BatchAscent, THROTTLE_GAINS, PITCH_GAINS
+
+# Launch settings of the mission scripts, per program
+CASES = {
+    'mission': [
+        # launch_to_orbit.py, apogee.py
+        {'target_altitude': 140000, 'turn_end_alt': 110000, 'target_apt': 60},
+        {'target_altitude': 120000, 'turn_end_alt': 80000, 'target_apt': 50},
+    ],
+    'scenario': [
+        # alternative/apogee.py, alternative/icarus.py
+        {'target_altitude': 120000, 'target_apt': 50.0, 'turn_end_alt': 95000,
+         'turn_style': 'linear'},
+        {'target_altitude': 120000, 'target_apt': 50.0, 'turn_end_alt': 95000,
+         'turn_style': 'square_root'},
+    ],
+}
+
+DEFAULT_GAINS = {'throttle': THROTTLE_GAINS, 'pitch': PITCH_GAINS}
+
+# Score weights of APT error, overshoot and delta-v, relative to the
+# current gains
+WEIGHTS = (1., 0.5, 1.)
+
+# Lowest scales of APT error (s), overshoot (s) and delta-v (m/s): a
+# tracking error within a guidance tick is as good as none
+FLOORS = (0.1, 0.1, 1.)
+
+# Gains are searched between these factors of the current ones
+SPAN = (0.1, 10.)
+
+# Chunks of candidates per worker and round
+CHUNKS_PER_WORKER = 2
+
+DEFAULT_PATH = 'pid_gains.json'
+
+# Flight model and settings of the workers, set by init_worker
+_worker = {}
+
+
+def init_worker(constants, profile, stages, program, loop):
+  _worker.update(constants=constants, profile=profile, stages=stages,
+                 program=program, loop=loop)
+
+
+def evaluate(candidates):
+  """Score terms of candidate gains, an array of shape (n, 3), and if
+    they reach orbit
+
+    Runs in a worker: all candidates and launch settings fly as one
+    batch
+  """
+  program, loop = _worker['program'], _worker['loop']
+  cases = CASES[program]
+  count = len(candidates)
+  parameters = {}
+  for name in set(name for case in cases for name in case):
+    values = [case.get(name) for case in cases]
+    if any(value is None for value in values):
+      raise ValueError("Launch setting %s must be set in all cases" % name)
+    parameters[name] = np.repeat(values, count)
+  gains = tuple(np.tile(candidates[:, i], len(cases)) for i in range(3))
+  if loop == 'throttle':
+    options = {'throttle_gains': gains}
+  else:
+    options = {'pitch_gains': gains}
+
+  result = BatchAscent(_worker['constants'], _worker['profile'], _worker['stages'],
+                       parameters, program=program, **options).run()
+  terms = np.stack([result.apt_error, result.apt_overshoot, result.delta_v])
+  terms = terms.reshape(3, len(cases), count).mean(axis=1)
+  reached = result.reached.reshape(len(cases), count).all(axis=0)
+  return terms.T, reached
+
+
+class Tuner:
+  """Scores gain candidates of one loop on a process pool
+
+    The first candidates scored set the scales of the score terms:
+    they should be the current gains.
+  """
+
+  def __init__(self, vehicle, program, loop, workers):
+    conn = csk.sim.connect(vehicle, time_scale=None)
+    table = bodies.BodyConstants(path=None)
+    body = conn.space_center.active_vessel.orbit.body
+    constants, profile = table.get(body), table.atmosphere(body)
+    stages = ascent_stages(vehicle)
+
+    self.workers = workers
+    self.pool = multiprocessing.Pool(workers, init_worker,
+                                     (constants, profile, stages, program, loop))
+    self.scales = None
+    self.evaluated = []
+    self.scores = []
+    self.terms = []
+
+  def close(self):
+    self.pool.close()
+    self.pool.join()
+
+  def score(self, candidates):
+    """Scores candidates, in chunks spread over the workers"""
+    candidates = np.asarray(candidates, dtype=float)
+    chunks = np.array_split(candidates, min(len(candidates), self.workers * CHUNKS_PER_WORKER))
+    results = self.pool.map(evaluate, chunks)
+    terms = np.concatenate([r[0] for r in results])
+    reached = np.concatenate([r[1] for r in results])
+    if self.scales is None:
+      self.scales = np.maximum(terms[0], FLOORS)
+    scores = np.where(reached, np.dot(terms / self.scales, WEIGHTS), np.inf)
+    self.evaluated.extend(candidates)
+    self.scores.extend(scores)
+    self.terms.extend(terms)
+    return scores
+
+  def best(self):
+    i = int(np.argmin(self.scores))
+    return self.evaluated[i], self.scores[i], self.terms[i]
+
+  def best_delta_v(self):
+    """Candidate using the least delta-v, and its rank by score (1: best)"""
+    delta_v = np.where(np.isfinite(self.scores), np.asarray(self.terms)[:, 2], np.inf)
+    i = int(np.argmin(delta_v))
+    rank = int((np.asarray(self.scores) < self.scores[i]).sum()) + 1
+    return self.evaluated[i], self.scores[i], self.terms[i], rank
+
+
+def grid_search(tuner, defaults, points):
+  """Scores a grid of gains, log-spaced around the defaults"""
+  factors = np.geomspace(SPAN[0], SPAN[1], points)
+  axes = [gain * factors for gain in defaults]
+  grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+  tuner.score(grid)
+
+
+def bayesian_search(tuner, defaults, rounds, batch, rng):
+  """Scores rounds of gains picked by expected improvement
+
+    Gains are searched in log space, where a Gaussian process with a
+    squared exponential kernel is fitted to the scores so far
+  """
+  low = np.log(np.asarray(defaults) * SPAN[0])
+  high = np.log(np.asarray(defaults) * SPAN[1])
+
+  def sample(count):
+    return rng.uniform(low, high, size=(count, 3))
+
+  tuner.score(np.vstack([defaults, np.exp(sample(batch - 1))]))
+  for i in range(rounds - 1):
+    points = (np.log(tuner.evaluated) - low) / (high - low)
+    scores = np.asarray(tuner.scores)
+    finite = np.isfinite(scores)
+    if not finite.any():
+      tuner.score(np.exp(sample(batch)))
+      continue
+    # Failed candidates count as the worst score seen
+    scores = np.where(finite, scores, scores[finite].max())
+    candidates = sample(2000)
+    improvement = expected_improvement(points, scores, (candidates - low) / (high - low))
+    picked = candidates[np.argsort(-improvement)[:batch]]
+    tuner.score(np.exp(picked))
+
+
+def expected_improvement(points, scores, candidates, length=0.2, noise=1e-6):
+  """Expected improvement on the lowest score, at candidate points"""
+  mean, scale = scores.mean(), scores.std() or 1.
+  y = (scores - mean) / scale
+
+  def kernel(a, b):
+    d2 = ((a[:, np.newaxis, :] - b[np.newaxis, :, :])**2).sum(axis=-1)
+    return np.exp(-d2 / (2 * length**2))
+
+  k = kernel(points, points) + noise * np.eye(len(points))
+  factor = np.linalg.cholesky(k)
+  alpha = np.linalg.solve(factor.T, np.linalg.solve(factor, y))
+  ks = kernel(candidates, points)
+  mu = ks @ alpha
+  v = np.linalg.solve(factor, ks.T)
+  sigma = np.sqrt(np.maximum(1. - (v * v).sum(axis=0), 1e-12))
+
+  z = (y.min() - mu) / sigma
+  cdf = 0.5 * (1 + np.vectorize(math.erf)(z / math.sqrt(2)))
+  pdf = np.exp(-z * z / 2) / math.sqrt(2 * math.pi)
+  return (y.min() - mu) * cdf + sigma * pdf
+
+
+def write_table(path, vehicle, program, loop, entry):
+  """Stores tuned gains in the table of a JSON file"""
+  table = bodies.read_json(path)
+  table.setdefault(vehicle, {}).setdefault(program, {})[loop] = entry
+  with open(path + '.tmp', 'w') as f:
+    json.dump(table, f, indent=1, sort_keys=True)
+  os.replace(path + '.tmp', path)
+
+
+def table_terms(terms):
+  return {'apt_error': round(float(terms[0]), 3),
+          'apt_overshoot': round(float(terms[1]), 3),
+          'delta_v': round(float(terms[2]), 1)}
+
+
+def main():
+  specs = {spec['name']: spec for spec in vars(vehicles).values()
+           if isinstance(spec, dict) and 'parts' in spec}
+  parser = argparse.ArgumentParser(description="Tunes launch PID gains offline")
+  parser.add_argument('--vehicle', default=vehicles.SIM_ROCKET['name'], choices=sorted(specs))
+  parser.add_argument('--program', default='mission', choices=sorted(CASES))
+  parser.add_argument('--loop', default='throttle', choices=sorted(DEFAULT_GAINS))
+  parser.add_argument('--search', default='grid', choices=('grid', 'bayes'))
+  parser.add_argument('--workers', type=int, default=os.cpu_count())
+  parser.add_argument('--points', type=int, default=7, help="grid points per gain")
+  parser.add_argument('--rounds', type=int, default=8, help="Bayesian search rounds")
+  parser.add_argument('--batch', type=int, default=32, help="candidates per round")
+  parser.add_argument('--seed', type=int, default=1)
+  parser.add_argument('--output', default=DEFAULT_PATH)
+  args = parser.parse_args()
+
+  defaults = DEFAULT_GAINS[args.loop]
+  tuner = Tuner(specs[args.vehicle], args.program, args.loop, args.workers)
+  start = time.perf_counter()
+  try:
+    current = tuner.score([defaults])[0]
+    if args.search == 'grid':
+      grid_search(tuner, defaults, args.points)
+    else:
+      bayesian_search(tuner, defaults, args.rounds, args.batch,
+                      np.random.default_rng(args.seed))
+  finally:
+    tuner.close()
+  elapsed = time.perf_counter() - start
+
+  gains, score, terms = tuner.best()
+  print("[tune_pid]", "%d candidates on %d workers in %.1f s" %
+        (len(tuner.scores), args.workers, elapsed))
+  print("[tune_pid]", "%s %s loop, current Kp=%g Ki=%g Kd=%g: score %.3f" %
+        (args.program, args.loop, *defaults, current))
+  if not np.isfinite(score):
+    print("[tune_pid]", "No candidate reaches orbit")
+    return
+  print("[tune_pid]", "best Kp=%.4g Ki=%.4g Kd=%.4g: score %.3f "
+        "(APT error %.2f s, overshoot %.2f s, delta-v %.0f m/s)" %
+        (*gains, score, *terms))
+  # The tracking terms rank first other gains than delta-v alone would
+  dv_gains, dv_score, dv_terms, dv_rank = tuner.best_delta_v()
+  print("[tune_pid]", "least delta-v Kp=%.4g Ki=%.4g Kd=%.4g: score %.3f, rank %d "
+        "(APT error %.2f s, overshoot %.2f s, delta-v %.0f m/s)" %
+        (*dv_gains, dv_score, dv_rank, *dv_terms))
+
+  write_table(args.output, args.vehicle, args.program, args.loop, {
+      'gains': [round(float(g), 6) for g in gains],
+      'score': round(float(score), 4),
+      'current_score': round(float(current), 4),
+      **table_terms(terms),
+      'scales': table_terms(tuner.scales),
+      'least_delta_v': {
+          'gains': [round(float(g), 6) for g in dv_gains],
+          'score': round(float(dv_score), 4),
+          'rank': dv_rank,
+          **table_terms(dv_terms),
+      },
+      'search': args.search,
+  })
+  print("[tune_pid]", "Gains written to %s" % args.output)
+
+
+if __name__ == '__main__':
+  main()